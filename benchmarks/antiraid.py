@@ -0,0 +1,44 @@
+"""Coste por entrada de DetectorRaids.
+
+Reproduce una grabación sintética: muchos servidores con entradas legítimas
+y algunas oleadas de miles de entradas por minuto. El detector es puro (no
+lee el reloj ni toca la red), así que se mide solo su trabajo.
+
+    python benchmarks/antiraid.py [entradas]
+"""
+import random
+import sys
+import time
+
+from comun import main
+
+GUILDS = 1000
+
+def grabacion(total, semilla=1):
+    azar = random.Random(semilla)
+    entradas = []
+    instante = 0.0
+    for i in range(total):
+        if i % 10_000 < 3_000:
+            # Oleada: 3000 entradas en un minuto sobre un mismo servidor
+            guild_id, edad = 1, azar.randrange(3600)
+            instante += 0.02
+        else:
+            guild_id, edad = azar.randrange(GUILDS), azar.randrange(3 * 365 * 86400)
+            instante += 0.005
+        entradas.append((guild_id, i, edad, instante))
+    return entradas
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    entradas = grabacion(total)
+    detector = main.DetectorRaids(main.RAID_UMBRAL, main.RAID_VENTANA, main.RAID_EDAD_MAXIMA, main.RAID_BLOQUEO)
+    registrar = detector.registrar
+    decisiones = 0
+    inicio = time.perf_counter()
+    for entrada in entradas:
+        if registrar(*entrada) is not None:
+            decisiones += 1
+    segundos = time.perf_counter() - inicio
+    print(f"{total} entradas en {len(detector.guilds)} servidores, {decisiones} decisiones")
+    print(f"{segundos / total * 1e6:.2f} us por entrada ({total / segundos:,.0f} entradas/s)")
@@ -0,0 +1,59 @@
+"""Warns e historial por segundo con el backend configurado (SQLite o MySQL).
+
+Ejecutar una vez con cada backend y comparar:
+
+    python benchmarks/backends.py [warns]
+    DB_BACKEND=mysql DB_HOST=... DB_NAME=bot_benchmark ... python benchmarks/backends.py [warns]
+
+Los warns siguen el recorrido de warn_command bajo lock_warns, con varios
+comandos a la vez, pero cada uno vuelca la cola en el acto para medir la
+base de datos y no el intervalo de volcado; el historial pide la
+primera página de 10 acciones de usuarios al azar.
+"""
+import asyncio
+import random
+import sys
+import time
+
+from comun import main, vaciar_tablas
+
+USUARIOS = 200
+CONCURRENCIA = 20
+
+async def warn(user_id):
+    async with main.lock_warns(user_id, 1):
+        await main.registrar_accion(user_id, 1, "warn", "benchmark", 7)
+        await main.buffer_acciones.vaciar()
+        return await main.contar_warns(user_id, 1)
+
+async def warns(total):
+    cola = iter(range(total))
+    
+    async def moderador():
+        for i in cola:
+            await warn(1000 + i % USUARIOS)
+    
+    await asyncio.gather(*(moderador() for _ in range(CONCURRENCIA)))
+
+async def historiales(total):
+    azar = random.Random(1)
+    cola = iter(range(total))
+    
+    async def moderador():
+        for _ in cola:
+            await main.obtener_pagina_historial(1000 + azar.randrange(USUARIOS), 1, 10)
+    
+    await asyncio.gather(*(moderador() for _ in range(CONCURRENCIA)))
+
+def medir(nombre, corrutina, total):
+    inicio = time.perf_counter()
+    asyncio.run(corrutina(total))
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:>10} {total:>7} en {segundos:>6.2f}s {total / segundos:>10,.0f}/s")
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    vaciar_tablas()
+    print(f"Backend {main.engine.dialect.name}, {CONCURRENCIA} comandos a la vez, {main.DB_WORKERS} hilos de BD")
+    medir("warns", warns, total)
+    medir("historial", historiales, total)
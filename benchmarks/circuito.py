@@ -0,0 +1,56 @@
+"""Lo que tarda una lectura con la base de datos caída, antes y después de abrirse el circuito.
+
+La caída se simula con un engine cuya conexión espera `timeout` segundos y
+falla, como un MySQL que no responde con DB_CONNECT_TIMEOUT. Mientras el
+circuito está cerrado cada comando paga ese tiempo; tras DB_CIRCUITO_FALLOS
+fallos seguidos se abre y las lecturas se responden desde `lecturas_cache`
+(o con BaseDatosNoDisponible) sin tocar la red.
+
+    python benchmarks/circuito.py [timeout_segundos]
+"""
+import asyncio
+import sqlite3
+import sys
+import time
+
+from sqlalchemy import create_engine
+
+from comun import main, vaciar_tablas
+
+def engine_caido(timeout):
+    def conectar():
+        time.sleep(timeout)
+        raise sqlite3.OperationalError("sin respuesta del servidor")
+    return create_engine("sqlite://", creator=conectar)
+
+async def leer(user_id):
+    inicio = time.perf_counter()
+    try:
+        await main.obtener_pagina_historial(user_id, 1, 10)
+        resultado = "copia en caché" if main.lectura_obsoleta.get() else "consulta"
+    except main.BaseDatosNoDisponible:
+        resultado = "BaseDatosNoDisponible"
+    return time.perf_counter() - inicio, resultado
+
+async def escenario(timeout):
+    await main.obtener_pagina_historial(100, 1, 10)  # deja una copia buena en caché
+    main.engine_lectura = engine_caido(timeout)
+    print(f"Caída simulada: cada conexión tarda {timeout}s en fallar")
+    for i in range(main.circuito_db.umbral + 3):
+        user_id = 100 if i % 2 == 0 else 200  # 200 no tiene copia en caché
+        # Cada lectura en su propia tarea, como cada comando (lectura_obsoleta es por contexto)
+        segundos, resultado = await asyncio.create_task(leer(user_id))
+        print(f"lectura {i + 1:>2} circuito {main.circuito_db.estado:>11} "
+              f"{segundos * 1000:>10.3f} ms  {resultado}")
+    
+    repeticiones = 10_000
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        await leer(100)
+    print(f"con el circuito abierto: {(time.perf_counter() - inicio) / repeticiones * 1e6:.1f} us por lectura")
+
+if __name__ == "__main__":
+    vaciar_tablas()
+    main.buffer_acciones.agregar(100, 1, "warn", "benchmark", 7)
+    main.buffer_acciones.vaciar_sync()
+    asyncio.run(escenario(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0))
@@ -0,0 +1,64 @@
+"""Entorno común de los benchmarks: importa main.py contra una base de datos de pruebas.
+
+Por defecto usa un SQLite temporal. Con DB_BACKEND=mysql y las variables DB_*
+de siempre mide contra MySQL: usar siempre una base de datos desechable,
+porque los benchmarks la llenan de filas sintéticas.
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPORAL = tempfile.mkdtemp(prefix="benchmark_")
+
+os.environ.setdefault("TOKEN", "benchmark")
+os.environ.setdefault("GUILD_ID", "1")
+os.environ.setdefault("LOG_CHANNEL_ID", "2")
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", os.path.join(TEMPORAL, "benchmark.db"))
+os.environ.setdefault("DB_JOURNAL_PATH", os.path.join(TEMPORAL, "acciones_pendientes.jsonl"))
+sys.path.insert(0, RAIZ)
+
+import main  # noqa: E402
+
+main.aplicar_migraciones()
+
+TIPOS = ("warn", "mute", "kick", "ban", "unmute")
+
+def poblar(filas, guild_id=1, usuarios=1000, lote=5000):
+    """Inserta `filas` acciones sintéticas directamente en `acciones` (sin la cola)"""
+    inicio = datetime.utcnow() - timedelta(days=30)
+    pendientes = []
+    with main.engine.begin() as conn:
+        for i in range(filas):
+            pendientes.append({
+                "user_id": 1000 + i % usuarios,
+                "guild_id": guild_id,
+                "tipo": TIPOS[i % len(TIPOS)],
+                "razon": f"Razón de prueba {i}",
+                "moderator_id": 7,
+                "duracion": "1h" if i % len(TIPOS) == 1 else None,
+                "created_at": inicio + timedelta(seconds=i),
+                "idempotency_key": uuid.uuid4().hex
+            })
+            if len(pendientes) >= lote:
+                conn.execute(main.SQL_INSERTAR_ACCION, pendientes)
+                pendientes = []
+        if pendientes:
+            conn.execute(main.SQL_INSERTAR_ACCION, pendientes)
+
+def vaciar_tablas():
+    """Borra las filas de todas las tablas del esquema"""
+    with main.engine.begin() as conn:
+        for tabla in reversed(main.metadata.sorted_tables):
+            conn.execute(main.delete(tabla))
+
+def cronometrar(funcion, *args, repeticiones=1):
+    """Segundos por llamada (media de `repeticiones`)"""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion(*args)
+    return (time.perf_counter() - inicio) / repeticiones
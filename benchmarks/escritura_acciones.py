@@ -0,0 +1,58 @@
+"""Registro de acciones: una transacción por acción frente a la cola write-behind.
+
+El camino antiguo abría una transacción por acción con un INSERT en `acciones`
+y, para los warns, un segundo upsert en `user_warns`. La cola (BufferAcciones)
+agrupa las filas en un INSERT multi-fila y un upsert por usuario.
+
+    python benchmarks/escritura_acciones.py [acciones]
+"""
+import sys
+import uuid
+from datetime import datetime
+
+from comun import TIPOS, cronometrar, main, vaciar_tablas
+
+def accion(i):
+    return {
+        "user_id": 1000 + i % 50,
+        "guild_id": 1,
+        "tipo": TIPOS[i % len(TIPOS)],
+        "razon": f"Razón de prueba {i}",
+        "moderator_id": 7,
+        "duracion": None
+    }
+
+def por_fila(acciones):
+    # Copia del registrar_accion anterior a la cola
+    for datos in acciones:
+        with main.engine.begin() as conn:
+            conn.execute(
+                main.SQL_INSERTAR_ACCION,
+                {**datos, "created_at": datetime.utcnow(), "idempotency_key": uuid.uuid4().hex}
+            )
+            if datos["tipo"] == 'warn':
+                conn.execute(
+                    main.SQL_UPSERT_WARNS,
+                    {"user_id": datos["user_id"], "guild_id": datos["guild_id"], "incremento": 1}
+                )
+
+def en_cola(acciones):
+    # Mismos lotes que dispara BufferAcciones.agregar, pero volcados aquí mismo
+    # en lugar de en una tarea del event loop
+    buffer = main.buffer_acciones
+    buffer.vaciado_programado = True
+    for datos in acciones:
+        buffer.agregar(**datos)
+        if len(buffer) >= buffer.max_lote:
+            buffer.vaciar_sync()
+    buffer.vaciar_sync()
+    buffer.vaciado_programado = False
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    acciones = [accion(i) for i in range(total)]
+    print(f"{total} acciones, lotes de {main.buffer_acciones.max_lote} en la cola")
+    for nombre, funcion in (("por fila", por_fila), ("cola write-behind", en_cola)):
+        vaciar_tablas()
+        segundos = cronometrar(funcion, acciones)
+        print(f"{nombre:>18} {segundos:>8.2f}s {total / segundos:>10,.0f} acciones/s")
@@ -0,0 +1,55 @@
+"""Estadísticas del servidor: espejo `guild_stats` frente al recorrido de las tablas.
+
+`información` hacía SUM(total_warns) sobre `user_warns` y COUNT(*) sobre
+`acciones`, que crecen sin límite. Ahora lee una fila de `guild_stats` (o el
+espejo en memoria). Mide también `reconstruir_sync`, que sí recorre todo.
+
+    python benchmarks/estadisticas_guild.py [filas]
+"""
+import sys
+
+from sqlalchemy import func, insert, select
+
+from comun import cronometrar, main, poblar, vaciar_tablas
+
+acciones, user_warns = main.tabla_acciones, main.tabla_user_warns
+SQL_SUMA_WARNS = select(func.sum(user_warns.c.total_warns)).where(user_warns.c.guild_id == 1)
+SQL_CUENTA_ACCIONES = select(func.count()).select_from(acciones).where(acciones.c.guild_id == 1)
+
+def recorrido():
+    # Copia de las consultas que hacía información_command
+    with main.engine_lectura.connect() as conn:
+        return conn.execute(SQL_SUMA_WARNS).scalar() or 0, conn.execute(SQL_CUENTA_ACCIONES).scalar()
+
+def fila_guild_stats():
+    # Primera lectura tras arrancar: una fila por clave primaria
+    main.estadisticas_guilds.datos.clear()
+    return main.estadisticas_guilds.cargar_guild_sync(1)
+
+def rellenar_user_warns():
+    # poblar() escribe solo en `acciones`
+    with main.engine.begin() as conn:
+        conn.execute(insert(user_warns).from_select(
+            ["user_id", "guild_id", "total_warns"],
+            select(acciones.c.user_id, acciones.c.guild_id, func.count())
+            .where(acciones.c.tipo == 'warn')
+            .group_by(acciones.c.user_id, acciones.c.guild_id)
+        ))
+
+if __name__ == "__main__":
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    vaciar_tablas()
+    poblar(filas, usuarios=50_000)
+    rellenar_user_warns()
+    print(f"{filas} acciones")
+    segundos = cronometrar(main.estadisticas_guilds.reconstruir_sync)
+    print(f"{'reconstruir_sync':>20} {segundos * 1000:>12.2f} ms")
+    assert recorrido() == fila_guild_stats(), (recorrido(), fila_guild_stats())
+    
+    for nombre, funcion, repeticiones in (
+        ("SUM/COUNT", recorrido, 5),
+        ("fila guild_stats", fila_guild_stats, 1000),
+        ("espejo en memoria", lambda: main.estadisticas_guilds.obtener(1), 100_000)
+    ):
+        segundos = cronometrar(funcion, repeticiones=repeticiones)
+        print(f"{nombre:>20} {segundos * 1000:>12.4f} ms por consulta")
@@ -0,0 +1,48 @@
+"""Rendimiento y memoria de `exportar_acciones_sync`.
+
+Exporta el mismo servidor con tamaños crecientes y muestra filas por segundo
+y el pico de memoria de Python durante la exportación, que no debe crecer
+con el número de filas.
+
+    python benchmarks/exportacion.py [filas_maximas]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+from comun import main, poblar, vaciar_tablas
+
+def exportar(formato):
+    ruta, filas = main.exportar_acciones_sync(1, formato=formato)
+    tamano = os.path.getsize(ruta)
+    os.remove(ruta)
+    return filas, tamano
+
+def medir(filas, formato):
+    # Tiempo y memoria en pasadas separadas: tracemalloc ralentiza mucho
+    # el bucle por fila
+    inicio = time.perf_counter()
+    exportadas, tamano = exportar(formato)
+    segundos = time.perf_counter() - inicio
+    assert exportadas == filas, (exportadas, filas)
+    
+    tracemalloc.start()
+    exportar(formato)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{filas:>10} {formato:>6} {segundos:>8.2f}s {filas / segundos:>12,.0f} filas/s "
+          f"{pico / 1024 / 1024:>8.1f} MB pico {tamano / 1024 / 1024:>8.1f} MB fichero")
+
+if __name__ == "__main__":
+    maximo = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    vaciar_tablas()
+    print(f"{'filas':>10} {'formato':>6} {'tiempo':>9} {'velocidad':>21} {'memoria':>16} {'tamaño':>20}")
+    filas = 0
+    tamano = 10_000
+    while tamano <= maximo:
+        poblar(tamano - filas)
+        filas = tamano
+        for formato in ("csv", "jsonl"):
+            medir(filas, formato)
+        tamano *= 10
@@ -0,0 +1,80 @@
+"""Tiempo de massban con 200 IDs frente a 200 bans sueltos.
+
+La API se simula con una latencia fija por llamada (LATENCIA, 50 ms por
+defecto): massban hace una sola llamada a `bulk_ban` por lote de 200,
+mientras que banear uno a uno paga la latencia 200 veces. Incluye el
+registro de las acciones en la base de datos.
+
+    python benchmarks/massban.py [ids] [latencia_ms]
+"""
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from comun import main, vaciar_tablas
+
+class ServidorSimulado:
+    def __init__(self, latencia):
+        self.id = 1
+        self.owner_id = 1
+        self.latencia = latencia
+        self.llamadas = 0
+
+    def get_member(self, user_id):
+        return None
+
+    async def ban(self, user, reason=None):
+        self.llamadas += 1
+        await asyncio.sleep(self.latencia)
+
+    async def bulk_ban(self, usuarios, reason=None):
+        self.llamadas += 1
+        await asyncio.sleep(self.latencia)
+        return SimpleNamespace(banned=list(usuarios), failed=[])
+
+class Escribiendo:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+async def no_enviar(embed=None):
+    pass
+
+def contexto(guild):
+    return SimpleNamespace(
+        guild=guild, prefix="!", send=no_enviar, typing=Escribiendo,
+        message=SimpleNamespace(attachments=[]),
+        author=SimpleNamespace(id=7, top_role=10, guild_permissions=SimpleNamespace(ban_members=True))
+    )
+
+async def uno_a_uno(guild, ids):
+    for user_id in ids:
+        await guild.ban(SimpleNamespace(id=user_id), reason="benchmark")
+        await main.registrar_accion(user_id, guild.id, "ban", "benchmark", 7)
+    await main.buffer_acciones.vaciar()
+
+def medir(corrutina):
+    inicio = time.perf_counter()
+    asyncio.run(corrutina)
+    return time.perf_counter() - inicio
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latencia = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    # Sin sesión con Discord: el bot necesita un usuario propio para validar objetivos
+    type(main.bot).user = property(lambda self: SimpleNamespace(id=999))
+    ids = [10 ** 17 + i for i in range(total)]
+    contenido = " ".join(str(user_id) for user_id in ids) + " benchmark"
+
+    vaciar_tablas()
+    guild = ServidorSimulado(latencia)
+    segundos = medir(main.massban_command.callback(contexto(guild), contenido=contenido))
+    print(f"massban:    {total} IDs en {segundos * 1000:.0f} ms ({guild.llamadas} llamadas a la API)")
+
+    vaciar_tablas()
+    guild = ServidorSimulado(latencia)
+    segundos = medir(uno_a_uno(guild, ids))
+    print(f"uno a uno:  {total} IDs en {segundos * 1000:.0f} ms ({guild.llamadas} llamadas a la API)")
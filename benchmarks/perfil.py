@@ -0,0 +1,50 @@
+"""Perfil de moderación: una consulta (obtener_perfil_sync) frente a las tres antiguas.
+
+check_3_warns hacía tres consultas: el contador de warns, todos los warns
+del usuario (sin LIMIT, para mostrar 3) y el historial con LIMIT 50 solo
+para contar acciones. Se mide con usuarios de miles de filas.
+
+    python benchmarks/perfil.py [filas_por_usuario]
+"""
+import sys
+
+from sqlalchemy import bindparam, select
+
+from comun import cronometrar, main, poblar, vaciar_tablas
+
+USUARIOS = 5
+acciones = main.tabla_acciones
+SQL_WARNS_DEL_USUARIO = select(
+    acciones.c.tipo, acciones.c.razon, acciones.c.moderator_id, acciones.c.duracion, acciones.c.created_at
+).where(
+    acciones.c.user_id == bindparam("user_id"),
+    acciones.c.guild_id == bindparam("guild_id"),
+    acciones.c.tipo == 'warn'
+).order_by(acciones.c.created_at.desc())
+SQL_HISTORIAL_50 = select(acciones.c.id).where(
+    acciones.c.user_id == bindparam("user_id"),
+    acciones.c.guild_id == bindparam("guild_id")
+).order_by(acciones.c.created_at.desc()).limit(50)
+
+def tres_consultas(user_id, guild_id):
+    # Copia de lo que hacía check_3_warns antes de obtener_perfil
+    params = {"user_id": user_id, "guild_id": guild_id}
+    with main.engine_lectura.connect() as conn:
+        warns = conn.execute(main.SQL_CONTAR_WARNS, params).scalar() or 0
+    with main.engine_lectura.connect() as conn:
+        ultimos = conn.execute(SQL_WARNS_DEL_USUARIO, params).fetchall()[:3]
+    with main.engine_lectura.connect() as conn:
+        total = len(conn.execute(SQL_HISTORIAL_50, params).fetchall())
+    return warns, ultimos, total
+
+if __name__ == "__main__":
+    por_usuario = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    vaciar_tablas()
+    poblar(por_usuario * USUARIOS, usuarios=USUARIOS)
+    repeticiones = 50
+    print(f"{USUARIOS} usuarios con {por_usuario} acciones cada uno, {repeticiones} repeticiones")
+    for nombre, funcion in (("tres consultas", tres_consultas), ("obtener_perfil_sync", main.obtener_perfil_sync)):
+        segundos = sum(
+            cronometrar(funcion, 1000 + usuario, 1, repeticiones=repeticiones) for usuario in range(USUARIOS)
+        ) / USUARIOS
+        print(f"{nombre:>20} {segundos * 1000:>8.2f} ms por perfil")
@@ -0,0 +1,46 @@
+"""Coste por llamada de pool_pre_ping frente al pool revisado en segundo plano.
+
+Antes cada checkout hacía un ping (un round-trip más) antes de la consulta;
+ahora GestorPool revisa las conexiones ociosas en segundo plano. Se mide
+contar_warns_sync con un engine de lectura de cada tipo. Con SQLite el ping
+no cruza la red: la diferencia real aparece con DB_BACKEND=mysql, donde se
+suma el RTT al servidor en cada comando.
+
+    python benchmarks/pool.py [llamadas]
+"""
+import sys
+
+from sqlalchemy import create_engine, event
+
+from comun import cronometrar, main, vaciar_tablas
+
+def engine_con_pre_ping():
+    # La configuración anterior: ping en cada checkout y reciclado cada 280s
+    if main.engine.dialect.name == "sqlite":
+        motor = create_engine(
+            main.engine_lectura.url, connect_args={"check_same_thread": False}, pool_pre_ping=True
+        )
+        event.listen(motor, "connect", main.configurar_sqlite)
+        return motor
+    return create_engine(
+        main.engine.url, connect_args={"connection_timeout": main.DB_CONNECT_TIMEOUT},
+        pool_pre_ping=True, pool_recycle=280
+    )
+
+if __name__ == "__main__":
+    llamadas = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    vaciar_tablas()
+    main.buffer_acciones.agregar(100, 1, "warn", "benchmark", 7)
+    main.buffer_acciones.vaciar_sync()
+    
+    actual = main.engine_lectura
+    print(f"Backend {main.engine.dialect.name}, {llamadas} llamadas a contar_warns_sync")
+    resultados = {}
+    for nombre, motor in (("pool_pre_ping", engine_con_pre_ping()), ("GestorPool", actual)):
+        main.engine_lectura = motor
+        main.contar_warns_sync(100, 1)  # abre la conexión fuera de la medida
+        resultados[nombre] = cronometrar(main.contar_warns_sync, 100, 1, repeticiones=llamadas)
+        print(f"{nombre:>14} {resultados[nombre] * 1e6:>9.1f} us por llamada")
+    main.engine_lectura = actual
+    ahorro = resultados["pool_pre_ping"] - resultados["GestorPool"]
+    print(f"{'ahorro':>14} {ahorro * 1e6:>9.1f} us por llamada")
@@ -0,0 +1,77 @@
+"""Carga de sondeos sobre /healthz frente a la latencia de los comandos.
+
+El servidor de salud corre en el event loop del bot. Un hilo aparte lanza
+miles de peticiones a /healthz (como un balanceador o Kubernetes muy
+insistentes) mientras el loop ejecuta "comandos" (una lectura en el pool de
+la base de datos) y un latido que mide su retraso. Se compara con el mismo
+escenario sin sondeos.
+
+    python benchmarks/salud.py [sondeos]
+"""
+import asyncio
+import statistics
+import sys
+import threading
+import time
+
+import aiohttp
+
+from comun import main
+from keep_alive import keep_alive
+
+CONCURRENCIA = 20
+
+def sondear(puerto, total, resultado):
+    # Cliente en su propio hilo y event loop, como un proceso externo
+    async def lanzar():
+        url = f"http://127.0.0.1:{puerto}/healthz"
+        pendientes = iter(range(total))
+        async with aiohttp.ClientSession() as sesion:
+            async def trabajador():
+                for _ in pendientes:
+                    async with sesion.get(url) as respuesta:
+                        await respuesta.read()
+                        resultado[respuesta.status] = resultado.get(respuesta.status, 0) + 1
+            await asyncio.gather(*(trabajador() for _ in range(CONCURRENCIA)))
+    
+    asyncio.run(lanzar())
+
+async def medir(segundos, carga=None):
+    """Latencia de comandos y retraso del loop durante `segundos` (o hasta que acabe la carga)"""
+    comandos, retrasos = [], []
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin or (carga and carga.is_alive()):
+        inicio = time.perf_counter()
+        await main.ejecutar_db(main.contar_warns_sync, 100, 1)
+        comandos.append(time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        await asyncio.sleep(0.01)
+        retrasos.append(time.perf_counter() - inicio - 0.01)
+    return comandos, retrasos
+
+def resumen(nombre, comandos, retrasos):
+    comandos.sort()
+    p99 = comandos[int(len(comandos) * 0.99)]
+    print(f"{nombre:>12} comando p50 {statistics.median(comandos) * 1000:>6.2f} ms  "
+          f"p99 {p99 * 1000:>6.2f} ms  retraso del loop máx {max(retrasos) * 1000:>6.2f} ms")
+
+async def escenario(total):
+    runner = await keep_alive(main.estado_salud, host="127.0.0.1", port=0)
+    _, puerto = runner.addresses[0]
+    try:
+        resumen("sin sondeos", *await medir(2))
+        
+        resultado = {}
+        carga = threading.Thread(target=sondear, args=(puerto, total, resultado))
+        inicio = time.perf_counter()
+        carga.start()
+        comandos, retrasos = await medir(0, carga)
+        segundos = time.perf_counter() - inicio
+        resumen("con sondeos", comandos, retrasos)
+        print(f"{sum(resultado.values())} sondeos en {segundos:.2f}s "
+              f"({sum(resultado.values()) / segundos:,.0f}/s), respuestas {resultado}")
+    finally:
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    asyncio.run(escenario(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000))
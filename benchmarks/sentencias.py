@@ -0,0 +1,48 @@
+"""Coste por llamada de construir la sentencia en cada llamada frente a hacerlo una vez.
+
+Antes cada helper creaba un `text("...")` nuevo en cada llamada; ahora
+las sentencias se construyen a nivel de módulo y solo se enlazan parámetros.
+Se mide sobre una conexión ya abierta para aislar el coste de SQLAlchemy.
+
+    python benchmarks/sentencias.py [llamadas]
+"""
+import sys
+
+from sqlalchemy import bindparam, select, text
+
+from comun import cronometrar, main, vaciar_tablas
+
+PARAMS = {"user_id": 100, "guild_id": 1}
+
+def con_text(conn):
+    # Como contar_warns antes de las tablas Core
+    return conn.execute(
+        text("SELECT total_warns FROM user_warns WHERE user_id = :user_id AND guild_id = :guild_id"), PARAMS
+    ).scalar()
+
+def select_por_llamada(conn):
+    warns = main.tabla_user_warns
+    sentencia = select(warns.c.total_warns).where(
+        warns.c.user_id == bindparam("user_id"), warns.c.guild_id == bindparam("guild_id")
+    )
+    return conn.execute(sentencia, PARAMS).scalar()
+
+def a_nivel_de_modulo(conn):
+    return conn.execute(main.SQL_CONTAR_WARNS, PARAMS).scalar()
+
+if __name__ == "__main__":
+    llamadas = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    vaciar_tablas()
+    main.buffer_acciones.agregar(100, 1, "warn", "benchmark", 7)
+    main.buffer_acciones.vaciar_sync()
+    
+    print(f"{llamadas} llamadas sobre una conexión abierta ({main.engine.dialect.name})")
+    with main.engine_lectura.connect() as conn:
+        for nombre, funcion in (
+            ("text() por llamada", con_text),
+            ("select() por llamada", select_por_llamada),
+            ("a nivel de módulo", a_nivel_de_modulo)
+        ):
+            assert funcion(conn) == 1
+            segundos = cronometrar(funcion, conn, repeticiones=llamadas)
+            print(f"{nombre:>22} {segundos * 1e6:>8.1f} us por llamada")
@@ -0,0 +1,49 @@
+"""Mensajes por segundo que procesa DetectorSpam en un núcleo (objetivo: 5000/s).
+
+Reproduce una conversación sintética: miles de usuarios activos en varios
+servidores y algunos inundando el canal. Cada mensaje paga lo mismo que en
+on_message: hash del contenido y registrar().
+
+    python benchmarks/spam.py [mensajes]
+"""
+import random
+import sys
+import time
+
+from comun import main
+
+USUARIOS = 5000
+GUILDS = 20
+
+def conversacion(total, semilla=1):
+    azar = random.Random(semilla)
+    textos = [f"mensaje de prueba número {i}" for i in range(500)]
+    mensajes = []
+    instante = 0.0
+    for i in range(total):
+        instante += 0.0002  # 5000 mensajes por segundo de reloj
+        if i % 100 < 5:
+            # Un usuario inundando con el mismo texto
+            guild_id, user_id, texto = 1, 1, "spam spam spam"
+        else:
+            guild_id, user_id, texto = azar.randrange(GUILDS), azar.randrange(USUARIOS), azar.choice(textos)
+        mensajes.append((guild_id, user_id, azar.random() < 0.05, texto, instante))
+    return mensajes
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    mensajes = conversacion(total)
+    detector = main.DetectorSpam(
+        main.SPAM_MENSAJES, main.SPAM_SEGUNDOS, main.SPAM_MENCIONES, main.SPAM_MENCIONES_SEGUNDOS,
+        main.SPAM_REPETIDOS, main.SPAM_HISTORIAL, main.SPAM_INACTIVIDAD
+    )
+    registrar = detector.registrar
+    sanciones = 0
+    inicio = time.perf_counter()
+    for guild_id, user_id, menciones, texto, instante in mensajes:
+        huella = hash(texto) if texto else 0
+        if registrar(guild_id, user_id, menciones, huella, instante) is not None:
+            sanciones += 1
+    segundos = time.perf_counter() - inicio
+    print(f"{total} mensajes, {len(detector)} estados en memoria, {sanciones} sanciones")
+    print(f"{segundos / total * 1e6:.2f} us por mensaje ({total / segundos:,.0f} mensajes/s)")
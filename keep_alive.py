@@ -1,15 +1,33 @@
-from flask import Flask
-from threading import Thread
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-app = Flask('')
+async def home(request):
+    return web.Response(text="Bot activo")
 
-@app.route('/')
-def home():
-    return "Bot activo", 200
+async def metrics(request):
+    return web.Response(body=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
 
-def run():
-    app.run(host='0.0.0.0', port=8080)
+async def keep_alive(estado, host='0.0.0.0', port=8080):
+    """Arranca el servidor HTTP de salud en el event loop del bot.
 
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
+    `estado()` devuelve un dict con al menos las claves `ok` y `listo`;
+    /healthz responde 503 si `ok` es falso y /readyz si `listo` lo es.
+    """
+    async def healthz(request):
+        datos = estado()
+        return web.json_response(datos, status=200 if datos["ok"] else 503)
+
+    async def readyz(request):
+        datos = estado()
+        return web.json_response({"listo": datos["listo"]}, status=200 if datos["listo"] else 503)
+
+    app = web.Application()
+    app.router.add_get('/', home)
+    app.router.add_get('/healthz', healthz)
+    app.router.add_get('/readyz', readyz)
+    app.router.add_get('/metrics', metrics)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -1,23 +1,41 @@
 import discord
 from discord.ext import commands
-import os, re, asyncio, json
+import os, re, asyncio, bisect, contextlib, json, functools, math, threading, weakref, time, logging, uuid, csv, gzip, tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine, text
+from sqlalchemy import (
+    TIMESTAMP, BigInteger, Column, Index, Integer, MetaData, String, Table, Text, UniqueConstraint,
+    bindparam, create_engine, delete, event, exc, func, insert, inspect, literal, null, select,
+    text, type_coerce, union_all, update
+)
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from prometheus_client import Counter, Gauge, Histogram
+import typing
 from typing import Optional
+from array import array
+from collections import OrderedDict, deque
+from contextvars import ContextVar, copy_context
 from urllib.parse import quote_plus
+from keep_alive import keep_alive
 
 
 # =========================================================
 # CONFIGURACIÓN
 # =========================================================
 
+# Motor de base de datos: "mysql" (por defecto) o "sqlite" (un solo nodo)
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+
 # Variables de entorno requeridas
 REQUIRED_ENV_VARS = [
     "TOKEN",
-    "DB_HOST", "DB_PORT", "DB_USER", "DB_PASSWORD", "DB_NAME",
     "GUILD_ID",
     "LOG_CHANNEL_ID"
 ]
+if DB_BACKEND == "mysql":
+    REQUIRED_ENV_VARS += ["DB_HOST", "DB_PORT", "DB_USER", "DB_PASSWORD", "DB_NAME"]
 
 for var in REQUIRED_ENV_VARS:
     if not os.getenv(var):
@@ -30,9 +48,14 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_PASSWORD_ESCAPED = quote_plus(DB_PASSWORD)
+DB_PASSWORD_ESCAPED = quote_plus(DB_PASSWORD or "")
 DB_NAME = os.getenv("DB_NAME")
 
+# SQLite: ruta del fichero, tamaño de mmap (bytes) y de la caché de páginas (KiB)
+SQLITE_PATH = os.getenv("SQLITE_PATH", "bot.db")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", str(64 * 1024)))
+
 # IDs y Canales
 GUILD_ID = int(os.getenv("GUILD_ID"))
 LOG_CHANNEL_ID = int(os.getenv("LOG_CHANNEL_ID"))
@@ -40,6 +63,54 @@ WARN_ACTION_CHANNEL = int(os.getenv("WARN_ACTION_CHANNEL", "0"))
 PROMOTE_CHANNEL = int(os.getenv("PROMOTE_CHANNEL", "0"))
 DEMOTE_CHANNEL = int(os.getenv("DEMOTE_CHANNEL", "0"))
 
+# Puerto del servidor HTTP de salud y métricas
+HEALTH_PORT = int(os.getenv("PORT", "8080"))
+
+# Logs por minuto a partir de los cuales el canal de logs pasa a modo resumen
+LOG_DIGEST_UMBRAL = int(os.getenv("LOG_DIGEST_UMBRAL", "20"))
+
+# Hilos dedicados a la base de datos
+DB_WORKERS = int(os.getenv("DB_WORKERS", "5"))
+
+# Cola de escritura de acciones: tamaño máximo de lote y segundos entre volcados
+ACCIONES_BATCH_SIZE = int(os.getenv("ACCIONES_BATCH_SIZE", "50"))
+ACCIONES_FLUSH_INTERVAL = float(os.getenv("ACCIONES_FLUSH_INTERVAL", "1.0"))
+
+# Número máximo de contadores de warns en memoria
+WARNS_CACHE_SIZE = int(os.getenv("WARNS_CACHE_SIZE", "50000"))
+
+# Diario local donde se guardan las acciones mientras la base de datos falla
+DB_JOURNAL_PATH = os.getenv("DB_JOURNAL_PATH", "acciones_pendientes.jsonl")
+
+# Pool de conexiones (MySQL): tamaño, conexiones extra, segundos máximos para
+# obtener una conexión o abrirla, vida máxima de una conexión (-1 = sin límite)
+# y cada cuántos segundos se comprueban las conexiones ociosas
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(DB_WORKERS)))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "0"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+DB_POOL_CHEQUEO_INTERVALO = float(os.getenv("DB_POOL_CHEQUEO_INTERVALO", "30"))
+
+# Retención de `acciones`: meses que se guardan fila a fila (0 = todo); los
+# anteriores se resumen por usuario, tipo y mes. En MySQL la tabla se
+# particiona por mes y se mantienen creadas las particiones de los próximos meses.
+DB_RETENCION_MESES = int(os.getenv("DB_RETENCION_MESES", "0"))
+DB_PARTICIONES_FUTURAS = int(os.getenv("DB_PARTICIONES_FUTURAS", "3"))
+
+# Réplica de lectura opcional (MySQL, mismas credenciales que el primario) y
+# segundos que un moderador lee del primario después de escribir
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST")
+DB_REPLICA_PORT = os.getenv("DB_REPLICA_PORT", DB_PORT)
+DB_REPLICA_FIJAR_SEGUNDOS = float(os.getenv("DB_REPLICA_FIJAR_SEGUNDOS", "10"))
+
+# Circuito de la base de datos: fallos seguidos para abrirlo, SLO de latencia
+# por llamada (segundos), espera antes de sondear y lecturas guardadas en caché
+DB_CIRCUITO_FALLOS = int(os.getenv("DB_CIRCUITO_FALLOS", "5"))
+DB_SLO_SEGUNDOS = float(os.getenv("DB_SLO_SEGUNDOS", "2.0"))
+DB_CIRCUITO_ESPERA = float(os.getenv("DB_CIRCUITO_ESPERA", "10"))
+DB_LECTURAS_CACHE_SIZE = int(os.getenv("DB_LECTURAS_CACHE_SIZE", "10000"))
+
 # =========================================================
 # INICIALIZACIÓN DEL BOT
 # =========================================================
@@ -47,6 +118,7 @@ DEMOTE_CHANNEL = int(os.getenv("DEMOTE_CHANNEL", "0"))
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
+intents.moderation = True  # on_audit_log_entry_create (requiere además ver el registro de auditoría)
 
 bot = commands.Bot(
     command_prefix="god ",
@@ -58,179 +130,1875 @@ bot = commands.Bot(
 # CONEXIÓN A LA BASE DE DATOS
 # =========================================================
 
-try:
-    engine = create_engine(
-        f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD_ESCAPED}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
-        pool_pre_ping=True,
-        pool_recycle=280
+def configurar_sqlite(dbapi_connection, connection_record):
+    """Pragmas de rendimiento para cada conexión SQLite"""
+    cursor = dbapi_connection.cursor()
+    # WAL: los lectores no bloquean al escritor ni al revés
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # En WAL, NORMAL solo sincroniza en los checkpoints y sigue siendo consistente
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+def crear_engines_sqlite(ruta):
+    """Devuelve (escritor, lectores) para un fichero SQLite.
+
+    SQLite serializa las escrituras, así que hay una única conexión de
+    escritura de larga duración; las lecturas usan su propio pool.
+    """
+    url = f"sqlite:///{ruta}"
+    connect_args = {"check_same_thread": False, "timeout": 30}
+    escritor = create_engine(url, connect_args=connect_args, pool_size=1, max_overflow=0)
+    lectores = create_engine(url, connect_args=connect_args, pool_size=DB_WORKERS, max_overflow=0)
+    for motor in (escritor, lectores):
+        event.listen(motor, "connect", configurar_sqlite)
+    return escritor, lectores
+
+def crear_engine_mysql(host, port):
+    # create_engine no conecta: los fallos de MySQL aparecen al usar el pool y
+    # los absorbe el diario local (ver DiarioLocal). Los timeouts cortos evitan
+    # que un servidor caído bloquee los hilos de la base de datos. Sin
+    # pool_pre_ping: las conexiones ociosas las revisa GestorPool en segundo plano.
+    return create_engine(
+        f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD_ESCAPED}@{host}:{port}/{DB_NAME}",
+        connect_args={"connection_timeout": DB_CONNECT_TIMEOUT},
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT
     )
 
+# engine: escrituras. engine_lectura: lecturas que deben ver todo lo escrito
+# (se combinan con la cola de escritura). engine_replica: lecturas que toleran
+# retraso (historial, perfil), o None si no hay réplica; ver motor_lectura.
+engine_replica = None
+if DB_BACKEND == "sqlite":
+    engine, engine_lectura = crear_engines_sqlite(SQLITE_PATH)
+    print(f"✅ Usando SQLite en {SQLITE_PATH}")
+else:
+    engine = crear_engine_mysql(DB_HOST, DB_PORT)
+    engine_lectura = engine
     print("✅ Conexión a la base de datos configurada")
-except Exception as e:
-    print(f"❌ Error al conectar a la base de datos MySQL: {e}")
-    # Fallback a SQLite local
-    engine = create_engine('sqlite:///bot.db', pool_pre_ping=True)
-    print("✅ Usando SQLite como base de datos alternativa")
+    if DB_REPLICA_HOST:
+        engine_replica = crear_engine_mysql(DB_REPLICA_HOST, DB_REPLICA_PORT)
+        print(f"✅ Réplica de lectura en {DB_REPLICA_HOST}:{DB_REPLICA_PORT}")
 
 # =========================================================
-# FUNCIONES DE BASE DE DATOS
+# ESQUEMA Y SENTENCIAS (SQLALCHEMY CORE)
 # =========================================================
+# Las tablas se definen una sola vez: las mismas definiciones generan el DDL
+# de MySQL y de SQLite y construyen las consultas. Las sentencias se crean
+# aquí, a nivel de módulo, y cada llamada solo enlaza parámetros; SQLAlchemy
+# guarda la compilación en la caché del engine.
 
-def init_db():
-    """Inicializa las tablas en la base de datos"""
-    with engine.begin() as conn:
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS acciones (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id BIGINT NOT NULL,
-                guild_id BIGINT NOT NULL,
-                tipo VARCHAR(20) NOT NULL,
-                razon TEXT,
-                moderator_id BIGINT,
-                duracion VARCHAR(20),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                INDEX idx_user_guild (user_id, guild_id),
-                INDEX idx_tipo (tipo),
-                INDEX idx_fecha (created_at)
-            )
-        """))
-        
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS user_warns (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id BIGINT NOT NULL,
-                guild_id BIGINT NOT NULL,
-                total_warns INT DEFAULT 0,
-                last_warn_date TIMESTAMP NULL,
-                UNIQUE KEY unique_user_guild (user_id, guild_id)
-            )
-        """))
-    print("✅ Base de datos inicializada")
+metadata = MetaData()
+
+tabla_acciones = Table(
+    "acciones", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", BigInteger, nullable=False),
+    Column("guild_id", BigInteger, nullable=False),
+    Column("tipo", String(20), nullable=False),
+    Column("razon", Text),
+    Column("moderator_id", BigInteger),
+    Column("duracion", String(20)),
+    Column("created_at", TIMESTAMP, server_default=func.current_timestamp()),
+    Column("idempotency_key", String(64)),
+    Index("idx_user_guild", "user_id", "guild_id"),
+    Index("idx_tipo", "tipo"),
+    Index("idx_fecha", "created_at"),
+    Index("idx_historial", "guild_id", "user_id", "created_at", "id"),
+    Index("idx_exportacion", "guild_id", "created_at", "id"),
+    Index("uq_idempotency_key", "idempotency_key", unique=True),
+    sqlite_autoincrement=True
+)
+
+tabla_user_warns = Table(
+    "user_warns", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", BigInteger, nullable=False),
+    Column("guild_id", BigInteger, nullable=False),
+    Column("total_warns", Integer, server_default="0"),
+    Column("last_warn_date", TIMESTAMP, nullable=True),
+    UniqueConstraint("user_id", "guild_id", name="unique_user_guild"),
+    sqlite_autoincrement=True
+)
+
+tabla_guild_stats = Table(
+    "guild_stats", metadata,
+    Column("guild_id", BigInteger, primary_key=True, autoincrement=False),
+    Column("total_acciones", BigInteger, nullable=False, server_default="0"),
+    Column("total_warns", BigInteger, nullable=False, server_default="0")
+)
+
+tabla_outbox = Table(
+    "outbox", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("tipo", String(20), nullable=False),
+    Column("payload", Text, nullable=False),
+    Column("intentos", Integer, nullable=False, server_default="0"),
+    Column("proximo_intento", TIMESTAMP, nullable=False, server_default=func.current_timestamp()),
+    Column("created_at", TIMESTAMP, server_default=func.current_timestamp()),
+    Index("idx_proximo_intento", "proximo_intento"),
+    sqlite_autoincrement=True
+)
+
+# Acciones antiguas agregadas por usuario, tipo y mes (ver RETENCIÓN)
+tabla_acciones_resumen = Table(
+    "acciones_resumen", metadata,
+    Column("guild_id", BigInteger, primary_key=True, autoincrement=False),
+    Column("user_id", BigInteger, primary_key=True, autoincrement=False),
+    Column("tipo", String(20), primary_key=True),
+    Column("mes", String(7), primary_key=True),  # "AAAA-MM"
+    Column("total", Integer, nullable=False)
+)
+
+# Meses cuya partición de MySQL ya se ha resumido (ver resumir_acciones_sync)
+tabla_meses_resumidos = Table(
+    "meses_resumidos", metadata,
+    Column("mes", String(7), primary_key=True)  # "AAAA-MM"
+)
+
+def upsert(tabla, claves, cambios, valores=None, desde=None):
+    """INSERT (de `valores` o de la consulta `desde`) con su cláusula de conflicto según el dialecto.
+
+    `cambios(nuevos)` recibe las columnas de la fila rechazada y devuelve el
+    SET que se aplica a la fila existente.
+    """
+    sentencia = (sqlite.insert if engine.dialect.name == "sqlite" else mysql.insert)(tabla)
+    if desde is not None:
+        sentencia = sentencia.from_select(list(desde.selected_columns.keys()), desde)
+    else:
+        sentencia = sentencia.values(**valores)
+    if engine.dialect.name == "sqlite":
+        return sentencia.on_conflict_do_update(index_elements=claves, set_=cambios(sentencia.excluded))
+    return sentencia.on_duplicate_key_update(**cambios(sentencia.inserted))
+
+def upsert_sumando(tabla, claves, valores, sumar, fijar=None, desde=None):
+    """INSERT (de `valores` o de `desde`) que, si la fila ya existe, suma las columnas `sumar`"""
+    def cambios(nuevos):
+        resultado = {columna: tabla.c[columna] + nuevos[columna] for columna in sumar}
+        resultado.update(fijar or {})
+        return resultado
+    return upsert(tabla, claves, cambios, valores=valores, desde=desde)
+
+def _mismo_usuario(tabla):
+    return (tabla.c.user_id == bindparam("user_id")) & (tabla.c.guild_id == bindparam("guild_id"))
+
+# acciones
+SQL_INSERTAR_ACCION = insert(tabla_acciones)
+SQL_CLAVES_EXISTENTES = select(tabla_acciones.c.idempotency_key).where(
+    tabla_acciones.c.idempotency_key.in_(bindparam("claves", expanding=True))
+)
+_COLUMNAS_HISTORIAL = (
+    tabla_acciones.c.tipo, tabla_acciones.c.razon, tabla_acciones.c.moderator_id,
+    tabla_acciones.c.duracion, tabla_acciones.c.created_at
+)
+SQL_PAGINA_HISTORIAL = (
+    select(tabla_acciones.c.id, *_COLUMNAS_HISTORIAL)
+    .where(_mismo_usuario(tabla_acciones))
+    .order_by(tabla_acciones.c.created_at.desc(), tabla_acciones.c.id.desc())
+    .limit(bindparam("limit"))
+)
+SQL_PAGINA_HISTORIAL_CURSOR = SQL_PAGINA_HISTORIAL.where(
+    (tabla_acciones.c.created_at < bindparam("fecha"))
+    | ((tabla_acciones.c.created_at == bindparam("fecha")) & (tabla_acciones.c.id < bindparam("id_cursor")))
+)
+
+# Perfil: conteo por tipo (filas vivas y resumidas), contador de warns y
+# últimos warns en una sola consulta
+_recientes = (
+    select(
+        literal("warn").label("fila"), tabla_acciones.c.tipo, type_coerce(null(), Integer).label("total"),
+        tabla_acciones.c.razon, tabla_acciones.c.moderator_id, tabla_acciones.c.duracion,
+        tabla_acciones.c.created_at, tabla_acciones.c.id
+    )
+    .where(_mismo_usuario(tabla_acciones), tabla_acciones.c.tipo == "warn")
+    .order_by(tabla_acciones.c.created_at.desc(), tabla_acciones.c.id.desc())
+    .limit(bindparam("limit"))
+    .subquery("recientes")
+)
+SQL_PERFIL = union_all(
+    select(
+        literal("tipo").label("fila"), tabla_acciones.c.tipo, func.count().label("total"),
+        type_coerce(null(), Text).label("razon"), type_coerce(null(), BigInteger).label("moderator_id"),
+        type_coerce(null(), String).label("duracion"), type_coerce(null(), TIMESTAMP).label("created_at"),
+        type_coerce(null(), BigInteger).label("id")
+    )
+    .where(_mismo_usuario(tabla_acciones))
+    .group_by(tabla_acciones.c.tipo),
+    select(
+        literal("resumen"), tabla_acciones_resumen.c.tipo, func.sum(tabla_acciones_resumen.c.total),
+        null(), null(), null(), null(), null()
+    )
+    .where(_mismo_usuario(tabla_acciones_resumen))
+    .group_by(tabla_acciones_resumen.c.tipo),
+    select(
+        literal("warns"), null(), tabla_user_warns.c.total_warns, null(), null(), null(), null(), null()
+    )
+    .where(_mismo_usuario(tabla_user_warns)),
+    select(_recientes)
+)
+
+# user_warns
+SQL_CONTAR_WARNS = select(tabla_user_warns.c.total_warns).where(_mismo_usuario(tabla_user_warns))
+SQL_CARGAR_WARNS = (
+    select(tabla_user_warns.c.guild_id, tabla_user_warns.c.user_id, tabla_user_warns.c.total_warns)
+    .where(tabla_user_warns.c.total_warns > 0)
+    .order_by(tabla_user_warns.c.last_warn_date.desc())
+    .limit(bindparam("limit"))
+)
+# Nunca deja el contador en negativo. En un UPDATE los nombres de columna
+# están reservados para el SET, así que los parámetros llevan prefijo.
+SQL_DESCONTAR_WARNS = (
+    update(tabla_user_warns)
+    .where(
+        tabla_user_warns.c.user_id == bindparam("b_user_id"),
+        tabla_user_warns.c.guild_id == bindparam("b_guild_id"),
+        tabla_user_warns.c.total_warns >= bindparam("cantidad")
+    )
+    .values(total_warns=tabla_user_warns.c.total_warns - bindparam("cantidad"))
+)
+SQL_UPSERT_WARNS = upsert_sumando(
+    tabla_user_warns, ["user_id", "guild_id"],
+    {
+        "user_id": bindparam("user_id"),
+        "guild_id": bindparam("guild_id"),
+        "total_warns": bindparam("incremento"),
+        "last_warn_date": func.current_timestamp()
+    },
+    sumar=["total_warns"],
+    fijar={"last_warn_date": func.current_timestamp()}
+)
+
+# guild_stats
+SQL_GUILD_STATS = select(tabla_guild_stats.c.total_acciones, tabla_guild_stats.c.total_warns).where(
+    tabla_guild_stats.c.guild_id == bindparam("guild_id")
+)
+SQL_UPSERT_GUILD_STATS = upsert_sumando(
+    tabla_guild_stats, ["guild_id"],
+    {
+        "guild_id": bindparam("guild_id"),
+        "total_acciones": bindparam("acciones"),
+        "total_warns": bindparam("warns")
+    },
+    sumar=["total_acciones", "total_warns"]
+)
+_warns_por_guild = (
+    select(tabla_user_warns.c.guild_id, func.sum(tabla_user_warns.c.total_warns).label("total"))
+    .group_by(tabla_user_warns.c.guild_id)
+    .subquery("w")
+)
+
+def recuento_guild_stats(acciones_por_guild):
+    """INSERT ... SELECT que rellena `guild_stats` a partir de un recuento de acciones por servidor"""
+    return insert(tabla_guild_stats).from_select(
+        ["guild_id", "total_acciones", "total_warns"],
+        select(acciones_por_guild.c.guild_id, acciones_por_guild.c.total, func.coalesce(_warns_por_guild.c.total, 0))
+        .select_from(acciones_por_guild.outerjoin(
+            _warns_por_guild, _warns_por_guild.c.guild_id == acciones_por_guild.c.guild_id
+        ))
+    )
+
+# Recuento de la migración 3: anterior a `acciones_resumen` (migración 6),
+# así que solo puede leer `acciones` y `user_warns`. No cambiarlo.
+SQL_RECALCULAR_GUILD_STATS_V3 = recuento_guild_stats(
+    select(tabla_acciones.c.guild_id, func.count().label("total"))
+    .group_by(tabla_acciones.c.guild_id)
+    .subquery("a")
+)
+_acciones_y_resumen = union_all(
+    select(tabla_acciones.c.guild_id, func.count().label("total"))
+    .group_by(tabla_acciones.c.guild_id),
+    select(tabla_acciones_resumen.c.guild_id, func.sum(tabla_acciones_resumen.c.total))
+    .group_by(tabla_acciones_resumen.c.guild_id)
+).subquery("vivas_y_resumidas")
+_acciones_por_guild = (
+    select(_acciones_y_resumen.c.guild_id, func.sum(_acciones_y_resumen.c.total).label("total"))
+    .group_by(_acciones_y_resumen.c.guild_id)
+    .subquery("a")
+)
+SQL_RECALCULAR_GUILD_STATS = recuento_guild_stats(_acciones_por_guild)
+
+# Exportación: todas las columnas en orden cronológico, por bloques keyset
+# sobre (created_at, id) (se filtra al usarla)
+SQL_EXPORTAR = (
+    select(
+        tabla_acciones.c.id, tabla_acciones.c.created_at, tabla_acciones.c.guild_id,
+        tabla_acciones.c.user_id, tabla_acciones.c.tipo, tabla_acciones.c.razon,
+        tabla_acciones.c.moderator_id, tabla_acciones.c.duracion
+    )
+    .where(tabla_acciones.c.guild_id == bindparam("guild_id"))
+    .order_by(tabla_acciones.c.created_at, tabla_acciones.c.id)
+    .limit(bindparam("limit"))
+)
+# El `>=` redundante deja que el motor recorra el índice por rango
+SQL_EXPORTAR_CURSOR = SQL_EXPORTAR.where(
+    tabla_acciones.c.created_at >= bindparam("fecha"),
+    (tabla_acciones.c.created_at > bindparam("fecha"))
+    | ((tabla_acciones.c.created_at == bindparam("fecha")) & (tabla_acciones.c.id > bindparam("id_cursor")))
+)
+
+# Retención: resumir un mes y borrarlo. El resumen suma a lo ya resumido: las
+# filas que llegan tarde a un mes cerrado (backfill de auditoría, diario
+# local) se añaden a su total en vez de sustituirlo
+SQL_ACCION_MAS_ANTIGUA = select(func.min(tabla_acciones.c.created_at))
+_mes_de_acciones = (tabla_acciones.c.created_at >= bindparam("desde")) & (tabla_acciones.c.created_at < bindparam("hasta"))
+SQL_RESUMIR_MES = upsert_sumando(
+    tabla_acciones_resumen, ["guild_id", "user_id", "tipo", "mes"], None, ["total"],
+    desde=select(
+        tabla_acciones.c.guild_id, tabla_acciones.c.user_id, tabla_acciones.c.tipo,
+        bindparam("mes", type_=String).label("mes"), func.count().label("total")
+    )
+    .where(_mes_de_acciones)
+    .group_by(tabla_acciones.c.guild_id, tabla_acciones.c.user_id, tabla_acciones.c.tipo)
+)
+SQL_BORRAR_MES = delete(tabla_acciones).where(_mes_de_acciones)
+SQL_MESES_RESUMIDOS = select(tabla_meses_resumidos.c.mes)
+SQL_CERRAR_MES = insert(tabla_meses_resumidos).values(mes=bindparam("mes"))
+
+# outbox
+SQL_INSERTAR_EFECTO = insert(tabla_outbox).values(
+    tipo=bindparam("tipo"), payload=bindparam("payload"),
+    proximo_intento=bindparam("ahora"), created_at=bindparam("ahora")
+)
+SQL_OUTBOX_PENDIENTES = (
+    select(tabla_outbox.c.id, tabla_outbox.c.tipo, tabla_outbox.c.payload, tabla_outbox.c.intentos)
+    .where(tabla_outbox.c.proximo_intento <= bindparam("ahora"))
+    .order_by(tabla_outbox.c.id)
+    .limit(bindparam("limit"))
+)
+SQL_OUTBOX_BORRAR = delete(tabla_outbox).where(tabla_outbox.c.id == bindparam("fila_id"))
+SQL_OUTBOX_REPROGRAMAR = (
+    update(tabla_outbox)
+    .where(tabla_outbox.c.id == bindparam("fila_id"))
+    .values(intentos=tabla_outbox.c.intentos + 1, proximo_intento=bindparam("proximo"))
+)
+
+SQL_SONDEO = text("SELECT 1")
+
+# =========================================================
+# MÉTRICAS (PROMETHEUS)
+# =========================================================
+
+COMANDO_LATENCIA = Histogram(
+    "bot_comando_latencia_segundos", "Latencia de los comandos", ["comando"]
+)
+DB_CONSULTAS = Counter(
+    "bot_db_consultas_total", "Sentencias SQL ejecutadas por helper", ["helper"]
+)
+DB_CONSULTA_DURACION = Histogram(
+    "bot_db_consulta_segundos", "Duración de las sentencias SQL por helper", ["helper"]
+)
+DB_POOL_ESPERA = Histogram(
+    "bot_db_pool_espera_segundos", "Espera hasta obtener una conexión del pool"
+)
+DB_POOL_CONEXIONES = Gauge(
+    "bot_db_pool_conexiones", "Conexiones del pool por estado", ["estado"]
+)
+DISCORD_RATE_LIMITS = Counter(
+    "bot_discord_rate_limits_total", "Respuestas 429 de la API de Discord", ["alcance"]
+)
+GATEWAY_LATENCIA = Gauge(
+    "bot_gateway_latencia_segundos", "Latencia del heartbeat del gateway"
+)
+EVENT_LOOP_LAG = Gauge(
+    "bot_event_loop_lag_segundos", "Retraso del event loop respecto a lo programado"
+)
+DB_POOL_INVALIDADAS = Counter(
+    "bot_db_pool_invalidadas_total", "Conexiones ociosas descartadas por no responder"
+)
+DB_CIRCUITO_ESTADO = Gauge(
+    "bot_db_circuito_estado", "Estado del circuito de la BD (0 cerrado, 1 semiabierto, 2 abierto)"
+)
+DB_LECTURAS_OBSOLETAS = Counter(
+    "bot_db_lecturas_obsoletas_total", "Lecturas servidas desde la caché con la BD caída", ["helper"]
+)
+
+GATEWAY_LATENCIA.set_function(lambda: bot.latency)
+for estado, medir in {
+    "tamano": lambda: engine.pool.size(),
+    "en_uso": lambda: engine.pool.checkedout(),
+    "libres": lambda: engine.pool.checkedin(),
+    "overflow": lambda: engine.pool.overflow()
+}.items():
+    DB_POOL_CONEXIONES.labels(estado).set_function(medir)
+DB_CIRCUITO_ESTADO.set_function(
+    lambda: {"cerrado": 0, "semiabierto": 1, "abierto": 2}[circuito_db.estado]
+)
+
+# Helper de BD que se está ejecutando en cada hilo del pool
+contexto_db = threading.local()
 
-def registrar_accion(user_id, guild_id, tipo, razon, moderator_id, duracion=None):
-    """Registra una acción en la base de datos"""
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_de_sentencia(conn, cursor, statement, parameters, context, executemany):
+    # En el contexto de ejecución y no en la conexión: si la sentencia falla,
+    # after_cursor_execute no llega y no debe quedar nada en la conexión del pool
+    context.inicio_sentencia = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues_de_sentencia(conn, cursor, statement, parameters, context, executemany):
+    inicio = context.inicio_sentencia
+    helper = getattr(contexto_db, "helper", None) or "otros"
+    DB_CONSULTAS.labels(helper).inc()
+    DB_CONSULTA_DURACION.labels(helper).observe(time.perf_counter() - inicio)
+
+@event.listens_for(Engine, "handle_error")
+def _error_de_sentencia(context):
+    # Solo cuentan para el circuito los fallos del servidor o de la conexión,
+    # no los errores de integridad o de SQL
+    if context.is_disconnect or isinstance(
+        context.sqlalchemy_exception, (exc.OperationalError, exc.InterfaceError)
+    ):
+        contexto_db.fallo = True
+
+@event.listens_for(Pool, "checkout")
+def _conexion_obtenida(dbapi_connection, connection_record, connection_proxy):
+    # Solo se mide la primera conexión de cada llamada a un helper
+    inicio = getattr(contexto_db, "inicio", None)
+    if inicio is not None:
+        espera = time.perf_counter() - inicio
+        DB_POOL_ESPERA.observe(espera)
+        gestor_pool.anotar_espera(espera)
+        contexto_db.inicio = None
+
+class ContadorRateLimits(logging.Handler):
+    """Cuenta los avisos de rate limit que discord.py registra en su logger HTTP"""
+
+    def emit(self, record):
+        mensaje = record.getMessage()
+        if "rate limited" in mensaje:
+            DISCORD_RATE_LIMITS.labels("global" if "global" in mensaje.lower() else "ruta").inc()
+
+_contador_rate_limits = ContadorRateLimits(level=logging.WARNING)
+logging.getLogger("discord.http").addHandler(_contador_rate_limits)
+
+async def medir_event_loop(intervalo=0.5):
+    """Tarea de fondo: mide cuánto se retrasa el event loop"""
+    while True:
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        EVENT_LOOP_LAG.set(max(0.0, time.perf_counter() - inicio - intervalo))
+
+# Helpers largos por naturaleza: su duración no cuenta para el SLO del circuito
+HELPERS_SIN_SLO = {"exportar_acciones", "mantener_acciones", "reconstruir", "revisar"}
+
+def _ejecutar_medido(nombre, func):
+    contexto_db.helper = nombre
+    contexto_db.inicio = inicio = time.perf_counter()
+    contexto_db.fallo = False
     try:
-        with engine.begin() as conn:
-            conn.execute(
-                text("""
-                    INSERT INTO acciones (user_id, guild_id, tipo, razon, moderator_id, duracion)
-                    VALUES (:user_id, :guild_id, :tipo, :razon, :moderator_id, :duracion)
-                """),
-                {
-                    "user_id": user_id,
-                    "guild_id": guild_id,
-                    "tipo": tipo,
-                    "razon": razon,
-                    "moderator_id": moderator_id,
-                    "duracion": duracion
-                }
-            )
+        return func()
+    except exc.SQLAlchemyError:
+        contexto_db.fallo = True
+        raise
+    finally:
+        duracion = 0.0 if nombre in HELPERS_SIN_SLO else time.perf_counter() - inicio
+        circuito_db.registrar(not contexto_db.fallo, duracion)
+        contexto_db.helper = None
+        contexto_db.inicio = None
+
+# Las consultas son síncronas: se ejecutan en un pool de hilos acotado para no
+# bloquear el event loop (gateway, heartbeats y resto de comandos)
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+
+# Llamadas a ejecutar_db sin terminar (solo se toca desde el event loop)
+tareas_db = 0
+
+async def ejecutar_db(func, *args, **kwargs):
+    """Ejecuta una función síncrona de base de datos en el pool de hilos de la BD"""
+    global tareas_db
+    loop = asyncio.get_running_loop()
+    # Las métricas agrupan las sentencias por helper (sin el sufijo _sync)
+    nombre = func.__name__.removesuffix("_sync")
+    tareas_db += 1
+    try:
+        # Se copia el contexto para que el hilo vea las contextvars del comando (ver motor_lectura)
+        return await loop.run_in_executor(
+            db_executor, copy_context().run, _ejecutar_medido, nombre, functools.partial(func, *args, **kwargs)
+        )
+    finally:
+        tareas_db -= 1
+
+# True si el comando en curso debe leer del primario aunque haya réplica
+lectura_primaria = ContextVar("lectura_primaria", default=False)
+
+# Actor -> instante (monotonic) hasta el que sus lecturas van al primario
+escrituras_recientes = {}
+
+def anotar_escritura(actor_id):
+    """Fija al primario las lecturas de quien acaba de escribir (read-your-writes)"""
+    if engine_replica is None:
+        return
+    ahora = time.monotonic()
+    escrituras_recientes[actor_id] = ahora + DB_REPLICA_FIJAR_SEGUNDOS
+    lectura_primaria.set(True)
+    if len(escrituras_recientes) > 1000:
+        for actor, hasta in list(escrituras_recientes.items()):
+            if hasta < ahora:
+                del escrituras_recientes[actor]
+
+def fijar_lecturas(actor_id):
+    """Elige primario o réplica para el comando o interacción de `actor_id`"""
+    if engine_replica is not None:
+        lectura_primaria.set(escrituras_recientes.get(actor_id, 0) > time.monotonic())
+
+def motor_lectura():
+    """Engine para lecturas que toleran retraso: la réplica salvo que el actor acabe de escribir"""
+    if engine_replica is None or lectura_primaria.get():
+        return engine_lectura
+    return engine_replica
+
+class BaseDatosNoDisponible(Exception):
+    """La base de datos no responde y la lectura no está en caché"""
+
+class CircuitoDB:
+    """Circuit breaker de la capa de datos (cerrado / abierto / semiabierto).
+
+    Se abre tras `umbral` llamadas seguidas que fallan o superan el SLO de
+    latencia. Abierto, las lecturas se sirven desde `lecturas_cache` y las
+    escrituras van al diario local sin tocar la red; una tarea de fondo lo
+    pasa a semiabierto cada `espera` segundos y lo cierra si el sondeo responde.
+    """
+
+    def __init__(self, umbral, slo, espera):
+        self.umbral = umbral
+        self.slo = slo
+        self.espera = espera
+        self.estado = "cerrado"
+        self.fallos = 0
+        self.abierto_desde = 0.0
+        self.lock = threading.Lock()
+
+    def permite(self):
+        return self.estado == "cerrado"
+
+    def registrar(self, ok, duracion):
+        """Anota el resultado de una llamada (desde los hilos de la BD)"""
+        with self.lock:
+            if ok and duracion <= self.slo:
+                self.fallos = 0
+                return
+            self.fallos += 1
+            if self.estado == "cerrado" and self.fallos >= self.umbral:
+                self._abrir()
+
+    def _abrir(self):
+        # Llamar con self.lock adquirido
+        self.estado = "abierto"
+        self.abierto_desde = time.monotonic()
+        print(f"🔌 Circuito de la base de datos abierto tras {self.fallos} fallos")
+
+    def sondear_sync(self):
+        with engine.connect() as conn:
+            conn.execute(SQL_SONDEO)
+
+    async def ejecutar(self):
+        """Tarea de fondo: sondea la base de datos mientras el circuito está abierto"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(1)
+            if self.estado != "abierto" or time.monotonic() - self.abierto_desde < self.espera:
+                continue
             
-            if tipo == 'warn':
-                conn.execute(
-                    text("""
-                        INSERT INTO user_warns (user_id, guild_id, total_warns, last_warn_date)
-                        VALUES (:user_id, :guild_id, 1, NOW())
-                        ON DUPLICATE KEY UPDATE 
-                        total_warns = total_warns + 1,
-                        last_warn_date = NOW()
-                    """),
-                    {"user_id": user_id, "guild_id": guild_id}
+            self.estado = "semiabierto"
+            inicio = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    loop.run_in_executor(db_executor, self.sondear_sync), timeout=self.slo
                 )
-        return True
-    except Exception as e:
-        print(f"❌ Error al registrar acción: {e}")
-        return False
+                ok = True
+            except Exception:
+                ok = False
+            
+            with self.lock:
+                if ok and time.perf_counter() - inicio <= self.slo:
+                    self.estado = "cerrado"
+                    self.fallos = 0
+                    print("✅ Circuito de la base de datos cerrado")
+                else:
+                    self._abrir()
 
-def contar_warns(user_id, guild_id):
-    """Cuenta los warns de un usuario"""
-    try:
-        with engine.begin() as conn:
-            result = conn.execute(
-                text("""
-                    SELECT total_warns FROM user_warns
-                    WHERE user_id = :user_id AND guild_id = :guild_id
-                """),
-                {"user_id": user_id, "guild_id": guild_id}
-            ).fetchone()
-            return result[0] if result else 0
-    except Exception as e:
-        print(f"❌ Error al contar warns: {e}")
+circuito_db = CircuitoDB(DB_CIRCUITO_FALLOS, DB_SLO_SEGUNDOS, DB_CIRCUITO_ESPERA)
+
+class LecturasCache:
+    """Último resultado correcto de cada lectura, acotado (LRU).
+
+    Solo se usa cuando la base de datos no responde, para contestar con datos
+    algo antiguos en lugar de esperar a un timeout.
+    """
+
+    def __init__(self, capacidad):
+        self.capacidad = capacidad
+        self.datos = OrderedDict()  # (helper, argumentos) -> resultado
+
+    def obtener(self, clave):
+        resultado = self.datos.get(clave)
+        if resultado is not None:
+            self.datos.move_to_end(clave)
+        return resultado
+
+    def guardar(self, clave, resultado):
+        self.datos[clave] = resultado
+        self.datos.move_to_end(clave)
+        while len(self.datos) > self.capacidad:
+            self.datos.popitem(last=False)
+
+lecturas_cache = LecturasCache(DB_LECTURAS_CACHE_SIZE)
+
+class GestorPool:
+    """Revisa en segundo plano las conexiones ociosas del pool.
+
+    Sustituye a `pool_pre_ping`, que añadía un SELECT 1 a cada checkout: cada
+    `intervalo` segundos se toman las conexiones libres de una en una, se hace
+    ping a cada una y se invalidan las que no responden. También lleva las estadísticas
+    de espera del pool para /healthz.
+    """
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.invalidadas = 0
+        self.lock = threading.Lock()
+
+    def anotar_espera(self, espera):
+        with self.lock:
+            self.esperas += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+
+    def revisar_sync(self):
+        """Hace ping a las conexiones libres y descarta las caídas (bloqueante)"""
+        revisadas = self._revisar_pool(engine.pool)
+        if engine_replica is not None:
+            revisadas += self._revisar_pool(engine_replica.pool)
+        return revisadas
+
+    def _revisar_pool(self, pool):
+        # De una en una, para no dejar sin conexiones a los comandos mientras
+        # tanto. El pool es FIFO: cada conexión devuelta va al final de la
+        # cola, así que tomar tantas como había libres recorre cada una una vez.
+        revisadas = 0
+        for _ in range(pool.checkedin()):
+            if pool.checkedin() == 0:
+                # Las demás están en uso: ya se comprobarán en la próxima pasada
+                break
+            conexion = pool.connect()
+            try:
+                cursor = conexion.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+                cursor.close()
+            except Exception:
+                conexion.invalidate()
+                with self.lock:
+                    self.invalidadas += 1
+                DB_POOL_INVALIDADAS.inc()
+            finally:
+                conexion.close()
+            revisadas += 1
+        return revisadas
+
+    def estadisticas(self):
+        pool = engine.pool
+        with self.lock:
+            return {
+                "tamano": pool.size(),
+                "en_uso": pool.checkedout(),
+                "libres": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "espera_media_ms": round(1000 * self.espera_total / self.esperas, 2) if self.esperas else 0.0,
+                "espera_max_ms": round(1000 * self.espera_max, 2),
+                "invalidadas": self.invalidadas
+            }
+
+    async def ejecutar(self):
+        """Tarea de fondo: revisa las conexiones ociosas cada `intervalo` segundos"""
+        while True:
+            await asyncio.sleep(self.intervalo)
+            # Con el circuito abierto ya se encarga el sondeo
+            if not circuito_db.permite():
+                continue
+            try:
+                await ejecutar_db(self.revisar_sync)
+            except Exception as e:
+                print(f"❌ Error al revisar el pool de conexiones: {e}")
+
+gestor_pool = GestorPool(DB_POOL_CHEQUEO_INTERVALO)
+
+# True si el comando en curso ha recibido datos de `lecturas_cache`
+lectura_obsoleta = ContextVar("lectura_obsoleta", default=False)
+
+async def ejecutar_lectura(func, *args):
+    """Ejecuta una lectura protegida por el circuito de la base de datos.
+
+    Los helpers de lectura no capturan los errores de la base de datos: aquí
+    cuentan como fallo para el circuito (ver `_ejecutar_medido`) y se sirve la
+    última copia correcta, o BaseDatosNoDisponible si no la hay. Solo se
+    guardan en `lecturas_cache` los resultados de lecturas que han ido bien.
+    """
+    clave = (func.__name__, args)
+    if circuito_db.permite():
+        try:
+            resultado = await ejecutar_db(func, *args)
+        except exc.SQLAlchemyError as e:
+            print(f"❌ Error en la lectura {func.__name__}: {e}")
+        else:
+            lecturas_cache.guardar(clave, resultado)
+            return resultado
+    
+    guardado = lecturas_cache.obtener(clave)
+    if guardado is None:
+        raise BaseDatosNoDisponible()
+    DB_LECTURAS_OBSOLETAS.labels(func.__name__.removesuffix("_sync")).inc()
+    lectura_obsoleta.set(True)
+    return guardado
+
+# =========================================================
+# MIGRACIONES DE ESQUEMA
+# =========================================================
+# Cada migración se aplica una sola vez, en orden, y queda anotada en
+# `schema_version`. Se ejecutan antes de `bot.run`: las reconexiones del
+# gateway (on_ready) no hacen DDL. Para cambiar el esquema, actualizar su
+# definición en ESQUEMA y añadir un paso nuevo al final de MIGRACIONES que
+# lleve a ella las bases de datos existentes; nunca modificar uno ya publicado.
+
+def crear_indice(conn, tabla, nombre, columnas, unico=False):
+    """Crea un índice si no existe (en línea, sin bloquear escrituras, en MySQL)"""
+    if nombre in {indice["name"] for indice in inspect(conn).get_indexes(tabla)}:
+        return
+    tipo = "UNIQUE INDEX" if unico else "INDEX"
+    if conn.dialect.name == "mysql":
+        conn.execute(text(f"ALTER TABLE {tabla} ADD {tipo} {nombre} ({columnas}), ALGORITHM=INPLACE, LOCK=NONE"))
+    else:
+        conn.execute(text(f"CREATE {tipo} {nombre} ON {tabla} ({columnas})"))
+
+def agregar_columna(conn, tabla, nombre, definicion):
+    """Añade una columna si no existe (en línea, sin bloquear escrituras, en MySQL)"""
+    if nombre in {columna["name"] for columna in inspect(conn).get_columns(tabla)}:
+        return
+    if conn.dialect.name == "mysql":
+        conn.execute(text(f"ALTER TABLE {tabla} ADD COLUMN {nombre} {definicion}, ALGORITHM=INPLACE, LOCK=NONE"))
+    else:
+        conn.execute(text(f"ALTER TABLE {tabla} ADD COLUMN {nombre} {definicion}"))
+
+def inicio_mes(fecha):
+    return fecha.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def mes_siguiente(mes):
+    return (mes.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def mes_anterior(mes):
+    return (mes - timedelta(days=1)).replace(day=1)
+
+def nombre_particion(mes):
+    return f"p{mes:%Y%m}"
+
+def definicion_particion(mes):
+    """Partición de MySQL con las acciones de `mes` (y anteriores, si es la primera)"""
+    return (
+        f"PARTITION {nombre_particion(mes)} "
+        f"VALUES LESS THAN (UNIX_TIMESTAMP('{mes_siguiente(mes):%Y-%m-%d}'))"
+    )
+
+def particiones_acciones(conn):
+    """Nombres de las particiones de `acciones` en MySQL (vacío si no está particionada)"""
+    return set(conn.execute(text("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'acciones' AND PARTITION_NAME IS NOT NULL
+    """)).scalars())
+
+# Las tablas nuevas se crean desde su definición en ESQUEMA (ya con todas sus
+# columnas e índices); los pasos posteriores solo alteran bases de datos
+# creadas antes, por eso comprueban lo que ya existe
+
+def migracion_esquema_inicial(conn):
+    metadata.create_all(conn, tables=[tabla_acciones, tabla_user_warns])
+    # Tablas de antes de las migraciones
+    crear_indice(conn, "acciones", "idx_user_guild", "user_id, guild_id")
+    crear_indice(conn, "acciones", "idx_tipo", "tipo")
+    crear_indice(conn, "acciones", "idx_fecha", "created_at")
+
+def migracion_indice_historial(conn):
+    # Paginación keyset del historial
+    crear_indice(conn, "acciones", "idx_historial", "guild_id, user_id, created_at, id")
+
+def migracion_guild_stats(conn):
+    tabla_guild_stats.create(conn, checkfirst=True)
+    # Bases de datos con historial previo: calcular los contadores una vez
+    if conn.execute(select(func.count()).select_from(tabla_guild_stats)).scalar() == 0:
+        conn.execute(SQL_RECALCULAR_GUILD_STATS_V3)
+
+def migracion_outbox(conn):
+    # Efectos secundarios (logs y DMs) pendientes de entregar
+    tabla_outbox.create(conn, checkfirst=True)
+
+def migracion_clave_idempotencia(conn):
+    # Cada acción encolada lleva una clave única: reenviar el diario local
+    # no duplica filas aunque un lote ya se hubiera escrito
+    agregar_columna(conn, "acciones", "idempotency_key", "VARCHAR(64) NULL")
+    crear_indice(conn, "acciones", "uq_idempotency_key", "idempotency_key", unico=True)
+
+def migracion_particiones(conn):
+    tabla_acciones_resumen.create(conn, checkfirst=True)
+    if conn.dialect.name != "mysql" or particiones_acciones(conn):
+        return
+    # MySQL exige que la columna de particionado esté en todas las claves
+    # únicas. Reescribe la tabla entera: puede tardar con mucho historial.
+    conn.execute(text("UPDATE acciones SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"))
+    conn.execute(text("""
+        ALTER TABLE acciones
+        MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at),
+        DROP INDEX uq_idempotency_key, ADD UNIQUE INDEX uq_idempotency_key (idempotency_key, created_at)
+    """))
+    
+    # Una partición por mes desde la acción más antigua hasta los próximos meses
+    primera = conn.execute(SQL_ACCION_MAS_ANTIGUA).scalar()
+    ultimo = inicio_mes(datetime.utcnow())
+    for _ in range(DB_PARTICIONES_FUTURAS):
+        ultimo = mes_siguiente(ultimo)
+    mes = inicio_mes(primera) if primera else inicio_mes(datetime.utcnow())
+    definiciones = []
+    while mes <= ultimo:
+        definiciones.append(definicion_particion(mes))
+        mes = mes_siguiente(mes)
+    definiciones.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    conn.execute(text(
+        f"ALTER TABLE acciones PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) ({', '.join(definiciones)})"
+    ))
+
+def migracion_indice_exportacion(conn):
+    # Bloques keyset de la exportación de un servidor entero
+    crear_indice(conn, "acciones", "idx_exportacion", "guild_id, created_at, id")
+
+def migracion_meses_resumidos(conn):
+    # El resumen pasa a sumarse: los meses ya resumidos cuya partición no se
+    # llegó a borrar no deben volver a sumarse
+    tabla_meses_resumidos.create(conn, checkfirst=True)
+
+# (versión, descripción, función) en orden de aplicación
+MIGRACIONES = [
+    (1, "Tablas acciones y user_warns", migracion_esquema_inicial),
+    (2, "Índice idx_historial en acciones", migracion_indice_historial),
+    (3, "Tabla guild_stats", migracion_guild_stats),
+    (4, "Tabla outbox", migracion_outbox),
+    (5, "Clave de idempotencia en acciones", migracion_clave_idempotencia),
+    (6, "Particiones mensuales y tabla acciones_resumen", migracion_particiones),
+    (7, "Índice idx_exportacion en acciones", migracion_indice_exportacion),
+    (8, "Tabla meses_resumidos", migracion_meses_resumidos),
+]
+
+def aplicar_migraciones():
+    """Aplica las migraciones pendientes (bloqueante, una vez al arrancar)"""
+    with engine.connect() as conn:
+        es_mysql = conn.dialect.name == "mysql"
+        if es_mysql:
+            # Evita que dos instancias migren a la vez (0 o NULL: no se obtuvo)
+            obtenido = conn.execute(text("SELECT GET_LOCK('bot_migraciones', 300)")).scalar()
+            conn.commit()
+            if obtenido != 1:
+                raise RuntimeError("otra instancia lleva más de 300s migrando el esquema")
+        
+        try:
+            with conn.begin():
+                conn.execute(text("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INT PRIMARY KEY,
+                        descripcion VARCHAR(200) NOT NULL,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """))
+                aplicadas = set(conn.execute(text("SELECT version FROM schema_version")).scalars())
+            
+            for version, descripcion, migrar in MIGRACIONES:
+                if version in aplicadas:
+                    continue
+                # En MySQL el DDL hace commit implícito: los pasos son idempotentes
+                # para poder repetirse si una migración se interrumpe a medias
+                with conn.begin():
+                    migrar(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_version (version, descripcion) VALUES (:version, :descripcion)"),
+                        {"version": version, "descripcion": descripcion}
+                    )
+                print(f"✅ Migración {version} aplicada: {descripcion}")
+        finally:
+            if es_mysql:
+                conn.execute(text("SELECT RELEASE_LOCK('bot_migraciones')"))
+    
+    print(f"✅ Esquema de base de datos en la versión {MIGRACIONES[-1][0]}")
+
+# =========================================================
+# RETENCIÓN Y PARTICIONES
+# =========================================================
+# Las acciones de más de DB_RETENCION_MESES meses se resumen en
+# `acciones_resumen` (una fila por servidor, usuario, tipo y mes) y se borran:
+# en MySQL eliminando la partición del mes, en SQLite con un DELETE. Los
+# totales del perfil y de `guild_stats` suman filas vivas y resumidas.
+
+def crear_particiones_futuras(conn, mes_actual):
+    """Divide `pmax` para que existan las particiones de los próximos meses"""
+    existentes = particiones_acciones(conn)
+    if not existentes:
+        return
+    mes = mes_actual
+    nuevas = []
+    for _ in range(DB_PARTICIONES_FUTURAS + 1):
+        if nombre_particion(mes) not in existentes:
+            nuevas.append(definicion_particion(mes))
+        mes = mes_siguiente(mes)
+    if nuevas:
+        nuevas.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+        conn.execute(text(f"ALTER TABLE acciones REORGANIZE PARTITION pmax INTO ({', '.join(nuevas)})"))
+        print(f"✅ {len(nuevas) - 1} particiones nuevas en acciones")
+
+def resumir_acciones_sync(corte):
+    """Resume y borra, mes a mes, las acciones anteriores a `corte` (bloqueante)"""
+    with engine.connect() as conn:
+        primera = conn.execute(SQL_ACCION_MAS_ANTIGUA).scalar()
+        particiones = particiones_acciones(conn) if conn.dialect.name == "mysql" else set()
+        cerrados = set(conn.execute(SQL_MESES_RESUMIDOS).scalars())
+    if primera is None:
         return 0
+    
+    meses = 0
+    mes = inicio_mes(primera)
+    while mes < corte:
+        params = {"mes": f"{mes:%Y-%m}", "desde": mes, "hasta": mes_siguiente(mes)}
+        particion = nombre_particion(mes)
+        if particion not in particiones:
+            # Resumen y borrado en la misma transacción: cada fila se suma una vez
+            with engine.begin() as conn:
+                conn.execute(SQL_RESUMIR_MES, params)
+                conn.execute(SQL_BORRAR_MES, params)
+        else:
+            # DROP PARTITION es DDL y no entra en la transacción del resumen: el
+            # mes queda anotado para no sumarlo otra vez si se corta entre ambos
+            if params["mes"] not in cerrados:
+                with engine.begin() as conn:
+                    conn.execute(SQL_RESUMIR_MES, params)
+                    conn.execute(SQL_CERRAR_MES, params)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE acciones DROP PARTITION {particion}"))
+        meses += 1
+        mes = mes_siguiente(mes)
+    return meses
 
-def obtener_historial(user_id, guild_id, limit=15):
-    """Obtiene el historial de un usuario"""
-    try:
+def mantener_acciones_sync():
+    """Prepara las particiones futuras y aplica la retención (bloqueante)"""
+    mes_actual = inicio_mes(datetime.utcnow())
+    if engine.dialect.name == "mysql":
         with engine.begin() as conn:
-            acciones = conn.execute(
-                text("""
-                    SELECT tipo, razon, moderator_id, duracion, created_at
-                    FROM acciones
-                    WHERE user_id = :user_id AND guild_id = :guild_id
-                    ORDER BY created_at DESC
-                    LIMIT :limit
-                """),
-                {"user_id": user_id, "guild_id": guild_id, "limit": limit}
-            ).fetchall()
+            crear_particiones_futuras(conn, mes_actual)
+    
+    if DB_RETENCION_MESES > 0:
+        corte = mes_actual
+        for _ in range(DB_RETENCION_MESES):
+            corte = mes_anterior(corte)
+        meses = resumir_acciones_sync(corte)
+        if meses:
+            print(f"✅ {meses} meses de acciones resumidos (anteriores a {corte:%Y-%m})")
+
+async def mantener_acciones(intervalo=86400):
+    """Tarea de fondo: mantenimiento diario de `acciones`"""
+    while True:
+        if circuito_db.permite():
+            try:
+                await ejecutar_db(mantener_acciones_sync)
+            except Exception as e:
+                print(f"❌ Error en el mantenimiento de acciones: {e}")
+        await asyncio.sleep(intervalo)
+
+class CacheWarns:
+    """Contadores de warns en memoria con escritura directa (write-through).
+
+    Se carga desde `user_warns` con un único SELECT al arrancar y se mantiene
+    al día con cada warn/unwarn, de modo que las lecturas no tocan la base de
+    datos. La memoria está acotada: los usuarios menos usados se expulsan (LRU).
+    """
+
+    def __init__(self, capacidad):
+        self.capacidad = capacidad
+        self.datos = OrderedDict()  # (guild_id, user_id) -> total de warns
+        # Servidores cuyos contadores están todos en memoria: un usuario que
+        # no aparece tiene 0 warns y no hace falta consultar la base de datos
+        self.guilds_completos = set()
+        self.cargado = False
+        self.aciertos = 0
+        self.fallos = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.datos)
+
+    @property
+    def tasa_aciertos(self):
+        total = self.aciertos + self.fallos
+        return self.aciertos / total if total else 0.0
+
+    def cargar_sync(self):
+        """Carga masiva inicial desde `user_warns` (bloqueante)"""
+        try:
+            with buffer_acciones.lock_escritura, engine_lectura.begin() as conn:
+                filas = conn.execute(SQL_CARGAR_WARNS, {"limit": self.capacidad}).fetchall()
+                
+                with buffer_acciones.lock, self.lock:
+                    self.datos.clear()
+                    # Las filas vienen de más a menos reciente
+                    for guild_id, user_id, total in reversed(filas):
+                        self.datos[(guild_id, user_id)] = total
+                    
+                    if len(filas) < self.capacidad:
+                        self.guilds_completos = {guild.id for guild in bot.guilds}
+                        self.guilds_completos.update(guild_id for guild_id, _ in self.datos)
+                    else:
+                        self.guilds_completos = set()
+                    
+                    # Sumar los warns que siguen en la cola de escritura o en el diario
+                    pendientes = list(buffer_acciones.warns.items()) + list(diario_local.warns.items())
+                    for (user_id, guild_id), incremento in pendientes:
+                        clave = (guild_id, user_id)
+                        if clave in self.datos:
+                            self.datos[clave] += incremento
+                        elif guild_id in self.guilds_completos:
+                            self.datos[clave] = incremento
+                    self._recortar()
             
-            # Convertir a lista de diccionarios
-            return [
-                {
-                    "tipo": tipo,
-                    "razon": razon,
-                    "moderator_id": moderator_id,
-                    "duracion": duracion,
-                    "fecha": created_at
-                }
-                for tipo, razon, moderator_id, duracion, created_at in acciones
-            ]
-    except Exception as e:
-        print(f"❌ Error al obtener historial: {e}")
-        return []
+            self.cargado = True
+            print(f"✅ Caché de warns cargada ({len(self.datos)} usuarios)")
+        except Exception as e:
+            print(f"❌ Error al cargar la caché de warns: {e}")
 
-def reset_warns(user_id, guild_id):
-    """Resetea los warns de un usuario"""
-    try:
-        with engine.begin() as conn:
+    def obtener(self, user_id, guild_id):
+        """Devuelve el total de warns, o None si no está en memoria"""
+        clave = (guild_id, user_id)
+        with self.lock:
+            total = self.datos.get(clave)
+            if total is not None:
+                self.datos.move_to_end(clave)
+                self.aciertos += 1
+                return total
+            if guild_id in self.guilds_completos:
+                self.aciertos += 1
+                return 0
+            self.fallos += 1
+            return None
+
+    def guardar(self, user_id, guild_id, total):
+        """Fija el total de warns de un usuario"""
+        clave = (guild_id, user_id)
+        with self.lock:
+            self.datos[clave] = total
+            self.datos.move_to_end(clave)
+            self._recortar()
+
+    def incrementar(self, user_id, guild_id, cantidad=1):
+        """Suma warns a un usuario si su contador es conocido"""
+        clave = (guild_id, user_id)
+        with self.lock:
+            if clave in self.datos:
+                self.datos[clave] += cantidad
+                self.datos.move_to_end(clave)
+            elif guild_id in self.guilds_completos:
+                self.datos[clave] = cantidad
+                self._recortar()
+            # Si no es conocido, la próxima lectura lo traerá de la base de datos
+
+    def invalidar(self, user_id, guild_id):
+        """Olvida el contador de un usuario (se releerá de la base de datos)"""
+        with self.lock:
+            self.datos.pop((guild_id, user_id), None)
+            self.guilds_completos.discard(guild_id)
+
+    def invalidar_guild(self, guild_id):
+        """Olvida todos los contadores de un servidor"""
+        with self.lock:
+            for clave in [clave for clave in self.datos if clave[0] == guild_id]:
+                del self.datos[clave]
+            self.guilds_completos.discard(guild_id)
+
+    def _recortar(self):
+        # Llamar con self.lock adquirido
+        while len(self.datos) > self.capacidad:
+            (guild_id, _), _ = self.datos.popitem(last=False)
+            self.guilds_completos.discard(guild_id)
+
+cache_warns = CacheWarns(WARNS_CACHE_SIZE)
+
+class EstadisticasGuilds:
+    """Totales de moderación por servidor mantenidos de forma incremental.
+
+    La tabla `guild_stats` se actualiza en la misma transacción que cada lote
+    de acciones y este espejo en memoria al encolarlas, así que leer los
+    totales de un servidor es O(1) en lugar de recorrer `acciones`.
+    """
+
+    def __init__(self):
+        self.datos = {}  # guild_id -> [total_acciones, total_warns]
+        self.lock = threading.Lock()
+
+    def obtener(self, guild_id):
+        """Devuelve (total_warns, total_acciones), o None si no está en memoria"""
+        with self.lock:
+            totales = self.datos.get(guild_id)
+            return (totales[1], totales[0]) if totales else None
+
+    def sumar(self, guild_id, acciones=0, warns=0):
+        """Aplica un incremento si el servidor está en memoria"""
+        with self.lock:
+            totales = self.datos.get(guild_id)
+            if totales:
+                totales[0] += acciones
+                totales[1] += warns
+            # Si no lo está, la próxima lectura lo cargará ya actualizado
+
+    def invalidar(self, guild_id):
+        with self.lock:
+            self.datos.pop(guild_id, None)
+
+    def cargar_guild_sync(self, guild_id):
+        """Lee la fila de `guild_stats` de un servidor (bloqueante)"""
+        with buffer_acciones.lock_escritura, engine_lectura.begin() as conn:
+            fila = conn.execute(SQL_GUILD_STATS, {"guild_id": guild_id}).fetchone()
+            totales = [fila[0], fila[1]] if fila else [0, 0]
+            
+            # Sumar lo que sigue en la cola (bajo su lock, como la caché de warns)
+            with buffer_acciones.lock, self.lock:
+                for accion in buffer_acciones.filas:
+                    if accion["guild_id"] == guild_id:
+                        totales[0] += 1
+                for (_, guild), incremento in buffer_acciones.warns.items():
+                    if guild == guild_id:
+                        totales[1] += incremento
+                # Y lo que espera en el diario local a que vuelva la base de datos
+                totales[0] += diario_local.acciones_guild.get(guild_id, 0)
+                for (_, guild), incremento in diario_local.warns.items():
+                    if guild == guild_id:
+                        totales[1] += incremento
+                self.datos[guild_id] = totales
+        return totales[1], totales[0]
+
+    def reconstruir_sync(self):
+        """Recalcula `guild_stats` desde cero recorriendo las tablas (bloqueante)"""
+        with buffer_acciones.lock_escritura:
+            with engine.begin() as conn:
+                recalcular_guild_stats(conn)
+            with self.lock:
+                self.datos.clear()
+        print("✅ Estadísticas de servidores recalculadas")
+
+estadisticas_guilds = EstadisticasGuilds()
+
+def recalcular_guild_stats(conn):
+    """Rellena `guild_stats` recorriendo `acciones` y `user_warns`"""
+    conn.execute(delete(tabla_guild_stats))
+    conn.execute(SQL_RECALCULAR_GUILD_STATS)
+
+def insertar_efectos(conn, efectos):
+    """Inserta efectos secundarios en `outbox` dentro de la transacción dada"""
+    if not efectos:
+        return
+    ahora = datetime.utcnow()
+    conn.execute(
+        SQL_INSERTAR_EFECTO,
+        [
+            {"tipo": efecto["tipo"], "payload": json.dumps(efecto["payload"]), "ahora": ahora}
+            for efecto in efectos
+        ]
+    )
+
+class DiarioLocal:
+    """Diario local de solo escritura (JSONL) para los lotes que no llegan a la base de datos.
+
+    Mientras la base de datos falla, cada lote se añade como una línea y se
+    sincroniza a disco, así que una caída no pierde acciones. Cuando vuelve,
+    `BufferAcciones` lo reenvía en orden usando la clave de idempotencia de
+    cada acción. Mantiene en memoria los totales que contiene para que las
+    lecturas sigan sumándolos.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.lotes = 0
+        self.warns = {}  # (user_id, guild_id) -> warns en el diario
+        self.acciones_guild = {}  # guild_id -> acciones en el diario
+        self.lock = threading.Lock()
+        try:
+            for lote in self.leer():
+                self._contar(lote["filas"])
+        except Exception as e:
+            print(f"❌ Error al leer el diario local {ruta}: {e}")
+
+    def __bool__(self):
+        return self.lotes > 0
+
+    def _contar(self, filas):
+        self.lotes += 1
+        for fila in filas:
+            guild_id = fila["guild_id"]
+            self.acciones_guild[guild_id] = self.acciones_guild.get(guild_id, 0) + 1
+            if fila["tipo"] == 'warn':
+                clave = (fila["user_id"], guild_id)
+                self.warns[clave] = self.warns.get(clave, 0) + 1
+
+    @staticmethod
+    def _linea(filas, efectos):
+        return json.dumps({
+            "filas": [{**fila, "created_at": fila["created_at"].isoformat()} for fila in filas],
+            "efectos": efectos
+        })
+
+    def escribir(self, filas, efectos):
+        """Añade un lote al final del diario y lo sincroniza a disco"""
+        linea = self._linea(filas, efectos)
+        with self.lock:
+            with open(self.ruta, "a", encoding="utf-8") as fichero:
+                fichero.write(linea + "\n")
+                fichero.flush()
+                os.fsync(fichero.fileno())
+            self._contar(filas)
+
+    def leer(self):
+        """Devuelve los lotes del diario en el orden en que se escribieron"""
+        if not os.path.exists(self.ruta):
+            return []
+        lotes = []
+        with open(self.ruta, encoding="utf-8") as fichero:
+            for linea in fichero:
+                if not linea.strip():
+                    continue
+                try:
+                    lote = json.loads(linea)
+                except ValueError:
+                    # Línea a medio escribir por una caída del proceso
+                    print("⚠️ Línea incompleta en el diario local, se descarta")
+                    continue
+                for fila in lote["filas"]:
+                    fila["created_at"] = datetime.fromisoformat(fila["created_at"])
+                lotes.append(lote)
+        return lotes
+
+    def descontar(self, filas):
+        """Deja de contar un lote que ya está en la base de datos"""
+        with self.lock:
+            self.lotes -= 1
+            for fila in filas:
+                guild_id = fila["guild_id"]
+                self.acciones_guild[guild_id] -= 1
+                if not self.acciones_guild[guild_id]:
+                    del self.acciones_guild[guild_id]
+                if fila["tipo"] == 'warn':
+                    clave = (fila["user_id"], guild_id)
+                    self.warns[clave] -= 1
+                    if not self.warns[clave]:
+                        del self.warns[clave]
+
+    def reescribir(self, lotes):
+        """Sustituye el fichero por `lotes` (los que siguen pendientes tras un reenvío a medias)"""
+        temporal = self.ruta + ".tmp"
+        with self.lock:
+            with open(temporal, "w", encoding="utf-8") as fichero:
+                for lote in lotes:
+                    fichero.write(self._linea(lote["filas"], lote["efectos"]) + "\n")
+                fichero.flush()
+                os.fsync(fichero.fileno())
+            os.replace(temporal, self.ruta)
+
+    def limpiar(self):
+        """Vacía el diario una vez reenviado"""
+        with self.lock:
+            os.remove(self.ruta)
+            self.lotes = 0
+            self.warns = {}
+            self.acciones_guild = {}
+
+diario_local = DiarioLocal(DB_JOURNAL_PATH)
+
+class BufferAcciones:
+    """Cola write-behind para la tabla `acciones`.
+
+    Las acciones se acumulan en memoria y se escriben en lotes: un INSERT
+    multi-fila (executemany) para `acciones` y un único upsert por usuario en
+    `user_warns`. El volcado se dispara por tamaño de lote o por tiempo.
+    """
+
+    def __init__(self, max_lote, intervalo):
+        self.max_lote = max_lote
+        self.intervalo = intervalo
+        self.filas = []
+        self.warns = {}  # (user_id, guild_id) -> incremento pendiente
+        self.efectos = []  # filas para la tabla outbox
+        self.warns_en_vuelo = {}
+        self.usuarios_en_vuelo = set()  # (user_id, guild_id) del lote que se está escribiendo
+        # Protege las estructuras en memoria (operaciones muy cortas)
+        self.lock = threading.Lock()
+        # Serializa los volcados y las lecturas que deben verlos completos
+        self.lock_escritura = threading.Lock()
+        self.vaciado_programado = False
+        self.ultimo_volcado_ok = True
+
+    def __len__(self):
+        return len(self.filas)
+
+    def agregar(self, user_id, guild_id, tipo, razon, moderator_id, duracion=None, efectos=None,
+                idempotency_key=None, created_at=None):
+        """Encola una acción (y sus efectos); programa un volcado si el lote está lleno.
+
+        `idempotency_key` y `created_at` solo se pasan para acciones que vienen
+        de fuera (registro de auditoría), que ya tienen identidad y fecha propias.
+        """
+        self.agregar_lote([{
+            "user_id": user_id, "guild_id": guild_id, "tipo": tipo, "razon": razon,
+            "moderator_id": moderator_id, "duracion": duracion, "efectos": efectos,
+            "idempotency_key": idempotency_key, "created_at": created_at
+        }])
+
+    def agregar_lote(self, acciones):
+        """Encola varias acciones de una vez (diccionarios con los argumentos de `agregar`).
+
+        Entran en la cola bajo una sola adquisición del lock, así que ningún
+        volcado puede partirlas: se escriben todas en la misma transacción.
+        """
+        ahora = datetime.utcnow()
+        filas = [
+            {
+                "user_id": accion["user_id"],
+                "guild_id": accion["guild_id"],
+                "tipo": accion["tipo"],
+                "razon": accion["razon"],
+                "moderator_id": accion["moderator_id"],
+                "duracion": accion.get("duracion"),
+                "created_at": accion.get("created_at") or ahora,
+                "idempotency_key": accion.get("idempotency_key") or uuid.uuid4().hex
+            }
+            for accion in acciones
+        ]
+        with self.lock:
+            for fila, accion in zip(filas, acciones):
+                self.filas.append(fila)
+                if accion.get("efectos"):
+                    # Los efectos se asocian a su acción para no repetirlos al reenviar el diario
+                    self.efectos.extend({**efecto, "clave": fila["idempotency_key"]} for efecto in accion["efectos"])
+                es_warn = fila["tipo"] == 'warn'
+                if es_warn:
+                    clave = (fila["user_id"], fila["guild_id"])
+                    self.warns[clave] = self.warns.get(clave, 0) + 1
+                    cache_warns.incrementar(fila["user_id"], fila["guild_id"])
+                estadisticas_guilds.sumar(fila["guild_id"], acciones=1, warns=1 if es_warn else 0)
+            lleno = len(self.filas) >= self.max_lote
+        
+        if lleno and not self.vaciado_programado:
+            self.vaciado_programado = True
+            asyncio.get_running_loop().create_task(self.vaciar())
+
+    def warns_pendientes(self, user_id, guild_id):
+        """Warns encolados (o escribiéndose) que aún no están en `user_warns`"""
+        clave = (user_id, guild_id)
+        with self.lock:
+            return (
+                self.warns.get(clave, 0)
+                + self.warns_en_vuelo.get(clave, 0)
+                + diario_local.warns.get(clave, 0)
+            )
+
+    def tiene_pendientes(self, guild_id, user_id=None):
+        """True si hay acciones del servidor (o de ese usuario) sin escribir aún en la tabla"""
+        with self.lock:
+            if user_id is not None and (user_id, guild_id) in self.usuarios_en_vuelo:
+                return True
+            if user_id is None and any(guild == guild_id for _, guild in self.usuarios_en_vuelo):
+                return True
+            return any(
+                fila["guild_id"] == guild_id and (user_id is None or fila["user_id"] == user_id)
+                for fila in self.filas
+            )
+
+    def vaciar_sync(self, en_transaccion=None):
+        """Escribe en la base de datos todo lo pendiente (bloqueante).
+
+        `en_transaccion(conn)` se ejecuta, si se indica, dentro de la misma
+        transacción que el lote; su resultado se devuelve y sus errores se
+        propagan. Si la base de datos falla, el lote pasa al diario local y se
+        reenvía (antes que cualquier lote nuevo) cuando vuelva a responder.
+        """
+        with self.lock_escritura:
+            with self.lock:
+                filas, self.filas = self.filas, []
+                warns, self.warns = self.warns, {}
+                efectos, self.efectos = self.efectos, []
+                self.warns_en_vuelo = warns
+                self.usuarios_en_vuelo = {(fila["user_id"], fila["guild_id"]) for fila in filas}
+            
+            if not filas and en_transaccion is None and not diario_local:
+                return 0
+            
+            if not circuito_db.permite():
+                # Circuito abierto: directo al diario, sin esperar a la red
+                if filas:
+                    self._guardar_en_diario(filas, warns, efectos)
+                with self.lock:
+                    self.warns_en_vuelo = {}
+                    self.usuarios_en_vuelo = set()
+                if en_transaccion:
+                    raise BaseDatosNoDisponible()
+                return 0
+            
+            try:
+                # Lo que quedó en el diario va primero para conservar el orden
+                if diario_local:
+                    self._reenviar_diario()
+                with engine.begin() as conn:
+                    if any(fila["idempotency_key"].startswith(PREFIJO_AUDITORIA) for fila in filas):
+                        # Una entrada de auditoría puede llegar por el evento y por el
+                        # backfill; las repetidas no entran y el espejo de
+                        # estadísticas, que ya las contó, se recarga
+                        nuevas, _ = self._filtrar_existentes(conn, filas)
+                        if len(nuevas) < len(filas):
+                            for guild_id in {fila["guild_id"] for fila in filas}:
+                                estadisticas_guilds.invalidar(guild_id)
+                        filas = nuevas
+                    self._escribir_lote(conn, filas, warns)
+                    insertar_efectos(conn, efectos)
+                    resultado = en_transaccion(conn) if en_transaccion else len(filas)
+            except Exception as e:
+                self.ultimo_volcado_ok = False
+                if filas:
+                    self._guardar_en_diario(filas, warns, efectos)
+                with self.lock:
+                    self.warns_en_vuelo = {}
+                    self.usuarios_en_vuelo = set()
+                if en_transaccion:
+                    raise
+                print(f"❌ Error al registrar {len(filas)} acciones: {e}")
+                return 0
+            
+            self.ultimo_volcado_ok = True
+            with self.lock:
+                self.warns_en_vuelo = {}
+                self.usuarios_en_vuelo = set()
+            if efectos:
+                despachador_outbox.avisar()
+            return resultado
+
+    def _guardar_en_diario(self, filas, warns, efectos):
+        try:
+            diario_local.escribir(filas, efectos)
+            print(f"💾 {len(filas)} acciones guardadas en el diario local")
+        except Exception as e:
+            # Sin disco tampoco: último recurso, devolver el lote a la cola
+            print(f"❌ Error al escribir el diario local: {e}")
+            with self.lock:
+                self.filas[:0] = filas
+                self.efectos[:0] = efectos
+                for clave, incremento in warns.items():
+                    self.warns[clave] = self.warns.get(clave, 0) + incremento
+
+    def _reenviar_diario(self):
+        # Llamar con self.lock_escritura adquirido. Cada lote va en su propia
+        # transacción; las acciones que ya estaban escritas (el commit llegó
+        # pero no su confirmación) se saltan junto con sus warns y efectos.
+        lotes = diario_local.leer()
+        hay_efectos = False
+        reenviados = 0
+        try:
+            for lote in lotes:
+                filas = lote["filas"]
+                with engine.begin() as conn:
+                    nuevas, existentes = self._filtrar_existentes(conn, filas)
+                    warns = {}
+                    for fila in nuevas:
+                        if fila["tipo"] == 'warn':
+                            clave = (fila["user_id"], fila["guild_id"])
+                            warns[clave] = warns.get(clave, 0) + 1
+                    efectos = [efecto for efecto in lote["efectos"] if efecto.get("clave") not in existentes]
+                    self._escribir_lote(conn, nuevas, warns)
+                    insertar_efectos(conn, efectos)
+                    hay_efectos = hay_efectos or bool(efectos)
+                # Ya está en la tabla: las lecturas no deben sumarlo otra vez
+                diario_local.descontar(filas)
+                reenviados += 1
+        finally:
+            if 0 < reenviados < len(lotes):
+                # Reenvío a medias: el diario se queda solo con lo pendiente
+                diario_local.reescribir(lotes[reenviados:])
+        
+        diario_local.limpiar()
+        print(f"✅ Diario local reenviado ({len(lotes)} lotes)")
+        if hay_efectos:
+            despachador_outbox.avisar()
+
+    def _filtrar_existentes(self, conn, filas):
+        # Devuelve las filas cuya clave aún no está en `acciones` (ni repetida
+        # dentro del propio lote) y las claves que ya estaban escritas
+        existentes = set(conn.execute(
+            SQL_CLAVES_EXISTENTES,
+            {"claves": [fila["idempotency_key"] for fila in filas]}
+        ).scalars())
+        vistas = set(existentes)
+        nuevas = []
+        for fila in filas:
+            if fila["idempotency_key"] not in vistas:
+                vistas.add(fila["idempotency_key"])
+                nuevas.append(fila)
+        return nuevas, existentes
+
+    def _escribir_lote(self, conn, filas, warns):
+        if filas:
+            conn.execute(SQL_INSERTAR_ACCION, filas)
+        
+        if warns:
+            conn.execute(
+                SQL_UPSERT_WARNS,
+                [
+                    {"user_id": user_id, "guild_id": guild_id, "incremento": incremento}
+                    for (user_id, guild_id), incremento in warns.items()
+                ]
+            )
+        
+        # Totales por servidor, un upsert por servidor afectado
+        totales = {}
+        for fila in filas:
+            totales.setdefault(fila["guild_id"], [0, 0])[0] += 1
+        for (_, guild_id), incremento in warns.items():
+            totales.setdefault(guild_id, [0, 0])[1] += incremento
+        
+        if totales:
             conn.execute(
-                text("""
-                    DELETE FROM user_warns
-                    WHERE user_id = :user_id AND guild_id = :guild_id
-                """),
-                {"user_id": user_id, "guild_id": guild_id}
+                SQL_UPSERT_GUILD_STATS,
+                [
+                    {"guild_id": guild_id, "acciones": acciones, "warns": warns_guild}
+                    for guild_id, (acciones, warns_guild) in totales.items()
+                ]
             )
+
+    async def vaciar(self):
+        """Vuelca lo pendiente sin bloquear el event loop"""
+        self.vaciado_programado = False
+        if not self.filas and not diario_local:
+            return 0
+        return await ejecutar_db(self.vaciar_sync)
+
+    async def ejecutar_periodicamente(self):
+        """Tarea de fondo: vuelca la cola cada `intervalo` segundos"""
+        while True:
+            await asyncio.sleep(self.intervalo)
+            await self.vaciar()
+
+buffer_acciones = BufferAcciones(ACCIONES_BATCH_SIZE, ACCIONES_FLUSH_INTERVAL)
+
+# =========================================================
+# FUNCIONES DE BASE DE DATOS
+# =========================================================
+# Los helpers de lectura dejan pasar los errores de la base de datos: los
+# recoge ejecutar_lectura, que los cuenta para el circuito y sirve la última
+# copia correcta en lugar de un valor vacío.
+
+def volcar_pendientes(guild_id, user_id=None):
+    """Vuelca la cola antes de leer, solo si tiene acciones que la lectura debe ver.
+
+    Así las consultas no deshacen el agrupamiento de escrituras. Si la
+    lectura va a la réplica no se vuelca: tampoco tendría aún las filas.
+    """
+    if motor_lectura() is engine_lectura and buffer_acciones.tiene_pendientes(guild_id, user_id):
+        buffer_acciones.vaciar_sync()
+
+def contar_warns_sync(user_id, guild_id):
+    """Cuenta los warns de un usuario"""
+    # Sin volcados a medias: lo que no está en la tabla sigue en la cola
+    with buffer_acciones.lock_escritura, engine_lectura.begin() as conn:
+        result = conn.execute(SQL_CONTAR_WARNS, {"user_id": user_id, "guild_id": guild_id}).fetchone()
+        total = result[0] if result else 0
+        
+        # Bajo el lock de la cola: ningún warn nuevo puede colarse entre
+        # la lectura de pendientes y el guardado en la caché
+        with buffer_acciones.lock:
+            total += buffer_acciones.warns.get((user_id, guild_id), 0)
+            total += diario_local.warns.get((user_id, guild_id), 0)
+            cache_warns.guardar(user_id, guild_id, total)
+        return total
+
+def obtener_pagina_historial_sync(user_id, guild_id, limit, cursor=None):
+    """Obtiene una página del historial por keyset (created_at, id).
+
+    `cursor` es la pareja (created_at, id) de la última fila de la página
+    anterior; el coste es O(limit) sin importar la profundidad de la página.
+    """
+    volcar_pendientes(guild_id, user_id)
+    params = {"user_id": user_id, "guild_id": guild_id, "limit": limit}
+    sentencia = SQL_PAGINA_HISTORIAL
+    if cursor is not None:
+        sentencia = SQL_PAGINA_HISTORIAL_CURSOR
+        params["fecha"], params["id_cursor"] = cursor
+    
+    with motor_lectura().begin() as conn:
+        acciones = conn.execute(sentencia, params).fetchall()
+        
+        return [
+            {
+                "id": accion_id,
+                "tipo": tipo,
+                "razon": razon,
+                "moderator_id": moderator_id,
+                "duracion": duracion,
+                "fecha": created_at
+            }
+            for accion_id, tipo, razon, moderator_id, duracion, created_at in acciones
+        ]
+
+def quitar_warns_sync(user_id, guild_id, cantidad, moderator_id, razon, efectos=None):
+    """Resta warns a un usuario y registra el unwarn en una sola transacción.
+
+    El descuento es un único UPDATE condicional (nunca deja el contador en
+    negativo). Los warns aún encolados se escriben en la misma transacción,
+    así que el contador de la tabla está completo al restar.
+    Devuelve True si se aplicó. Si no hay warns suficientes no escribe el
+    unwarn, pero el resto del lote se confirma igualmente.
+    """
+    def descontar(conn):
+        result = conn.execute(
+            SQL_DESCONTAR_WARNS, {"b_user_id": user_id, "b_guild_id": guild_id, "cantidad": cantidad}
+        )
+        if result.rowcount != 1:
+            # El total que vio el comando estaba desfasado: recargarlo para que
+            # el siguiente unwarn no falle con el mismo valor
+            total = conn.execute(SQL_CONTAR_WARNS, {"user_id": user_id, "guild_id": guild_id}).scalar() or 0
+            with buffer_acciones.lock:
+                total += buffer_acciones.warns.get((user_id, guild_id), 0)
+                total += diario_local.warns.get((user_id, guild_id), 0)
+                cache_warns.guardar(user_id, guild_id, total)
+            return False
+        
+        conn.execute(
+            SQL_INSERTAR_ACCION,
+            {
+                "user_id": user_id,
+                "guild_id": guild_id,
+                "tipo": "unwarn",
+                "razon": razon,
+                "moderator_id": moderator_id,
+                "duracion": None,
+                "created_at": datetime.utcnow(),
+                "idempotency_key": uuid.uuid4().hex
+            }
+        )
+        conn.execute(SQL_UPSERT_GUILD_STATS, {"guild_id": guild_id, "acciones": 1, "warns": -cantidad})
+        
+        insertar_efectos(conn, efectos)
+        
+        cache_warns.incrementar(user_id, guild_id, -cantidad)
+        estadisticas_guilds.sumar(guild_id, acciones=1, warns=-cantidad)
         return True
+    
+    try:
+        ok = buffer_acciones.vaciar_sync(en_transaccion=descontar)
+        if ok and efectos:
+            despachador_outbox.avisar()
+        return ok
     except Exception as e:
-        print(f"❌ Error al resetear warns: {e}")
+        print(f"❌ Error al quitar warns: {e}")
+        cache_warns.invalidar(user_id, guild_id)
+        estadisticas_guilds.invalidar(guild_id)
         return False
 
-def obtener_acciones_por_tipo(user_id, guild_id, tipo):
-    """Obtiene acciones específicas por tipo"""
-    try:
-        with engine.begin() as conn:
-            acciones = conn.execute(
-                text("""
-                    SELECT tipo, razon, moderator_id, duracion, created_at
-                    FROM acciones
-                    WHERE user_id = :user_id AND guild_id = :guild_id AND tipo = :tipo
-                    ORDER BY created_at DESC
-                """),
-                {"user_id": user_id, "guild_id": guild_id, "tipo": tipo}
-            ).fetchall()
-            
-            return [
-                {
-                    "tipo": tipo_db,
-                    "razon": razon,
-                    "moderator_id": moderator_id,
-                    "duracion": duracion,
-                    "fecha": created_at
-                }
-                for tipo_db, razon, moderator_id, duracion, created_at in acciones
-            ]
-    except Exception as e:
-        print(f"❌ Error al obtener acciones por tipo: {e}")
-        return []
+def obtener_perfil_sync(user_id, guild_id, ultimos_warns=3):
+    """Obtiene el perfil de moderación de un usuario en una sola consulta.
+
+    Devuelve el contador de warns, el total de acciones, el desglose por tipo
+    (incluidas las acciones ya resumidas, contadas aparte en `resumidas`) y
+    los `ultimos_warns` warns más recientes.
+    """
+    perfil = {"warns": 0, "total_acciones": 0, "resumidas": 0, "por_tipo": {}, "ultimos_warns": []}
+    volcar_pendientes(guild_id, user_id)
+    with motor_lectura().begin() as conn:
+        filas = conn.execute(
+            SQL_PERFIL,
+            {"user_id": user_id, "guild_id": guild_id, "limit": ultimos_warns}
+        ).fetchall()
+    
+    recientes = []
+    for fila, tipo, total, razon, moderator_id, duracion, created_at, accion_id in filas:
+        if fila in ('tipo', 'resumen'):
+            total = int(total)
+            perfil["por_tipo"][tipo] = perfil["por_tipo"].get(tipo, 0) + total
+            perfil["total_acciones"] += total
+            if fila == 'resumen':
+                perfil["resumidas"] += total
+        elif fila == 'warns':
+            perfil["warns"] = total
+        else:
+            recientes.append(((created_at, accion_id), {
+                "tipo": tipo,
+                "razon": razon,
+                "moderator_id": moderator_id,
+                "duracion": duracion,
+                "fecha": created_at
+            }))
+    
+    # El orden entre partes de un UNION ALL no está garantizado; a igual fecha
+    # desempata el id, como en el historial
+    recientes.sort(key=lambda reciente: reciente[0], reverse=True)
+    perfil["ultimos_warns"] = [accion for _, accion in recientes]
+    return perfil
+
+# Columnas de los ficheros exportados y filas leídas por consulta al exportar
+COLUMNAS_EXPORTACION = ["id", "fecha", "servidor", "usuario", "tipo", "razon", "moderador", "duracion"]
+EXPORTACION_LOTE = 1000
+
+def exportar_acciones_sync(guild_id, user_id=None, desde=None, hasta=None, formato="csv"):
+    """Vuelca acciones a un fichero temporal comprimido (CSV o JSONL).
+
+    Las filas se leen por keyset en bloques de EXPORTACION_LOTE (el driver de
+    MySQL no tiene cursores de servidor: un único SELECT se traería todo a
+    memoria) y se escriben según llegan, así que la memoria no depende del
+    tamaño de la exportación. Devuelve (ruta, número de filas); el fichero lo
+    borra quien llama.
+    """
+    volcar_pendientes(guild_id, user_id)
+    filtros = []
+    params = {"guild_id": guild_id, "limit": EXPORTACION_LOTE}
+    if user_id is not None:
+        filtros.append(tabla_acciones.c.user_id == bindparam("user_id"))
+        params["user_id"] = user_id
+    if desde is not None:
+        filtros.append(tabla_acciones.c.created_at >= bindparam("desde"))
+        params["desde"] = desde
+    if hasta is not None:
+        filtros.append(tabla_acciones.c.created_at < bindparam("hasta"))
+        params["hasta"] = hasta
+    primer_bloque = SQL_EXPORTAR.where(*filtros)
+    siguientes = SQL_EXPORTAR_CURSOR.where(*filtros)
+    
+    descriptor, ruta = tempfile.mkstemp(suffix=f".{formato}.gz")
+    os.close(descriptor)
+    filas = 0
+    try:
+        with gzip.open(ruta, "wt", encoding="utf-8", newline="") as fichero, motor_lectura().connect() as conn:
+            escritor = csv.writer(fichero) if formato == "csv" else None
+            if escritor:
+                escritor.writerow(COLUMNAS_EXPORTACION)
+            bloque = conn.execute(primer_bloque, params).all()
+            while bloque:
+                for fila in bloque:
+                    valores = [
+                        fila.id, fila.created_at.isoformat() if fila.created_at else None, fila.guild_id,
+                        fila.user_id, fila.tipo, fila.razon, fila.moderator_id, fila.duracion
+                    ]
+                    if escritor:
+                        escritor.writerow(valores)
+                    else:
+                        fichero.write(json.dumps(dict(zip(COLUMNAS_EXPORTACION, valores)), ensure_ascii=False) + "\n")
+                filas += len(bloque)
+                if len(bloque) < EXPORTACION_LOTE:
+                    break
+                ultima = bloque[-1]
+                bloque = conn.execute(siguientes, {**params, "fecha": ultima.created_at, "id_cursor": ultima.id}).all()
+    except Exception:
+        os.remove(ruta)
+        raise
+    return ruta, filas
+
+def claves_existentes_sync(claves):
+    """Devuelve cuáles de estas claves de idempotencia ya están en `acciones`"""
+    if not claves:
+        return set()
+    # Siempre contra el primario: una réplica atrasada dejaría pasar duplicados
+    with engine.connect() as conn:
+        return set(conn.execute(SQL_CLAVES_EXISTENTES, {"claves": list(claves)}).scalars())
+
+# Versiones asíncronas: son las que deben usar los comandos y eventos
+
+async def registrar_accion(user_id, guild_id, tipo, razon, moderator_id, duracion=None, efectos=None):
+    """Registra una acción en la base de datos (vía la cola write-behind).
+
+    `efectos` son logs/DMs (ver `efecto_log` y `efecto_dm`) que se guardan en
+    la misma transacción que la acción y se entregan en segundo plano.
+    """
+    buffer_acciones.agregar(user_id, guild_id, tipo, razon, moderator_id, duracion, efectos)
+    anotar_escritura(moderator_id)
+    return True
+
+async def registrar_acciones(acciones):
+    """Registra varias acciones en una sola transacción.
+
+    `acciones` son diccionarios con los argumentos de `registrar_accion`.
+    Se encolan de una vez (ver `BufferAcciones.agregar_lote`) y se vuelcan
+    a continuación.
+    """
+    buffer_acciones.agregar_lote(acciones)
+    for moderator_id in {accion["moderator_id"] for accion in acciones}:
+        anotar_escritura(moderator_id)
+    await buffer_acciones.vaciar()
+    return True
+
+async def contar_warns(user_id, guild_id):
+    """Cuenta los warns de un usuario (desde la caché si es posible)"""
+    total = cache_warns.obtener(user_id, guild_id)
+    if total is not None:
+        return total
+    return await ejecutar_lectura(contar_warns_sync, user_id, guild_id)
+
+async def obtener_pagina_historial(user_id, guild_id, limit, cursor=None):
+    """Obtiene una página del historial por keyset (created_at, id)"""
+    return await ejecutar_lectura(obtener_pagina_historial_sync, user_id, guild_id, limit, cursor)
+
+async def quitar_warns(user_id, guild_id, cantidad, moderator_id, razon, efectos=None):
+    """Resta warns a un usuario y registra el unwarn atómicamente"""
+    if not circuito_db.permite():
+        raise BaseDatosNoDisponible()
+    anotar_escritura(moderator_id)
+    return await ejecutar_db(quitar_warns_sync, user_id, guild_id, cantidad, moderator_id, razon, efectos)
+
+async def obtener_perfil(user_id, guild_id, ultimos_warns=3):
+    """Obtiene el perfil de moderación de un usuario en una sola consulta"""
+    perfil = await ejecutar_lectura(obtener_perfil_sync, user_id, guild_id, ultimos_warns)
+    # La caché está al día incluso con warns aún en cola
+    warns = cache_warns.obtener(user_id, guild_id)
+    if warns is not None:
+        perfil["warns"] = warns
+    return perfil
+
+async def obtener_estadisticas_guild(guild_id):
+    """Obtiene (total_warns, total_acciones) de un servidor en O(1)"""
+    totales = estadisticas_guilds.obtener(guild_id)
+    if totales is not None:
+        return totales
+    return await ejecutar_lectura(estadisticas_guilds.cargar_guild_sync, guild_id)
+
+async def exportar_acciones(guild_id, user_id=None, desde=None, hasta=None, formato="csv"):
+    """Exporta acciones a un fichero temporal comprimido; devuelve (ruta, filas)"""
+    if not circuito_db.permite():
+        raise BaseDatosNoDisponible()
+    return await ejecutar_db(exportar_acciones_sync, guild_id, user_id, desde, hasta, formato)
+
+async def claves_existentes(claves):
+    """Claves de idempotencia ya escritas"""
+    if not circuito_db.permite():
+        raise BaseDatosNoDisponible()
+    return await ejecutar_db(claves_existentes_sync, claves)
+
+async def reconstruir_estadisticas():
+    """Recalcula las estadísticas de todos los servidores"""
+    if not circuito_db.permite():
+        raise BaseDatosNoDisponible()
+    await ejecutar_db(estadisticas_guilds.reconstruir_sync)
+
+# Serialización en proceso de las operaciones sobre los warns de un usuario
+locks_warns = weakref.WeakValueDictionary()
+
+def lock_warns(user_id, guild_id):
+    """Devuelve el lock asyncio asociado a (guild, usuario)"""
+    clave = (guild_id, user_id)
+    lock = locks_warns.get(clave)
+    if lock is None:
+        lock = asyncio.Lock()
+        locks_warns[clave] = lock
+    return lock
 
 # =========================================================
 # FUNCIONES AUXILIARES
@@ -261,6 +2029,14 @@ def create_embed(title, description="", color=discord.Color.blue()):
     embed = discord.Embed(title=title, description=description, color=color)
     return embed
 
+def marcar_obsoleto(embed):
+    """Avisa en el pie del embed si sus datos vienen de la caché por una caída de la BD"""
+    if lectura_obsoleta.get():
+        texto = embed.footer.text
+        aviso = "⚠️ Datos en caché: la base de datos no responde"
+        embed.set_footer(text=f"{texto} | {aviso}" if texto else aviso, icon_url=embed.footer.icon_url)
+    return embed
+
 def tiene_permisos_moderacion(member):
     """Verifica si un miembro tiene permisos de moderación"""
     return (
@@ -272,6 +2048,28 @@ def tiene_permisos_moderacion(member):
         member.guild_permissions.manage_roles
     )
 
+def validar_objetivo(ctx, member, verbo):
+    """Comprueba si el autor del comando (y el bot) pueden sancionar a `member`.
+
+    `verbo` es el infinitivo de la acción ("banear", "expulsar"...). Devuelve
+    el motivo por el que no se puede, o None si se puede. Con un `discord.User`
+    (alguien que no está en el servidor) no hay jerarquía que comprobar.
+    """
+    if member.id == ctx.author.id:
+        return f"No puedes {verbo}te a ti mismo."
+    if member.id == bot.user.id:
+        return f"No puedo {verbo}me a mí mismo."
+    if member.id == ctx.guild.owner_id:
+        return f"No se puede {verbo} al dueño del servidor."
+    if not isinstance(member, discord.Member):
+        return None
+    if ctx.author.id != ctx.guild.owner_id and member.top_role >= ctx.author.top_role:
+        return f"No puedes {verbo} a {member.mention} porque tiene un rol igual o superior al tuyo."
+    if member.top_role >= ctx.guild.me.top_role:
+        return (f"No puedo {verbo} a {member.mention} porque tiene un rol igual o superior al mío.\n"
+                "Mueve mi rol más arriba en la jerarquía.")
+    return None
+
 async def notify_user_dm(user, action_type, reason, duration=None, moderator=None):
     """Envía notificación por DM al usuario afectado"""
     if isinstance(user, discord.Member) and user.bot:
@@ -292,7 +2090,9 @@ async def notify_user_dm(user, action_type, reason, duration=None, moderator=Non
             "kick": "👢 Has sido expulsado del servidor",
             "promote": "🎉 ¡Felicidades! Has sido promovido",
             "demote": "🔻 Has sido degradado de rango",
-            "unmute": "🔊 Tu silencio ha sido removido"
+            "unmute": "🔊 Tu silencio ha sido removido",
+            "ban_anulado": "↩️ El baneo que se te anunció no se ha aplicado",
+            "kick_anulado": "↩️ La expulsión que se te anunció no se ha aplicado"
         }
         
         guild_name = bot.get_guild(GUILD_ID).name if bot.get_guild(GUILD_ID) else "el servidor"
@@ -318,10 +2118,144 @@ async def notify_user_dm(user, action_type, reason, duration=None, moderator=Non
     except discord.Forbidden:
         # El usuario tiene DMs desactivados
         return False
+    except discord.HTTPException:
+        # Error transitorio de Discord: el outbox lo reintentará
+        raise
     except Exception as e:
         print(f"Error enviando DM: {e}")
         return False
 
+class SumideroLogs:
+    """Envía los logs al canal agrupándolos cuando llegan en ráfaga.
+
+    Con tráfico tranquilo cada log sale en cuanto llega. Mientras un envío
+    está en curso los siguientes se acumulan y salen juntos (hasta 10 embeds
+    y 6000 caracteres por mensaje). Si la tasa supera `umbral` logs por
+    minuto, se pasa a un embed de resumen con una línea por acción.
+    """
+
+    MAX_EMBEDS = 10
+    MAX_CARACTERES = 6000
+    MAX_LINEAS_RESUMEN = 25
+    MAX_DESCRIPCION = 4000
+
+    def __init__(self, channel_id, umbral):
+        self.channel_id = channel_id
+        self.umbral = umbral
+        self.cola = asyncio.Queue()
+        self.llegadas = deque()  # instantes de llegada del último minuto
+
+    def tasa(self):
+        """Logs recibidos en el último minuto"""
+        limite = time.monotonic() - 60
+        while self.llegadas and self.llegadas[0] < limite:
+            self.llegadas.popleft()
+        return len(self.llegadas)
+
+    async def enviar(self, embed, linea):
+        """Encola un log y espera a que se publique (propaga errores de envío)"""
+        futuro = asyncio.get_running_loop().create_future()
+        self.llegadas.append(time.monotonic())
+        self.cola.put_nowait((embed, linea, futuro))
+        await futuro
+
+    def crear_resumenes(self, lote):
+        """Embeds de resumen del lote; se parte en varios si no cabe en uno"""
+        descripciones = [""]
+        for _, linea, _ in lote:
+            linea = linea[:self.MAX_DESCRIPCION]
+            if len(descripciones[-1]) + len(linea) + 1 > self.MAX_DESCRIPCION:
+                descripciones.append("")
+            descripciones[-1] += linea + "\n"
+        
+        embeds = []
+        for i, descripcion in enumerate(descripciones, 1):
+            parte = f" · {i}/{len(descripciones)}" if len(descripciones) > 1 else ""
+            embed = discord.Embed(
+                title=f"📋 Resumen de moderación ({len(lote)} acciones{parte})",
+                description=descripcion,
+                color=discord.Color.dark_orange(),
+                timestamp=datetime.utcnow()
+            )
+            embed.set_footer(text=f"Modo resumen: más de {self.umbral} acciones/min • Sistema de moderación")
+            embeds.append(embed)
+        return embeds
+
+    def agrupar(self, lote):
+        """Parte el lote en mensajes de hasta MAX_EMBEDS embeds y MAX_CARACTERES caracteres"""
+        grupos = [[]]
+        caracteres = 0
+        for elemento in lote:
+            tamano = len(elemento[0])
+            if grupos[-1] and (len(grupos[-1]) >= self.MAX_EMBEDS or caracteres + tamano > self.MAX_CARACTERES):
+                grupos.append([])
+                caracteres = 0
+            grupos[-1].append(elemento)
+            caracteres += tamano
+        return grupos
+
+    async def publicar(self, channel, grupo):
+        """Envía un grupo en un mensaje; si falla, embed a embed para aislar al culpable"""
+        def resolver(futuro, error=None):
+            # Quien esperaba puede haberse cancelado
+            if futuro.done():
+                return
+            if error:
+                futuro.set_exception(error)
+            else:
+                futuro.set_result(None)
+        
+        try:
+            await channel.send(embeds=[embed for embed, _, _ in grupo])
+        except Exception as e:
+            if len(grupo) == 1:
+                resolver(grupo[0][2], e)
+                return
+            for embed, _, futuro in grupo:
+                try:
+                    await channel.send(embed=embed)
+                except Exception as error:
+                    resolver(futuro, error)
+                else:
+                    resolver(futuro)
+            return
+        for _, _, futuro in grupo:
+            resolver(futuro)
+
+    async def ejecutar(self):
+        """Tarea de fondo: publica los logs encolados"""
+        while True:
+            lote = [await self.cola.get()]
+            resumen = self.tasa() > self.umbral
+            maximo = self.MAX_LINEAS_RESUMEN if resumen else self.MAX_EMBEDS
+            while len(lote) < maximo and not self.cola.empty():
+                lote.append(self.cola.get_nowait())
+            
+            error = None
+            try:
+                channel = bot.get_channel(self.channel_id)
+                if not channel:
+                    print(f"❌ No se encontró el canal de logs: {self.channel_id}")
+                elif resumen and len(lote) > 1:
+                    # Un mensaje por embed: el límite de 6000 caracteres es por mensaje
+                    for embed in self.crear_resumenes(lote):
+                        await channel.send(embed=embed)
+                else:
+                    for grupo in self.agrupar(lote):
+                        await self.publicar(channel, grupo)
+            except Exception as e:
+                error = e
+            
+            for _, _, futuro in lote:
+                if futuro.done():
+                    continue
+                if error:
+                    futuro.set_exception(error)
+                else:
+                    futuro.set_result(None)
+
+sumidero_logs = SumideroLogs(LOG_CHANNEL_ID, LOG_DIGEST_UMBRAL)
+
 async def send_log_detailed(action, member, moderator, reason, color, duration=None, extra_fields=None):
     """Sistema de logs mejorado con más detalles"""
     channel = bot.get_channel(LOG_CHANNEL_ID)
@@ -339,7 +2273,8 @@ async def send_log_detailed(action, member, moderator, reason, color, duration=N
         "unban": "♻️",
         "promote": "🎉",
         "demote": "🔻",
-        "unwarn": "✅"
+        "unwarn": "✅",
+        "rol": "🎭"
     }
     
     emoji = emoji_map.get(action.lower(), "📝")
@@ -382,19 +2317,27 @@ async def send_log_detailed(action, member, moderator, reason, color, duration=N
     # Footer con información contextual
     embed.set_footer(text=f"ID: {member.id if member else 'N/A'} • Sistema de moderación")
     
-    await channel.send(embed=embed)
+    # Línea compacta para el modo resumen
+    linea = f"{emoji} **{action}** · {member.mention if member else 'N/A'}"
+    if moderator:
+        linea += f" · por {moderator.mention}"
+    if reason:
+        linea += f" · {reason[:80]}"
+    
+    await sumidero_logs.enviar(embed, linea)
 
 async def check_3_warns(member, moderator):
     """Verifica si un usuario tiene 3 warns y notifica"""
-    warns = contar_warns(member.id, member.guild.id)
+    perfil = await obtener_perfil(member.id, member.guild.id, ultimos_warns=3)
+    warns = perfil["warns"]
     
     if warns >= 3:
         channel = bot.get_channel(WARN_ACTION_CHANNEL) if WARN_ACTION_CHANNEL else bot.get_channel(LOG_CHANNEL_ID)
         if not channel:
             return
             
-        # Obtener historial de warns
-        warns_acciones = obtener_acciones_por_tipo(member.id, member.guild.id, "warn")
+        # Últimos warns (ya vienen en el perfil)
+        warns_acciones = perfil["ultimos_warns"]
         
         embed = discord.Embed(
             title="🚨 ¡Alerta! Usuario con 3 advertencias",
@@ -422,7 +2365,7 @@ async def check_3_warns(member, moderator):
             )
         
         # Estadísticas del usuario
-        total_acciones = len(obtener_historial(member.id, member.guild.id, limit=50))
+        total_acciones = perfil["total_acciones"]
         
         embed.add_field(name="📊 Estadísticas", 
                        value=f"**Total acciones registradas:** {total_acciones}\n"
@@ -439,10 +2382,843 @@ async def check_3_warns(member, moderator):
         
         await channel.send(embed=embed)
 
+# =========================================================
+# OUTBOX (LOGS Y NOTIFICACIONES)
+# =========================================================
+
+# Entregas simultáneas, intentos máximos y segundos entre sondeos del outbox
+OUTBOX_CONCURRENCIA = int(os.getenv("OUTBOX_CONCURRENCIA", "5"))
+OUTBOX_MAX_INTENTOS = int(os.getenv("OUTBOX_MAX_INTENTOS", "8"))
+OUTBOX_INTERVALO = float(os.getenv("OUTBOX_INTERVALO", "5"))
+
+def efecto_log(action, member, moderator, reason, color, duration=None, extra_fields=None):
+    """Describe un `send_log_detailed` para entregarlo vía outbox"""
+    return {
+        "tipo": "log",
+        "payload": {
+            "action": action,
+            "guild_id": member.guild.id if isinstance(member, discord.Member) else GUILD_ID,
+            "user_id": member.id if member else None,
+            "moderator_id": moderator.id if moderator else None,
+            "reason": reason,
+            "color": color.value,
+            "duration": duration,
+            "extra_fields": extra_fields
+        }
+    }
+
+def efecto_dm(user, action_type, reason, duration=None, moderator=None):
+    """Describe un `notify_user_dm` para entregarlo vía outbox"""
+    return {
+        "tipo": "dm",
+        "payload": {
+            "action_type": action_type,
+            "guild_id": user.guild.id if isinstance(user, discord.Member) else GUILD_ID,
+            "user_id": user.id,
+            "moderator_id": moderator.id if moderator else None,
+            "reason": reason,
+            "duration": duration
+        }
+    }
+
+def encolar_efectos_sync(efectos):
+    """Guarda en el outbox efectos que no acompañan a ninguna acción"""
+    with engine.begin() as conn:
+        insertar_efectos(conn, efectos)
+
+async def encolar_efectos(efectos):
+    """Versión asíncrona de `encolar_efectos_sync`; avisa al despachador"""
+    try:
+        await ejecutar_db(encolar_efectos_sync, efectos)
+    except Exception as e:
+        print(f"❌ Error al encolar {len(efectos)} efectos: {e}")
+        return False
+    despachador_outbox.avisar()
+    return True
+
+async def avisar_antes_de_expulsar(member, action_type, reason, moderator):
+    """DM previo a un ban/kick; devuelve True si se entregó.
+
+    Tiene que salir antes de la acción (después el usuario ya no comparte
+    servidor con el bot), así que no pasa por el outbox. Si la acción falla
+    después, hay que rectificarlo con `rectificar_aviso`.
+    """
+    if not isinstance(member, discord.Member):
+        return False
+    try:
+        return await notify_user_dm(member, action_type, reason, moderator=moderator)
+    except discord.HTTPException:
+        return False
+
+async def rectificar_aviso(member, action_type, reason, moderator):
+    """Encola el DM que anula un aviso previo cuya acción no llegó a aplicarse"""
+    await encolar_efectos([efecto_dm(member, f"{action_type}_anulado", reason, moderator=moderator)])
+
+async def resolver_usuario(guild_id, user_id):
+    """Obtiene el Member (o User si ya no está en el servidor) de un ID"""
+    if user_id is None:
+        return None
+    guild = bot.get_guild(guild_id)
+    member = guild.get_member(user_id) if guild else None
+    if member:
+        return member
+    return bot.get_user(user_id) or await bot.fetch_user(user_id)
+
+class DespachadorOutbox:
+    """Entrega en segundo plano los efectos guardados en la tabla `outbox`.
+
+    Las filas se borran al entregarse; los fallos se reintentan con backoff
+    exponencial hasta OUTBOX_MAX_INTENTOS. Como viven en la base de datos,
+    las entregas pendientes sobreviven a un reinicio.
+    """
+
+    def __init__(self, concurrencia, max_intentos, intervalo):
+        self.max_intentos = max_intentos
+        self.intervalo = intervalo
+        self.semaforo = asyncio.Semaphore(concurrencia)
+        self.evento = asyncio.Event()
+        self.loop = None
+
+    def avisar(self):
+        """Despierta al despachador (se puede llamar desde cualquier hilo)"""
+        # En el volcado final de __main__ el loop ya está cerrado: las filas
+        # quedan en el outbox para el próximo arranque
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.evento.set)
+
+    def pendientes_sync(self, limite=50):
+        with engine_lectura.begin() as conn:
+            return conn.execute(
+                SQL_OUTBOX_PENDIENTES,
+                {"ahora": datetime.utcnow(), "limit": limite}
+            ).fetchall()
+
+    def finalizar_sync(self, entregados, fallidos):
+        """Borra las filas entregadas y reprograma las fallidas"""
+        with engine.begin() as conn:
+            if entregados:
+                conn.execute(SQL_OUTBOX_BORRAR, [{"fila_id": fila_id} for fila_id in entregados])
+            if fallidos:
+                conn.execute(SQL_OUTBOX_REPROGRAMAR, fallidos)
+
+    async def entregar(self, tipo, payload):
+        payload = json.loads(payload)
+        # El semáforo limita las llamadas a la API hechas desde aquí
+        async with self.semaforo:
+            user = await resolver_usuario(payload["guild_id"], payload["user_id"])
+            moderator = await resolver_usuario(payload["guild_id"], payload["moderator_id"])
+            if tipo == "dm":
+                await notify_user_dm(user, payload["action_type"], payload["reason"],
+                                     payload["duration"], moderator)
+                return
+        
+        if tipo == "log":
+            # Fuera del semáforo: el sumidero solo agrupa (y resume) si le
+            # llegan muchos logs a la vez, y él mismo hace un envío por lote
+            await send_log_detailed(
+                payload["action"], user, moderator, payload["reason"],
+                discord.Color(payload["color"]), payload["duration"], payload["extra_fields"]
+            )
+
+    async def procesar(self, fila):
+        """Entrega una fila; devuelve True si no hay que reintentarla"""
+        fila_id, tipo, payload, intentos = fila
+        try:
+            await self.entregar(tipo, payload)
+            return True
+        except discord.NotFound:
+            # El usuario ya no existe: no tiene sentido reintentar
+            return True
+        except Exception as e:
+            if intentos + 1 >= self.max_intentos:
+                print(f"❌ Descartando entrega {tipo} #{fila_id} tras {intentos + 1} intentos: {e}")
+                return True
+            print(f"⚠️ Error en entrega {tipo} #{fila_id} (intento {intentos + 1}): {e}")
+            return False
+
+    async def ejecutar(self):
+        """Tarea de fondo: drena el outbox"""
+        self.loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # Con el circuito abierto no hay nada que leer: esperar al sondeo
+                filas = await ejecutar_db(self.pendientes_sync) if circuito_db.permite() else []
+            except Exception as e:
+                print(f"❌ Error al leer el outbox: {e}")
+                filas = []
+            
+            if filas:
+                resultados = await asyncio.gather(*(self.procesar(fila) for fila in filas))
+                entregados = [fila[0] for fila, ok in zip(filas, resultados) if ok]
+                fallidos = [
+                    {
+                        "fila_id": fila[0],
+                        # Backoff exponencial: 5s, 10s, 20s... hasta 1h
+                        "proximo": datetime.utcnow() + timedelta(seconds=min(5 * 2 ** fila[3], 3600))
+                    }
+                    for fila, ok in zip(filas, resultados) if not ok
+                ]
+                try:
+                    await ejecutar_db(self.finalizar_sync, entregados, fallidos)
+                except Exception as e:
+                    print(f"❌ Error al actualizar el outbox: {e}")
+                # Puede haber más filas listas: seguir sin esperar
+                if len(entregados) == len(filas):
+                    continue
+            
+            self.evento.clear()
+            try:
+                await asyncio.wait_for(self.evento.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+
+despachador_outbox = DespachadorOutbox(OUTBOX_CONCURRENCIA, OUTBOX_MAX_INTENTOS, OUTBOX_INTERVALO)
+
+# =========================================================
+# VISTAS INTERACTIVAS
+# =========================================================
+
+# Acciones por página en el historial
+HISTORIAL_POR_PAGINA = 5
+
+def crear_embed_historial(member, perfil, acciones, pagina):
+    """Crea el embed de una página del historial"""
+    # Las acciones resumidas por la retención cuentan en los totales, no en las páginas
+    detalladas = perfil["total_acciones"] - perfil["resumidas"]
+    total_paginas = max(1, -(-detalladas // HISTORIAL_POR_PAGINA))
+    
+    # Crear descripción con contadores (sobre todo el historial)
+    descripcion = f"**Total acciones:** {perfil['total_acciones']}\n"
+    if perfil["resumidas"]:
+        descripcion += f"**Antiguas (solo en totales):** {perfil['resumidas']}\n"
+    descripcion += f"**Warns actuales:** {perfil['warns']}/3\n\n"
+    
+    for tipo, count in perfil["por_tipo"].items():
+        descripcion += f"**{tipo.title()}:** {count}\n"
+    
+    embed = discord.Embed(
+        title=f"📄 Historial de {member.name}",
+        description=descripcion,
+        color=discord.Color.blue(),
+        timestamp=datetime.utcnow()
+    )
+    
+    # Emoji mapping para tipos de acción
+    emoji_map = {
+        "warn": "⚠️",
+        "mute": "🔇",
+        "ban": "🚫",
+        "kick": "👢",
+        "unmute": "🔊",
+        "unban": "♻️",
+        "promote": "🎉",
+        "demote": "🔻",
+        "unwarn": "✅",
+        "rol": "🎭"
+    }
+    
+    inicio = pagina * HISTORIAL_POR_PAGINA
+    for i, accion in enumerate(acciones, inicio + 1):
+        tipo = accion['tipo']
+        fecha = accion['fecha'].strftime('%d/%m/%Y %H:%M')
+        emoji = emoji_map.get(tipo, "📝")
+        
+        field_value = f"**Razón:** {accion['razon'] or 'Sin razón especificada'}\n"
+        if accion['duracion']:
+            field_value += f"**Duración:** {accion['duracion']}\n"
+        if accion['moderator_id']:
+            field_value += f"**Moderador:** <@{accion['moderator_id']}>\n"
+        field_value += f"**Fecha:** {fecha}"
+        
+        embed.add_field(
+            name=f"{i}. {emoji} {tipo.title()}",
+            value=field_value,
+            inline=False
+        )
+    
+    embed.set_thumbnail(url=member.display_avatar.url)
+    embed.set_footer(
+        text=f"ID: {member.id} | Página {pagina + 1}/{total_paginas} | "
+             f"Acciones {inicio + 1}-{inicio + len(acciones)} de {detalladas}"
+    )
+    return marcar_obsoleto(embed)
+
+class VistaHistorial(discord.ui.View):
+    """Navegación del historial con botones; cada página se carga al pedirla"""
+
+    def __init__(self, autor, member, perfil, acciones, hay_siguiente):
+        super().__init__(timeout=180)
+        self.autor = autor
+        self.member = member
+        self.perfil = perfil
+        self.acciones = acciones
+        self.pagina = 0
+        # cursores[p] = cursor con el que se carga la página p
+        self.cursores = [None]
+        if hay_siguiente:
+            self.cursores.append((acciones[-1]["fecha"], acciones[-1]["id"]))
+        self.hay_siguiente = hay_siguiente
+        self.mensaje = None
+        self._actualizar_botones()
+
+    def _actualizar_botones(self):
+        self.anterior.disabled = self.pagina == 0
+        self.siguiente.disabled = not self.hay_siguiente
+
+    async def _cargar(self, interaction, pagina):
+        fijar_lecturas(interaction.user.id)
+        # Una fila extra indica si existe una página siguiente
+        try:
+            acciones = await obtener_pagina_historial(
+                self.member.id, self.member.guild.id,
+                HISTORIAL_POR_PAGINA + 1, self.cursores[pagina]
+            )
+        except BaseDatosNoDisponible:
+            await interaction.response.send_message(
+                "La base de datos no responde y esta página no está en caché. Inténtalo más tarde.",
+                ephemeral=True
+            )
+            return
+        if not acciones and pagina > 0:
+            await interaction.response.defer()
+            return
+        
+        self.pagina = pagina
+        self.hay_siguiente = len(acciones) > HISTORIAL_POR_PAGINA
+        self.acciones = acciones[:HISTORIAL_POR_PAGINA]
+        if self.hay_siguiente and len(self.cursores) == pagina + 1:
+            ultima = self.acciones[-1]
+            self.cursores.append((ultima["fecha"], ultima["id"]))
+        
+        self._actualizar_botones()
+        await interaction.response.edit_message(
+            embed=crear_embed_historial(self.member, self.perfil, self.acciones, self.pagina),
+            view=self
+        )
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.autor.id:
+            await interaction.response.send_message(
+                "Solo quien ejecutó el comando puede navegar este historial.", ephemeral=True
+            )
+            return False
+        return True
+
+    @discord.ui.button(label="Anterior", emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def anterior(self, interaction, button):
+        await self._cargar(interaction, self.pagina - 1)
+
+    @discord.ui.button(label="Siguiente", emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def siguiente(self, interaction, button):
+        await self._cargar(interaction, self.pagina + 1)
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.mensaje:
+            try:
+                await self.mensaje.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+# =========================================================
+# REGISTRO DE AUDITORÍA
+# =========================================================
+
+# Las acciones importadas usan como clave de idempotencia el ID de la entrada
+PREFIJO_AUDITORIA = "audit:"
+
+# Entradas por escritura al importar (la API las sirve en páginas de 100)
+AUDITORIA_LOTE = 100
+
+def accion_desde_auditoria(entrada):
+    """Traduce una entrada del registro de auditoría a los argumentos de
+    `buffer_acciones.agregar`.
+
+    Devuelve None si no es una sanción ni un cambio de rol, o si la hizo el
+    propio bot (esas ya se registraron al ejecutar el comando).
+    """
+    if bot.user and entrada.user_id == bot.user.id:
+        return None
+    if entrada.target is None or entrada.guild is None:
+        return None
+    
+    acciones = discord.AuditLogAction
+    duracion = detalle = None
+    if entrada.action == acciones.ban:
+        tipo = "ban"
+    elif entrada.action == acciones.unban:
+        tipo = "unban"
+    elif entrada.action == acciones.kick:
+        tipo = "kick"
+    elif entrada.action == acciones.member_update:
+        antes = getattr(entrada.before, "timed_out_until", None)
+        despues = getattr(entrada.after, "timed_out_until", None)
+        if despues:
+            tipo = "mute"
+            duracion = tiempo_formato(max(int((despues - entrada.created_at).total_seconds()), 0))
+        elif antes:
+            tipo = "unmute"
+        else:
+            return None
+    elif entrada.action == acciones.member_role_update:
+        tipo = "rol"
+        cambios = []
+        for signo, roles in (("+", getattr(entrada.after, "roles", None)), ("-", getattr(entrada.before, "roles", None))):
+            cambios.extend(f"{signo}{getattr(rol, 'name', rol.id)}" for rol in roles or [])
+        if not cambios:
+            return None
+        detalle = " ".join(cambios)
+    else:
+        return None
+    
+    razon = entrada.reason or "Sin razón especificada (acción fuera del bot)"
+    if detalle:
+        razon = f"{detalle} · {razon}"
+    
+    return {
+        "user_id": entrada.target.id,
+        "guild_id": entrada.guild.id,
+        "tipo": tipo,
+        "razon": razon[:1000],
+        "moderator_id": entrada.user_id,
+        "duracion": duracion,
+        "idempotency_key": f"{PREFIJO_AUDITORIA}{entrada.id}",
+        # Misma convención que el resto de la tabla: UTC sin zona horaria
+        "created_at": entrada.created_at.replace(tzinfo=None)
+    }
+
+async def importar_auditoria(guild, desde):
+    """Importa las sanciones del registro de auditoría posteriores a `desde`.
+
+    Recorre el registro en orden cronológico; discord.py pide páginas de 100
+    entradas y respeta los límites de velocidad de la API. Cada página se
+    descarta contra las claves ya escritas con una sola consulta y se vuelca
+    por la cola de acciones antes de pedir la siguiente, así que repetir la
+    importación no duplica nada. Devuelve (entradas revisadas, importadas).
+    """
+    revisadas = importadas = 0
+    pagina = []
+    
+    async def volcar(pagina):
+        existentes = await claves_existentes([accion["idempotency_key"] for accion in pagina])
+        nuevas = [accion for accion in pagina if accion["idempotency_key"] not in existentes]
+        buffer_acciones.agregar_lote(nuevas)
+        await buffer_acciones.vaciar()
+        return len(nuevas)
+    
+    async for entrada in guild.audit_logs(limit=None, after=desde, oldest_first=True):
+        revisadas += 1
+        accion = accion_desde_auditoria(entrada)
+        if accion:
+            pagina.append(accion)
+        if len(pagina) >= AUDITORIA_LOTE:
+            importadas += await volcar(pagina)
+            pagina = []
+    
+    if pagina:
+        importadas += await volcar(pagina)
+    return revisadas, importadas
+
+# =========================================================
+# ANTI-RAID
+# =========================================================
+
+# Entradas dentro de la ventana que disparan el bloqueo (0 desactiva el detector)
+RAID_UMBRAL = int(os.getenv("RAID_UMBRAL", "10"))
+RAID_VENTANA = float(os.getenv("RAID_VENTANA", "10"))
+# Solo se sancionan cuentas más jóvenes que esto (0: todas las de la ventana)
+RAID_EDAD_MAXIMA = int(os.getenv("RAID_EDAD_MAXIMA_DIAS", "7")) * 86400
+# "timeout" o "kick", duración del timeout y del bloqueo (segundos)
+RAID_ACCION = os.getenv("RAID_ACCION", "timeout")
+RAID_TIMEOUT = int(os.getenv("RAID_TIMEOUT", "86400"))
+RAID_BLOQUEO = float(os.getenv("RAID_BLOQUEO", "600"))
+
+class VentanaEntradas:
+    """Estado del detector para un servidor (ver `DetectorRaids`)"""
+
+    __slots__ = ("ultima", "conteos", "edades", "total", "histograma", "recientes",
+                 "bloqueado_hasta", "sancionados_bloqueo")
+
+    def __init__(self, cubetas, franjas, max_recientes):
+        self.ultima = None  # número de la última cubeta de tiempo tocada
+        self.conteos = array("I", bytes(4 * cubetas))
+        self.edades = array("I", bytes(4 * cubetas * franjas))  # histograma por cubeta
+        self.total = 0
+        self.histograma = [0] * franjas
+        self.recientes = deque(maxlen=max_recientes)  # (instante, user_id, edad)
+        self.bloqueado_hasta = 0.0
+        self.sancionados_bloqueo = 0
+
+class DetectorRaids:
+    """Detecta oleadas de entradas por servidor.
+
+    La ventana deslizante se divide en `cubetas` cubetas de tiempo; cada una
+    guarda cuántas entradas hubo y su histograma de edad de cuenta, y los
+    totales se ajustan al entrar y al caducar cada cubeta. Así cada entrada
+    cuesta O(1) y la memoria por servidor es fija (los candidatos a sancionar
+    están acotados por `max_recientes`).
+
+    No lee el reloj ni habla con Discord: recibe los instantes y devuelve
+    decisiones, de modo que se puede reproducir una grabación de entradas.
+    """
+
+    # Límites superiores (segundos) de las franjas de edad de cuenta
+    LIMITES_EDAD = (3600, 86400, 7 * 86400, 30 * 86400)
+    FRANJAS = ("<1h", "<1d", "<7d", "<30d", "≥30d")
+
+    def __init__(self, umbral, ventana, edad_maxima=0, bloqueo=600, cubetas=10, max_recientes=1000):
+        self.umbral = umbral
+        self.ventana = ventana
+        self.edad_maxima = edad_maxima
+        self.bloqueo = bloqueo
+        self.cubetas = cubetas
+        self.ancho = ventana / cubetas
+        self.max_recientes = max_recientes
+        self.guilds = {}
+
+    def sancionable(self, edad):
+        return not self.edad_maxima or edad < self.edad_maxima
+
+    def _avanzar(self, estado, cubeta):
+        # Vacía las cubetas que han salido de la ventana desde la última entrada
+        franjas = len(self.FRANJAS)
+        if estado.ultima is None or cubeta - estado.ultima >= self.cubetas:
+            pendientes = range(self.cubetas)
+        else:
+            pendientes = (c % self.cubetas for c in range(estado.ultima + 1, cubeta + 1))
+        for i in pendientes:
+            if estado.conteos[i]:
+                estado.total -= estado.conteos[i]
+                estado.conteos[i] = 0
+                for franja in range(franjas):
+                    estado.histograma[franja] -= estado.edades[i * franjas + franja]
+                    estado.edades[i * franjas + franja] = 0
+        estado.ultima = cubeta
+
+    def registrar(self, guild_id, user_id, edad, ahora):
+        """Anota una entrada (`edad` de la cuenta en segundos) en el instante `ahora`.
+
+        Devuelve None si no hay que hacer nada. Si no, un diccionario con
+        `nuevo` (True al detectar la oleada, False para las entradas durante
+        el bloqueo) y `objetivos` (IDs a sancionar); al detectarla incluye
+        además `entradas` y `histograma` de la ventana.
+        """
+        estado = self.guilds.get(guild_id)
+        if estado is None:
+            estado = self.guilds[guild_id] = VentanaEntradas(self.cubetas, len(self.FRANJAS), self.max_recientes)
+        
+        cubeta = int(ahora // self.ancho)
+        if cubeta != estado.ultima:
+            self._avanzar(estado, cubeta)
+        
+        i = cubeta % self.cubetas
+        franja = bisect.bisect_right(self.LIMITES_EDAD, edad)
+        estado.conteos[i] += 1
+        estado.edades[i * len(self.FRANJAS) + franja] += 1
+        estado.total += 1
+        estado.histograma[franja] += 1
+        
+        if ahora < estado.bloqueado_hasta:
+            # Ya en bloqueo: cada entrada sospechosa se sanciona al llegar
+            if not self.sancionable(edad):
+                return None
+            estado.sancionados_bloqueo += 1
+            return {"nuevo": False, "objetivos": [user_id]}
+        
+        estado.recientes.append((ahora, user_id, edad))
+        limite = ahora - self.ventana
+        while estado.recientes[0][0] <= limite:
+            estado.recientes.popleft()
+        
+        if estado.total < self.umbral:
+            return None
+        
+        estado.bloqueado_hasta = ahora + self.bloqueo
+        estado.sancionados_bloqueo = 0
+        objetivos = [uid for _, uid, edad_cuenta in estado.recientes if self.sancionable(edad_cuenta)]
+        estado.recientes.clear()
+        return {
+            "nuevo": True,
+            "objetivos": objetivos,
+            "entradas": estado.total,
+            "histograma": dict(zip(self.FRANJAS, estado.histograma))
+        }
+
+    def finalizar_bloqueo(self, guild_id):
+        """Termina el bloqueo de un servidor; devuelve cuántos se sancionaron durante él"""
+        estado = self.guilds.get(guild_id)
+        if estado is None:
+            return 0
+        estado.bloqueado_hasta = 0.0
+        return estado.sancionados_bloqueo
+
+detector_raids = DetectorRaids(RAID_UMBRAL, RAID_VENTANA, RAID_EDAD_MAXIMA, RAID_BLOQUEO)
+
+async def sancionar_raid(guild, objetivos):
+    """Aplica RAID_ACCION a los IDs indicados y registra todo en un lote.
+
+    Devuelve cuántos se sancionaron.
+    """
+    razon = "Anti-raid: entrada durante una oleada"
+    duracion = tiempo_formato(RAID_TIMEOUT) if RAID_ACCION == "timeout" else None
+    semaforo = asyncio.Semaphore(MASIVO_CONCURRENCIA)
+    
+    async def sancionar(user_id):
+        member = guild.get_member(user_id)
+        if member is None:
+            return None
+        async with semaforo:
+            try:
+                if RAID_ACCION == "kick":
+                    await con_reintentos(member.kick, reason=razon)
+                else:
+                    await con_reintentos(member.timeout, timedelta(seconds=RAID_TIMEOUT), reason=razon)
+                return member
+            except (discord.HTTPException, discord.RateLimited) as e:
+                print(f"❌ Anti-raid: no se pudo sancionar a {user_id}: {e}")
+                return None
+    
+    sancionados = [member for member in await asyncio.gather(*(sancionar(uid) for uid in objetivos)) if member]
+    if sancionados:
+        await registrar_acciones([
+            {
+                "user_id": member.id, "guild_id": guild.id,
+                "tipo": "kick" if RAID_ACCION == "kick" else "mute",
+                "razon": razon, "moderator_id": bot.user.id, "duracion": duracion
+            }
+            for member in sancionados
+        ])
+    return len(sancionados)
+
+async def gestionar_raid(guild, decision):
+    """Bloquea el servidor, sanciona a la oleada y publica un único resumen"""
+    nivel_anterior = guild.verification_level
+    bloqueado = False
+    try:
+        await guild.edit(verification_level=discord.VerificationLevel.highest, reason="Anti-raid: bloqueo")
+        bloqueado = True
+    except discord.HTTPException as e:
+        print(f"❌ Anti-raid: no se pudo subir el nivel de verificación: {e}")
+    
+    sancionados = await sancionar_raid(guild, decision["objetivos"])
+    
+    histograma = " · ".join(f"{franja}: {total}" for franja, total in decision["histograma"].items())
+    await send_log_detailed(
+        "Raid Detectado", None, guild.me,
+        f"{decision['entradas']} entradas en {RAID_VENTANA:g}s",
+        discord.Color.dark_red(),
+        extra_fields={
+            "🧮 Edad de las cuentas": histograma,
+            "🛡️ Respuesta": f"{RAID_ACCION} a {sancionados} de {len(decision['objetivos'])} cuentas",
+            "🔒 Bloqueo": f"{RAID_BLOQUEO:g}s" if bloqueado else "No se pudo activar"
+        }
+    )
+    
+    await asyncio.sleep(RAID_BLOQUEO)
+    extra = detector_raids.finalizar_bloqueo(guild.id)
+    if bloqueado:
+        try:
+            await guild.edit(verification_level=nivel_anterior, reason="Anti-raid: fin del bloqueo")
+        except discord.HTTPException as e:
+            print(f"❌ Anti-raid: no se pudo restaurar el nivel de verificación: {e}")
+    await send_log_detailed(
+        "Fin del Bloqueo Anti-raid", None, guild.me,
+        f"Sancionadas {extra} cuentas más durante el bloqueo",
+        discord.Color.green()
+    )
+
+# =========================================================
+# ANTI-SPAM
+# =========================================================
+
+# Ráfaga de mensajes permitida y segundos en que se recupera (0 desactiva el detector)
+SPAM_MENSAJES = int(os.getenv("SPAM_MENSAJES", "8"))
+SPAM_SEGUNDOS = float(os.getenv("SPAM_SEGUNDOS", "5"))
+# Menciones permitidas y segundos en que se recuperan
+SPAM_MENCIONES = int(os.getenv("SPAM_MENCIONES", "10"))
+SPAM_MENCIONES_SEGUNDOS = float(os.getenv("SPAM_MENCIONES_SEGUNDOS", "30"))
+# Mensajes idénticos tolerados entre los últimos SPAM_HISTORIAL
+SPAM_REPETIDOS = int(os.getenv("SPAM_REPETIDOS", "4"))
+SPAM_HISTORIAL = int(os.getenv("SPAM_HISTORIAL", "8"))
+# Duración del silencio automático y segundos sin escribir tras los que se olvida a un usuario
+SPAM_TIMEOUT = int(os.getenv("SPAM_TIMEOUT", "600"))
+SPAM_INACTIVIDAD = float(os.getenv("SPAM_INACTIVIDAD", "300"))
+
+class EstadoSpam:
+    """Estado del detector para un (servidor, usuario) (ver `DetectorSpam`)"""
+
+    __slots__ = ("mensajes", "menciones", "actualizado", "huellas", "posicion")
+
+    def __init__(self, mensajes, menciones, ahora, historial):
+        self.mensajes = float(mensajes)
+        self.menciones = float(menciones)
+        self.actualizado = ahora
+        self.huellas = array("q", bytes(8 * historial))  # anillo de hashes del contenido
+        self.posicion = 0
+
+class DetectorSpam:
+    """Detecta inundaciones de mensajes, spam de menciones y mensajes repetidos.
+
+    Cada (servidor, usuario) tiene dos cubos de fichas (mensajes y menciones)
+    y un anillo de tamaño fijo con la huella de sus últimos mensajes. Los
+    estados se guardan en orden de última actividad, así que los inactivos se
+    descartan desde el principio sin recorrer el resto. Como `DetectorRaids`,
+    recibe los instantes en lugar de leer el reloj.
+    """
+
+    def __init__(self, mensajes, segundos, menciones, menciones_segundos, repetidos, historial, inactividad):
+        self.mensajes = mensajes
+        self.tasa_mensajes = mensajes / segundos
+        self.menciones = menciones
+        self.tasa_menciones = menciones / menciones_segundos
+        self.repetidos = repetidos
+        self.historial = historial
+        self.inactividad = inactividad
+        self.estados = OrderedDict()
+
+    def __len__(self):
+        return len(self.estados)
+
+    def registrar(self, guild_id, user_id, menciones, huella, ahora):
+        """Anota un mensaje y devuelve el motivo si es spam (o None).
+
+        `huella` es un hash del contenido (0 para mensajes sin texto). Al
+        detectar spam se olvida el estado del usuario para empezar de cero
+        cuando vuelva a escribir.
+        """
+        estados = self.estados
+        clave = (guild_id, user_id)
+        estado = estados.get(clave)
+        if estado is None:
+            estado = estados[clave] = EstadoSpam(self.mensajes, self.menciones, ahora, self.historial)
+        else:
+            estados.move_to_end(clave)
+            transcurrido = ahora - estado.actualizado
+            estado.mensajes = min(self.mensajes, estado.mensajes + transcurrido * self.tasa_mensajes)
+            estado.menciones = min(self.menciones, estado.menciones + transcurrido * self.tasa_menciones)
+            estado.actualizado = ahora
+        
+        # Los más antiguos están al principio
+        limite = ahora - self.inactividad
+        while True:
+            primero = next(iter(estados.values()))
+            if primero.actualizado >= limite:
+                break
+            estados.popitem(last=False)
+        
+        motivo = None
+        if estado.mensajes < 1:
+            motivo = "Inundación de mensajes"
+        elif menciones and estado.menciones < menciones:
+            motivo = "Spam de menciones"
+        elif huella and estado.huellas.count(huella) + 1 >= self.repetidos:
+            motivo = "Mensajes repetidos"
+        
+        if motivo:
+            del estados[clave]
+            return motivo
+        
+        estado.mensajes -= 1
+        estado.menciones -= menciones
+        if huella:
+            estado.huellas[estado.posicion] = huella
+            estado.posicion = (estado.posicion + 1) % self.historial
+        return None
+
+detector_spam = DetectorSpam(
+    SPAM_MENSAJES, SPAM_SEGUNDOS, SPAM_MENCIONES, SPAM_MENCIONES_SEGUNDOS,
+    SPAM_REPETIDOS, SPAM_HISTORIAL, SPAM_INACTIVIDAD
+)
+
+async def silenciar_spam(member, motivo):
+    """Silencia automáticamente a quien ha hecho spam, por el mismo camino que `mute`"""
+    if member.is_timed_out():
+        return
+    razon = f"Anti-spam: {motivo}"
+    duracion = tiempo_formato(SPAM_TIMEOUT)
+    try:
+        await member.timeout(timedelta(seconds=SPAM_TIMEOUT), reason=razon)
+    except discord.HTTPException as e:
+        print(f"❌ Anti-spam: no se pudo silenciar a {member.id}: {e}")
+        return
+    
+    await registrar_accion(
+        member.id, member.guild.id, "mute",
+        razon, bot.user.id, duracion,
+        efectos=[
+            efecto_log("Usuario Silenciado (anti-spam)", member, member.guild.me, razon,
+                       discord.Color.dark_gray(), duracion),
+            efecto_dm(member, "mute", razon, duracion)
+        ]
+    )
+
 # =========================================================
 # EVENTOS
 # =========================================================
 
+def estado_salud():
+    """Estado del bot para /healthz: gateway, base de datos y colas internas"""
+    # `latency` se mide en cada ACK de heartbeat; sin conexión es nan o inf
+    latencia = bot.latency
+    gateway_ok = bot.is_ready() and not bot.is_closed() and math.isfinite(latencia)
+    
+    db_ok = buffer_acciones.ultimo_volcado_ok and circuito_db.permite()
+    
+    return {
+        "ok": gateway_ok and db_ok,
+        "listo": gateway_ok,
+        "gateway": {
+            "conectado": gateway_ok,
+            "latencia_ms": round(latencia * 1000) if math.isfinite(latencia) else None
+        },
+        "db": {
+            "ok": db_ok,
+            "circuito": circuito_db.estado,
+            "replica": engine_replica is not None,
+            "pool": gestor_pool.estadisticas(),
+            "tareas_en_curso": tareas_db,
+            "tareas_en_espera": max(tareas_db - DB_WORKERS, 0)
+        },
+        "colas": {
+            "acciones": len(buffer_acciones),
+            "acciones_max_lote": buffer_acciones.max_lote,
+            "diario_lotes": diario_local.lotes,
+            "logs": sumidero_logs.cola.qsize()
+        }
+    }
+
+# AppRunner del servidor de salud (ver keep_alive); se cierra con el bot
+servidor_salud = None
+
+@bot.event
+async def setup_hook():
+    """Arranca las tareas de fondo antes de conectar al gateway"""
+    bot.loop.create_task(buffer_acciones.ejecutar_periodicamente())
+    bot.loop.create_task(despachador_outbox.ejecutar())
+    bot.loop.create_task(sumidero_logs.ejecutar())
+    bot.loop.create_task(medir_event_loop())
+    bot.loop.create_task(circuito_db.ejecutar())
+    bot.loop.create_task(mantener_acciones())
+    if engine.dialect.name == "mysql":
+        bot.loop.create_task(gestor_pool.ejecutar())
+    
+    # Servidor de salud y métricas en este mismo event loop
+    global servidor_salud
+    servidor_salud = await keep_alive(estado_salud, port=HEALTH_PORT)
+
+@bot.event
+async def close():
+    """Libera el puerto del servidor de salud y cierra la conexión con Discord"""
+    global servidor_salud
+    if servidor_salud is not None:
+        runner, servidor_salud = servidor_salud, None
+        try:
+            await runner.cleanup()
+        except Exception as e:
+            print(f"❌ Error al cerrar el servidor de salud: {e}")
+    await commands.Bot.close(bot)
+
 @bot.event
 async def on_ready():
     """Evento cuando el bot está listo"""
@@ -450,7 +3226,9 @@ async def on_ready():
     print(f"🆔 ID: {bot.user.id}")
     print(f"👥 Conectado a {len(bot.guilds)} servidores")
     
-    init_db()
+    # on_ready se repite tras cada reconexión: la carga masiva solo una vez
+    if not cache_warns.cargado:
+        await ejecutar_db(cache_warns.cargar_sync)
     
     await bot.change_presence(
         activity=discord.Activity(
@@ -459,6 +3237,60 @@ async def on_ready():
         )
     )
 
+@bot.before_invoke
+async def antes_de_comando(ctx):
+    """Marca el inicio del comando y elige de dónde leerá"""
+    ctx.inicio_comando = time.perf_counter()
+    fijar_lecturas(ctx.author.id)
+
+@bot.after_invoke
+async def despues_de_comando(ctx):
+    """Registra la latencia del comando (también si falló)"""
+    inicio = getattr(ctx, "inicio_comando", None)
+    if inicio is not None:
+        COMANDO_LATENCIA.labels(ctx.command.qualified_name).observe(time.perf_counter() - inicio)
+
+@bot.event
+async def on_guild_remove(guild):
+    """Libera los contadores en memoria de un servidor abandonado"""
+    cache_warns.invalidar_guild(guild.id)
+    estadisticas_guilds.invalidar(guild.id)
+
+@bot.event
+async def on_message(message):
+    """Pasa cada mensaje por el detector de spam y luego procesa los comandos"""
+    if SPAM_MENSAJES and message.guild and not message.author.bot:
+        menciones = len(message.raw_mentions) + len(message.raw_role_mentions) + message.mention_everyone
+        huella = hash(message.content) if message.content else 0
+        motivo = detector_spam.registrar(message.guild.id, message.author.id, menciones, huella, time.monotonic())
+        # Los permisos solo se miran cuando hay algo que sancionar
+        if motivo and isinstance(message.author, discord.Member) and not tiene_permisos_moderacion(message.author):
+            bot.loop.create_task(silenciar_spam(message.author, motivo))
+    
+    await bot.process_commands(message)
+
+@bot.event
+async def on_member_join(member):
+    """Alimenta el detector de raids con cada entrada"""
+    if not RAID_UMBRAL:
+        return
+    edad = (discord.utils.utcnow() - member.created_at).total_seconds()
+    decision = detector_raids.registrar(member.guild.id, member.id, edad, time.monotonic())
+    if decision is None:
+        return
+    if decision["nuevo"]:
+        # El bloqueo dura minutos: que no retenga el despacho de eventos
+        bot.loop.create_task(gestionar_raid(member.guild, decision))
+    else:
+        await sancionar_raid(member.guild, decision["objetivos"])
+
+@bot.event
+async def on_audit_log_entry_create(entrada):
+    """Registra las sanciones y cambios de rol hechos desde la interfaz de Discord"""
+    accion = accion_desde_auditoria(entrada)
+    if accion:
+        buffer_acciones.agregar(**accion)
+
 # =========================================================
 # COMANDOS DE MODERACIÓN
 # =========================================================
@@ -503,36 +3335,35 @@ async def warn_command(ctx, member: discord.Member, *, reason: str = "No se espe
             ))
             return
     
-    # Registrar warn en la base de datos
-    registrar_accion(
-        member.id, ctx.guild.id, "warn", 
-        reason, ctx.author.id
-    )
-    
-    warns = contar_warns(member.id, ctx.guild.id)
-    
-    # Enviar log detallado
-    await send_log_detailed(
-        "Warn Aplicado",
-        member, ctx.author, reason,
-        discord.Color.orange()
-    )
-    
-    # Notificar al usuario por DM
-    await notify_user_dm(member, "warn", reason, moderator=ctx.author)
+    # Registrar warn en la base de datos (log y DM se entregan vía outbox)
+    async with lock_warns(member.id, ctx.guild.id):
+        await registrar_accion(
+            member.id, ctx.guild.id, "warn", 
+            reason, ctx.author.id,
+            efectos=[
+                efecto_log("Warn Aplicado", member, ctx.author, reason, discord.Color.orange()),
+                efecto_dm(member, "warn", reason, moderator=ctx.author)
+            ]
+        )
+        
+        try:
+            warns = await contar_warns(member.id, ctx.guild.id)
+        except BaseDatosNoDisponible:
+            # El warn ya está registrado; el total se conocerá cuando vuelva la BD
+            warns = None
     
     # Enviar confirmación al canal
     embed = create_embed(
         "⚠️ Warn Registrado",
         f"{member.mention} ha recibido una advertencia.\n\n"
         f"**Razón:** {reason}\n"
-        f"**Warns actuales:** {warns}/3",
+        f"**Warns actuales:** {f'{warns}/3' if warns is not None else 'no disponible'}",
         discord.Color.orange()
     )
-    await ctx.send(embed=embed)
+    await ctx.send(embed=marcar_obsoleto(embed))
     
     # Verificar si tiene 3 warns
-    if warns >= 3:
+    if warns is not None and warns >= 3:
         await check_3_warns(member, ctx.author)
 
 @bot.command(name="unwarn")
@@ -555,50 +3386,41 @@ async def unwarn_command(ctx, member: discord.Member = None, cantidad: int = 1):
         ))
         return
     
-    warns_actuales = contar_warns(member.id, ctx.guild.id)
-    
-    if warns_actuales == 0:
-        await ctx.send(embed=create_embed("ℹ️ Información", f"{member.mention} no tiene warns.", discord.Color.blue()))
+    if cantidad < 1:
+        await ctx.send(embed=create_embed("❌ Error", "La cantidad debe ser al menos 1.", discord.Color.red()))
         return
     
-    if cantidad > warns_actuales:
-        cantidad = warns_actuales
-    
-    # Registrar la acción de unwarn
-    registrar_accion(
-        member.id, ctx.guild.id, "unwarn", 
-        f"Se removieron {cantidad} warns (anterior: {warns_actuales})", 
-        ctx.author.id
-    )
-    
-    # Actualizar contador en la base de datos
-    if cantidad == warns_actuales:
-        reset_warns(member.id, ctx.guild.id)
-        nuevo_total = 0
-    else:
-        # Para reducir parcialmente, necesitamos un enfoque diferente
-        # Por simplicidad, resetamos y reajustamos
-        reset_warns(member.id, ctx.guild.id)
-        nuevo_total = max(0, warns_actuales - cantidad)
+    async with lock_warns(member.id, ctx.guild.id):
+        warns_actuales = await contar_warns(member.id, ctx.guild.id)
         
-        # Si todavía hay warns, actualizar contador
-        if nuevo_total > 0:
-            with engine.begin() as conn:
-                conn.execute(
-                    text("""
-                        INSERT INTO user_warns (user_id, guild_id, total_warns, last_warn_date)
-                        VALUES (:user_id, :guild_id, :total_warns, NOW())
-                    """),
-                    {"user_id": member.id, "guild_id": ctx.guild.id, "total_warns": nuevo_total}
-                )
+        if warns_actuales == 0:
+            await ctx.send(embed=create_embed("ℹ️ Información", f"{member.mention} no tiene warns.", discord.Color.blue()))
+            return
+        
+        if cantidad > warns_actuales:
+            cantidad = warns_actuales
+        
+        nuevo_total = warns_actuales - cantidad
+        
+        # Registrar el unwarn, descontar el contador y encolar el log en una sola transacción
+        ok = await quitar_warns(
+            member.id, ctx.guild.id, cantidad, ctx.author.id,
+            f"Se removieron {cantidad} warns (anterior: {warns_actuales})",
+            efectos=[efecto_log(
+                "Warns Removidos",
+                member, ctx.author, 
+                f"Se removieron {cantidad} warns. Quedan {nuevo_total}",
+                discord.Color.green()
+            )]
+        )
     
-    # Enviar log
-    await send_log_detailed(
-        "Warns Removidos",
-        member, ctx.author, 
-        f"Se removieron {cantidad} warns. Quedan {nuevo_total}",
-        discord.Color.green()
-    )
+    if not ok:
+        await ctx.send(embed=create_embed(
+            "❌ Error",
+            "No se pudieron remover los warns. Inténtalo de nuevo.",
+            discord.Color.red()
+        ))
+        return
     
     embed = create_embed(
         "✅ Warns Removidos",
@@ -629,10 +3451,13 @@ async def historial_command(ctx, member: discord.Member = None):
         ))
         return
     
-    acciones = obtener_historial(member.id, ctx.guild.id, limit=10)
-    warns = contar_warns(member.id, ctx.guild.id)
+    # Totales por agregación y primera página por keyset
+    perfil = await obtener_perfil(member.id, ctx.guild.id, ultimos_warns=0)
+    acciones = []
+    if perfil["total_acciones"] > perfil["resumidas"]:
+        acciones = await obtener_pagina_historial(member.id, ctx.guild.id, HISTORIAL_POR_PAGINA + 1)
     
-    if not acciones:
+    if not acciones and not perfil["resumidas"]:
         await ctx.send(embed=create_embed(
             "📄 Historial Vacío",
             f"{member.mention} no tiene historial de acciones registradas.",
@@ -640,185 +3465,516 @@ async def historial_command(ctx, member: discord.Member = None):
         ))
         return
     
-    # Contar acciones por tipo
-    contadores = {}
-    for accion in acciones:
-        tipo = accion['tipo']
-        contadores[tipo] = contadores.get(tipo, 0) + 1
+    hay_siguiente = len(acciones) > HISTORIAL_POR_PAGINA
+    acciones = acciones[:HISTORIAL_POR_PAGINA]
     
-    # Crear descripción con contadores
-    descripcion = f"**Total acciones:** {len(acciones)}\n"
-    descripcion += f"**Warns actuales:** {warns}/3\n\n"
+    vista = VistaHistorial(ctx.author, member, perfil, acciones, hay_siguiente)
+    vista.mensaje = await ctx.send(embed=crear_embed_historial(member, perfil, acciones, 0), view=vista)
+
+@bot.command(name="mute")
+async def mute_command(ctx, member: discord.Member = None, tiempo: str = None, *, reason="Sin razón"):
+    """Silencia a un usuario temporalmente"""
+    # Verificar permisos
+    if not tiene_permisos_moderacion(ctx.author):
+        await ctx.send(embed=create_embed(
+            "❌ Permisos Insuficientes",
+            "Necesitas permisos de moderación para usar este comando.",
+            discord.Color.red()
+        ))
+        return
     
-    for tipo, count in contadores.items():
-        descripcion += f"**{tipo.title()}:** {count}\n"
+    if member is None or tiempo is None:
+        await ctx.send(embed=create_embed(
+            "❌ Argumentos faltantes",
+            f"Uso correcto: `{ctx.prefix}mute @usuario <tiempo> [razón]`\n"
+            "Ejemplo: `god mute @usuario 1h Spam`\n"
+            "Formatos: `1d` (días), `2h` (horas), `30m` (minutos), `60s` (segundos)",
+            discord.Color.red()
+        ))
+        return
     
-    embed = discord.Embed(
-        title=f"📄 Historial de {member.name}",
-        description=descripcion,
-        color=discord.Color.blue(),
-        timestamp=datetime.utcnow()
-    )
+    if member == ctx.author:
+        await ctx.send(embed=create_embed(
+            "❌ Error",
+            "No puedes silenciarte a ti mismo.",
+            discord.Color.red()
+        ))
+        return
     
-    # Emoji mapping para tipos de acción
-    emoji_map = {
-        "warn": "⚠️",
-        "mute": "🔇",
-        "ban": "🚫",
-        "kick": "👢",
-        "unmute": "🔊",
-        "unban": "♻️",
-        "promote": "🎉",
-        "demote": "🔻",
-        "unwarn": "✅"
-    }
+    if member.bot:
+        await ctx.send(embed=create_embed(
+            "❌ Error",
+            "No puedes silenciar a un bot.",
+            discord.Color.red()
+        ))
+        return
     
-    # Mostrar las últimas 5 acciones en detalle
-    for i, accion in enumerate(acciones[:5], 1):
-        tipo = accion['tipo']
-        fecha = accion['fecha'].strftime('%d/%m/%Y %H:%M')
-        emoji = emoji_map.get(tipo, "📝")
-        
-        field_value = f"**Razón:** {accion['razon'] or 'Sin razón especificada'}\n"
-        if accion['duracion']:
-            field_value += f"**Duración:** {accion['duracion']}\n"
-        if accion['moderator_id']:
-            field_value += f"**Moderador:** <@{accion['moderator_id']}>\n"
-        field_value += f"**Fecha:** {fecha}"
-        
-        embed.add_field(
-            name=f"{i}. {emoji} {tipo.title()}",
-            value=field_value,
-            inline=False
-        )
+    # Verificar jerarquía de roles (excepto para el owner)
+    if ctx.author.id != ctx.guild.owner_id:
+        if member.top_role >= ctx.author.top_role:
+            await ctx.send(embed=create_embed(
+                "❌ Error de Jerarquía",
+                f"No puedes silenciar a {member.mention} porque tiene un rol igual o superior al tuyo.",
+                discord.Color.red()
+            ))
+            return
     
-    embed.set_thumbnail(url=member.display_avatar.url)
-    embed.set_footer(text=f"ID: {member.id} | Mostrando {len(acciones[:5])} de {len(acciones)} acciones")
+    # Verificar que el bot pueda silenciar al usuario
+    if member.top_role >= ctx.guild.me.top_role:
+        await ctx.send(embed=create_embed(
+            "❌ Error de Jerarquía del Bot",
+            f"No puedo silenciar a {member.mention} porque tiene un rol igual o superior al mío.\n"
+            "Mueve mi rol más arriba en la jerarquía.",
+            discord.Color.red()
+        ))
+        return
     
-    await ctx.send(embed=embed)
+    seconds = parse_time(tiempo)
+    if not seconds:
+        await ctx.send(embed=create_embed(
+            "❌ Error",
+            "Formato de tiempo inválido. Usa: `1d` (días), `2h` (horas), `30m` (minutos), `60s` (segundos)",
+            discord.Color.red()
+        ))
+        return
+    
+    # Verificar que el tiempo no exceda el máximo permitido (28 días)
+    if seconds > 2419200:  # 28 días en segundos
+        await ctx.send(embed=create_embed(
+            "❌ Error",
+            "El tiempo máximo de silencio es de 28 días.",
+            discord.Color.red()
+        ))
+        return
+    
+    try:
+        await member.timeout(timedelta(seconds=seconds), reason=reason)
+        
+        # Registrar en base de datos (log y DM se entregan vía outbox)
+        await registrar_accion(
+            member.id, ctx.guild.id, "mute",
+            reason, ctx.author.id, tiempo,
+            efectos=[
+                efecto_log("Usuario Silenciado", member, ctx.author, reason,
+                           discord.Color.dark_gray(), tiempo),
+                efecto_dm(member, "mute", reason, tiempo, ctx.author)
+            ]
+        )
+        
+        await ctx.send(embed=create_embed(
+            "🔇 Mute Aplicado",
+            f"{member.mention} ha sido silenciado por {tiempo}.\n"
+            f"**Razón:** {reason}",
+            discord.Color.dark_gray()
+        ))
+    except discord.Forbidden:
+        await ctx.send(embed=create_embed(
+            "❌ Error de Permisos",
+            "No tengo permisos para silenciar a este usuario.\n"
+            "Asegúrate de que:\n"
+            "• El bot tiene el permiso **Aislar miembros**\n"
+            "• El rol del bot está por encima del rol del usuario\n"
+            "• El usuario no es el dueño del servidor",
+            discord.Color.red()
+        ))
+    except Exception as e:
+        await ctx.send(embed=create_embed(
+            "❌ Error",
+            f"No se pudo silenciar al usuario: {str(e)}",
+            discord.Color.red()
+        ))
 
-@bot.command(name="mute")
-async def mute_command(ctx, member: discord.Member = None, tiempo: str = None, *, reason="Sin razón"):
-    """Silencia a un usuario temporalmente"""
+@bot.command(name="unmute")
+async def unmute_command(ctx, member: discord.Member = None):
+    """Remueve el silencio de un usuario"""
     # Verificar permisos
     if not tiene_permisos_moderacion(ctx.author):
         await ctx.send(embed=create_embed(
             "❌ Permisos Insuficientes",
-            "Necesitas permisos de moderación para usar este comando.",
+            "Necesitas permisos de moderación para usar este comando.",
+            discord.Color.red()
+        ))
+        return
+    
+    if member is None:
+        await ctx.send(embed=create_embed(
+            "❌ Usuario requerido",
+            f"Debes mencionar a un usuario.\nUso: `{ctx.prefix}unmute @usuario`",
+            discord.Color.red()
+        ))
+        return
+    
+    if not member.is_timed_out():
+        await ctx.send(embed=create_embed(
+            "ℹ️ Información",
+            f"{member.mention} no está silenciado.",
+            discord.Color.blue()
+        ))
+        return
+    
+    try:
+        await member.timeout(None, reason="Unmute manual")
+        
+        await registrar_accion(
+            member.id, ctx.guild.id, "unmute",
+            "Unmute manual", ctx.author.id,
+            efectos=[
+                efecto_log("Usuario Desilenciado", member, ctx.author, "Unmute manual",
+                           discord.Color.green()),
+                efecto_dm(member, "unmute", "Tu silencio ha sido removido", moderator=ctx.author)
+            ]
+        )
+        
+        await ctx.send(embed=create_embed(
+            "✅ Unmute Aplicado",
+            f"{member.mention} ha sido desilenciado.",
+            discord.Color.green()
+        ))
+    except Exception as e:
+        await ctx.send(embed=create_embed(
+            "❌ Error",
+            f"No se pudo desilenciar al usuario: {str(e)}",
+            discord.Color.red()
+        ))
+
+@bot.command(name="ban")
+async def ban_command(ctx, member: typing.Union[discord.Member, discord.User] = None, *, reason="Sin razón"):
+    """Banea a un usuario del servidor (también por ID si ya no está)"""
+    if not ctx.author.guild_permissions.ban_members:
+        await ctx.send(embed=create_embed(
+            "❌ Permisos Insuficientes",
+            "Necesitas el permiso **Banear miembros** para usar este comando.",
+            discord.Color.red()
+        ))
+        return
+    
+    if member is None:
+        await ctx.send(embed=create_embed(
+            "❌ Usuario requerido",
+            f"Uso correcto: `{ctx.prefix}ban @usuario|ID [razón]`",
+            discord.Color.red()
+        ))
+        return
+    
+    error = validar_objetivo(ctx, member, "banear")
+    if error:
+        await ctx.send(embed=create_embed("❌ Error", error, discord.Color.red()))
+        return
+    
+    avisado = await avisar_antes_de_expulsar(member, "ban", reason, ctx.author)
+    
+    try:
+        try:
+            await ctx.guild.ban(member, reason=reason)
+        except Exception:
+            if avisado:
+                await rectificar_aviso(member, "ban", reason, ctx.author)
+            raise
+        
+        efectos = [efecto_log("Usuario Baneado", member, ctx.author, reason, discord.Color.red())]
+        if not avisado:
+            # Sin aviso previo (ban por ID o DM fallido): se intenta vía outbox
+            efectos.append(efecto_dm(member, "ban", reason, moderator=ctx.author))
+        await registrar_accion(
+            member.id, ctx.guild.id, "ban",
+            reason, ctx.author.id,
+            efectos=efectos
+        )
+        
+        await ctx.send(embed=create_embed(
+            "🚫 Ban Aplicado",
+            f"{member.mention} ha sido baneado.\n"
+            f"**Razón:** {reason}",
+            discord.Color.red()
+        ))
+    except discord.Forbidden:
+        await ctx.send(embed=create_embed(
+            "❌ Error de Permisos",
+            "No tengo permisos para banear a este usuario.\n"
+            "Asegúrate de que el bot tiene el permiso **Banear miembros** "
+            "y su rol está por encima del rol del usuario.",
+            discord.Color.red()
+        ))
+    except Exception as e:
+        await ctx.send(embed=create_embed(
+            "❌ Error",
+            f"No se pudo banear al usuario: {str(e)}",
+            discord.Color.red()
+        ))
+
+@bot.command(name="kick")
+async def kick_command(ctx, member: discord.Member = None, *, reason="Sin razón"):
+    """Expulsa a un usuario del servidor"""
+    if not ctx.author.guild_permissions.kick_members:
+        await ctx.send(embed=create_embed(
+            "❌ Permisos Insuficientes",
+            "Necesitas el permiso **Expulsar miembros** para usar este comando.",
             discord.Color.red()
         ))
         return
     
-    if member is None or tiempo is None:
+    if member is None:
         await ctx.send(embed=create_embed(
-            "❌ Argumentos faltantes",
-            f"Uso correcto: `{ctx.prefix}mute @usuario <tiempo> [razón]`\n"
-            "Ejemplo: `god mute @usuario 1h Spam`\n"
-            "Formatos: `1d` (días), `2h` (horas), `30m` (minutos), `60s` (segundos)",
+            "❌ Usuario requerido",
+            f"Uso correcto: `{ctx.prefix}kick @usuario [razón]`",
             discord.Color.red()
         ))
         return
     
-    if member == ctx.author:
+    error = validar_objetivo(ctx, member, "expulsar")
+    if error:
+        await ctx.send(embed=create_embed("❌ Error", error, discord.Color.red()))
+        return
+    
+    avisado = await avisar_antes_de_expulsar(member, "kick", reason, ctx.author)
+    
+    try:
+        try:
+            await member.kick(reason=reason)
+        except Exception:
+            if avisado:
+                await rectificar_aviso(member, "kick", reason, ctx.author)
+            raise
+        
+        efectos = [efecto_log("Usuario Expulsado", member, ctx.author, reason, discord.Color.orange())]
+        if not avisado:
+            efectos.append(efecto_dm(member, "kick", reason, moderator=ctx.author))
+        await registrar_accion(
+            member.id, ctx.guild.id, "kick",
+            reason, ctx.author.id,
+            efectos=efectos
+        )
+        
         await ctx.send(embed=create_embed(
-            "❌ Error",
-            "No puedes silenciarte a ti mismo.",
+            "👢 Kick Aplicado",
+            f"{member.mention} ha sido expulsado.\n"
+            f"**Razón:** {reason}",
+            discord.Color.orange()
+        ))
+    except discord.Forbidden:
+        await ctx.send(embed=create_embed(
+            "❌ Error de Permisos",
+            "No tengo permisos para expulsar a este usuario.\n"
+            "Asegúrate de que el bot tiene el permiso **Expulsar miembros** "
+            "y su rol está por encima del rol del usuario.",
             discord.Color.red()
         ))
-        return
-    
-    if member.bot:
+    except Exception as e:
         await ctx.send(embed=create_embed(
             "❌ Error",
-            "No puedes silenciar a un bot.",
+            f"No se pudo expulsar al usuario: {str(e)}",
             discord.Color.red()
         ))
-        return
-    
-    # Verificar jerarquía de roles (excepto para el owner)
-    if ctx.author.id != ctx.guild.owner_id:
-        if member.top_role >= ctx.author.top_role:
-            await ctx.send(embed=create_embed(
-                "❌ Error de Jerarquía",
-                f"No puedes silenciar a {member.mention} porque tiene un rol igual o superior al tuyo.",
-                discord.Color.red()
-            ))
-            return
-    
-    # Verificar que el bot pueda silenciar al usuario
-    if member.top_role >= ctx.guild.me.top_role:
+
+@bot.command(name="unban")
+async def unban_command(ctx, user: discord.User = None, *, reason="Unban manual"):
+    """Levanta el ban de un usuario (por ID)"""
+    if not ctx.author.guild_permissions.ban_members:
         await ctx.send(embed=create_embed(
-            "❌ Error de Jerarquía del Bot",
-            f"No puedo silenciar a {member.mention} porque tiene un rol igual o superior al mío.\n"
-            "Mueve mi rol más arriba en la jerarquía.",
+            "❌ Permisos Insuficientes",
+            "Necesitas el permiso **Banear miembros** para usar este comando.",
             discord.Color.red()
         ))
         return
     
-    seconds = parse_time(tiempo)
-    if not seconds:
+    if user is None:
         await ctx.send(embed=create_embed(
-            "❌ Error",
-            "Formato de tiempo inválido. Usa: `1d` (días), `2h` (horas), `30m` (minutos), `60s` (segundos)",
+            "❌ Usuario requerido",
+            f"Uso correcto: `{ctx.prefix}unban <ID> [razón]`",
             discord.Color.red()
         ))
         return
     
-    # Verificar que el tiempo no exceda el máximo permitido (28 días)
-    if seconds > 2419200:  # 28 días en segundos
+    try:
+        await ctx.guild.unban(user, reason=reason)
+    except discord.NotFound:
+        await ctx.send(embed=create_embed(
+            "ℹ️ Información",
+            f"{user.mention} no está baneado.",
+            discord.Color.blue()
+        ))
+        return
+    except Exception as e:
         await ctx.send(embed=create_embed(
             "❌ Error",
-            "El tiempo máximo de silencio es de 28 días.",
+            f"No se pudo desbanear al usuario: {str(e)}",
             discord.Color.red()
         ))
         return
     
-    try:
-        await member.timeout(timedelta(seconds=seconds), reason=reason)
-        
-        # Registrar en base de datos
-        registrar_accion(
-            member.id, ctx.guild.id, "mute",
-            reason, ctx.author.id, tiempo
-        )
-        
-        # Enviar log detallado
-        await send_log_detailed(
-            "Usuario Silenciado",
-            member, ctx.author, reason,
-            discord.Color.dark_gray(), tiempo
-        )
-        
-        # Notificar al usuario por DM
-        await notify_user_dm(member, "mute", reason, tiempo, ctx.author)
-        
+    await registrar_accion(
+        user.id, ctx.guild.id, "unban",
+        reason, ctx.author.id,
+        efectos=[
+            efecto_log("Usuario Desbaneado", user, ctx.author, reason, discord.Color.green())
+        ]
+    )
+    
+    await ctx.send(embed=create_embed(
+        "♻️ Unban Aplicado",
+        f"{user.mention} ha sido desbaneado.",
+        discord.Color.green()
+    ))
+
+# IDs por llamada a `Guild.bulk_ban` (límite de la API) y máximo por comando
+MASSBAN_LOTE = 200
+MASSBAN_MAX = int(os.getenv("MASSBAN_MAX", "1000"))
+
+@bot.command(name="massban")
+async def massban_command(ctx, *, contenido: str = ""):
+    """Banea de una vez una lista de IDs (en el mensaje o en un .txt adjunto)"""
+    if not ctx.author.guild_permissions.ban_members:
         await ctx.send(embed=create_embed(
-            "🔇 Mute Aplicado",
-            f"{member.mention} ha sido silenciado por {tiempo}.\n"
-            f"**Razón:** {reason}",
-            discord.Color.dark_gray()
+            "❌ Permisos Insuficientes",
+            "Necesitas el permiso **Banear miembros** para usar este comando.",
+            discord.Color.red()
         ))
-    except discord.Forbidden:
+        return
+    
+    # Las IDs pueden venir sueltas, como menciones o en ficheros adjuntos;
+    # el texto que sobra es la razón
+    texto = contenido
+    for adjunto in ctx.message.attachments:
+        texto += "\n" + (await adjunto.read()).decode("utf-8", errors="ignore")
+    patron = r"<@!?(\d{15,20})>|\b(\d{15,20})\b"
+    ids = list(dict.fromkeys(int(mencion or numero) for mencion, numero in re.findall(patron, texto)))
+    reason = re.sub(patron, "", contenido).strip() or "Baneo masivo"
+    
+    if not ids:
         await ctx.send(embed=create_embed(
-            "❌ Error de Permisos",
-            "No tengo permisos para silenciar a este usuario.\n"
-            "Asegúrate de que:\n"
-            "• El bot tiene el permiso **Aislar miembros**\n"
-            "• El rol del bot está por encima del rol del usuario\n"
-            "• El usuario no es el dueño del servidor",
+            "❌ IDs requeridas",
+            f"Uso correcto: `{ctx.prefix}massban <ID> <ID> ... [razón]`\n"
+            "También puedes adjuntar un fichero de texto con una ID por línea.",
             discord.Color.red()
         ))
-    except Exception as e:
+        return
+    
+    if len(ids) > MASSBAN_MAX:
         await ctx.send(embed=create_embed(
-            "❌ Error",
-            f"No se pudo silenciar al usuario: {str(e)}",
+            "❌ Demasiadas IDs",
+            f"El máximo por comando es {MASSBAN_MAX} (has enviado {len(ids)}).",
             discord.Color.red()
         ))
+        return
+    
+    # Validar cada objetivo una vez; quien no está en el servidor no tiene jerarquía
+    objetivos, rechazados = [], []
+    for user_id in ids:
+        member = ctx.guild.get_member(user_id) or discord.Object(id=user_id)
+        error = validar_objetivo(ctx, member, "banear")
+        if error:
+            rechazados.append(user_id)
+        else:
+            objetivos.append(member)
+    
+    inicio = time.perf_counter()
+    baneados, fallidos = [], []
+    async with ctx.typing():
+        for i in range(0, len(objetivos), MASSBAN_LOTE):
+            lote = objetivos[i:i + MASSBAN_LOTE]
+            try:
+                resultado = await ctx.guild.bulk_ban(lote, reason=reason)
+                baneados.extend(usuario.id for usuario in resultado.banned)
+                fallidos.extend(usuario.id for usuario in resultado.failed)
+            except discord.HTTPException as e:
+                # Un lote rechazado entero no impide intentar los siguientes
+                print(f"❌ Error en bulk_ban ({len(lote)} IDs): {e}")
+                fallidos.extend(usuario.id for usuario in lote)
+        
+        if baneados:
+            # Un único log con el resumen, asociado a la primera acción del lote
+            efectos = [efecto_log(
+                "Baneo Masivo", None, ctx.author, reason, discord.Color.dark_red(),
+                extra_fields={
+                    "🚫 Baneados": len(baneados),
+                    "❌ Fallidos": len(fallidos) + len(rechazados),
+                    "🆔 IDs": ", ".join(str(user_id) for user_id in baneados)
+                }
+            )]
+            await registrar_acciones([
+                {
+                    "user_id": user_id, "guild_id": ctx.guild.id, "tipo": "ban",
+                    "razon": reason, "moderator_id": ctx.author.id,
+                    "efectos": efectos if i == 0 else None
+                }
+                for i, user_id in enumerate(baneados)
+            ])
+    
+    descripcion = (
+        f"**Baneados:** {len(baneados)}\n"
+        f"**Fallidos:** {len(fallidos)}\n"
+        f"**Omitidos (jerarquía/propios):** {len(rechazados)}\n"
+        f"**Razón:** {reason}\n"
+        f"**Tiempo:** {time.perf_counter() - inicio:.1f}s"
+    )
+    await ctx.send(embed=create_embed(
+        "🚫 Baneo Masivo",
+        descripcion,
+        discord.Color.dark_red() if baneados else discord.Color.red()
+    ))
 
-@bot.command(name="unmute")
-async def unmute_command(ctx, member: discord.Member = None):
-    """Remueve el silencio de un usuario"""
-    # Verificar permisos
+# Llamadas simultáneas a la API al sancionar en grupo y reintentos de cada
+# una cuando Discord responde 429 (límite de tasa) pese a la espera de discord.py
+MASIVO_CONCURRENCIA = int(os.getenv("MASIVO_CONCURRENCIA", "5"))
+MASIVO_REINTENTOS = int(os.getenv("MASIVO_REINTENTOS", "3"))
+
+def espera_limite(error, intento):
+    """Segundos a esperar tras un 429: `retry_after` si Discord lo indica, si no backoff exponencial"""
+    espera = getattr(error, "retry_after", None)
+    if espera is None:
+        cabeceras = getattr(getattr(error, "response", None), "headers", None) or {}
+        espera = cabeceras.get("Retry-After")
+    try:
+        return max(float(espera), 0.0)
+    except (TypeError, ValueError):
+        return float(2 ** intento)
+
+async def con_reintentos(llamada, *args, **kwargs):
+    """Ejecuta una llamada a la API reintentándola si Discord responde 429.
+
+    Hasta MASIVO_REINTENTOS veces, esperando lo que pide `retry_after`. Los
+    demás errores se propagan sin reintentar.
+    """
+    for intento in range(MASIVO_REINTENTOS + 1):
+        try:
+            return await llamada(*args, **kwargs)
+        except (discord.HTTPException, discord.RateLimited) as e:
+            limitado = isinstance(e, discord.RateLimited) or e.status == 429
+            if not limitado or intento == MASIVO_REINTENTOS:
+                raise
+            await asyncio.sleep(espera_limite(e, intento))
+
+def separar_objetivos(ctx, members, verbo):
+    """Valida una vez cada objetivo de un comando en grupo.
+
+    Devuelve (válidos, rechazados); los rechazados son pares (miembro, motivo).
+    Los miembros repetidos cuentan una sola vez.
+    """
+    validos, rechazados = [], []
+    for member in {member.id: member for member in members}.values():
+        motivo = f"No se puede {verbo} a un bot." if member.bot else validar_objetivo(ctx, member, verbo)
+        if motivo:
+            rechazados.append((member, motivo))
+        else:
+            validos.append(member)
+    return validos, rechazados
+
+def resumen_objetivos(aplicados, rechazados, extra=None):
+    """Texto del resumen de un comando en grupo (recortado a lo que cabe en un embed)"""
+    lineas = [f"✅ {member.mention}" + (f" · {extra[member.id]}" if extra and member.id in extra else "")
+              for member in aplicados]
+    lineas += [f"❌ {member.mention} · {motivo}" for member, motivo in rechazados]
+    texto = ""
+    for i, linea in enumerate(lineas):
+        if len(texto) + len(linea) + 1 > 3800:
+            texto += f"… y {len(lineas) - i} más\n"
+            break
+        texto += linea + "\n"
+    return texto
+
+@bot.command(name="masswarn")
+async def masswarn_command(ctx, members: commands.Greedy[discord.Member], *, reason: str = "No se especificó razón"):
+    """Da un warn a varios usuarios a la vez"""
     if not tiene_permisos_moderacion(ctx.author):
         await ctx.send(embed=create_embed(
             "❌ Permisos Insuficientes",
@@ -827,50 +3983,128 @@ async def unmute_command(ctx, member: discord.Member = None):
         ))
         return
     
-    if member is None:
+    if not members:
         await ctx.send(embed=create_embed(
-            "❌ Usuario requerido",
-            f"Debes mencionar a un usuario.\nUso: `{ctx.prefix}unmute @usuario`",
+            "❌ Usuarios requeridos",
+            f"Uso correcto: `{ctx.prefix}masswarn @usuario1 @usuario2 ... [razón]`",
             discord.Color.red()
         ))
         return
     
-    if not member.is_timed_out():
+    validos, rechazados = separar_objetivos(ctx, members, "advertir")
+    warns = {}
+    if validos:
+        # Los locks se toman en orden de ID para no bloquearse con otro comando en grupo
+        async with contextlib.AsyncExitStack() as pila:
+            for member in sorted(validos, key=lambda member: member.id):
+                await pila.enter_async_context(lock_warns(member.id, ctx.guild.id))
+            
+            acciones = [
+                {
+                    "user_id": member.id, "guild_id": ctx.guild.id, "tipo": "warn",
+                    "razon": reason, "moderator_id": ctx.author.id,
+                    "efectos": [efecto_dm(member, "warn", reason, moderator=ctx.author)]
+                }
+                for member in validos
+            ]
+            # Un único log para todo el grupo
+            acciones[0]["efectos"].append(efecto_log(
+                "Warn Masivo", None, ctx.author, reason, discord.Color.orange(),
+                extra_fields={"👥 Usuarios": ", ".join(member.mention for member in validos)}
+            ))
+            await registrar_acciones(acciones)
+            
+            for member in validos:
+                try:
+                    warns[member.id] = await contar_warns(member.id, ctx.guild.id)
+                except BaseDatosNoDisponible:
+                    pass
+    
+    extra = {user_id: f"{total}/3 warns" for user_id, total in warns.items()}
+    embed = create_embed(
+        f"⚠️ Warn Masivo ({len(validos)}/{len(validos) + len(rechazados)})",
+        f"**Razón:** {reason}\n\n" + resumen_objetivos(validos, rechazados, extra),
+        discord.Color.orange()
+    )
+    await ctx.send(embed=marcar_obsoleto(embed))
+    
+    alcanzados = [member for member in validos if warns.get(member.id, 0) >= 3]
+    if alcanzados:
+        await asyncio.gather(*(check_3_warns(member, ctx.author) for member in alcanzados))
+
+@bot.command(name="massmute")
+async def massmute_command(ctx, members: commands.Greedy[discord.Member], tiempo: str = None, *, reason="Sin razón"):
+    """Silencia a varios usuarios a la vez"""
+    if not tiene_permisos_moderacion(ctx.author):
         await ctx.send(embed=create_embed(
-            "ℹ️ Información",
-            f"{member.mention} no está silenciado.",
-            discord.Color.blue()
+            "❌ Permisos Insuficientes",
+            "Necesitas permisos de moderación para usar este comando.",
+            discord.Color.red()
         ))
         return
     
-    try:
-        await member.timeout(None, reason="Unmute manual")
-        
-        registrar_accion(
-            member.id, ctx.guild.id, "unmute",
-            "Unmute manual", ctx.author.id
-        )
-        
-        await send_log_detailed(
-            "Usuario Desilenciado",
-            member, ctx.author, "Unmute manual",
-            discord.Color.green()
-        )
-        
-        # Notificar al usuario por DM
-        await notify_user_dm(member, "unmute", "Tu silencio ha sido removido", moderator=ctx.author)
-        
+    seconds = parse_time(tiempo) if tiempo else None
+    if not members or not seconds:
         await ctx.send(embed=create_embed(
-            "✅ Unmute Aplicado",
-            f"{member.mention} ha sido desilenciado.",
-            discord.Color.green()
+            "❌ Argumentos faltantes",
+            f"Uso correcto: `{ctx.prefix}massmute @usuario1 @usuario2 ... <tiempo> [razón]`\n"
+            "Formatos: `1d` (días), `2h` (horas), `30m` (minutos), `60s` (segundos)",
+            discord.Color.red()
         ))
-    except Exception as e:
+        return
+    
+    if seconds > 2419200:  # 28 días en segundos
         await ctx.send(embed=create_embed(
             "❌ Error",
-            f"No se pudo desilenciar al usuario: {str(e)}",
+            "El tiempo máximo de silencio es de 28 días.",
             discord.Color.red()
         ))
+        return
+    
+    validos, rechazados = separar_objetivos(ctx, members, "silenciar")
+    semaforo = asyncio.Semaphore(MASIVO_CONCURRENCIA)
+    
+    async def silenciar(member):
+        async with semaforo:
+            try:
+                await con_reintentos(member.timeout, timedelta(seconds=seconds), reason=reason)
+                return None
+            except discord.Forbidden:
+                return "Sin permisos para silenciarlo"
+            except discord.RateLimited:
+                return "Límite de tasa de Discord"
+            except discord.HTTPException as e:
+                return f"Error de Discord: {e.status}"
+    
+    aplicados = []
+    async with ctx.typing():
+        errores = await asyncio.gather(*(silenciar(member) for member in validos))
+        for member, error in zip(validos, errores):
+            if error:
+                rechazados.append((member, error))
+            else:
+                aplicados.append(member)
+        
+        if aplicados:
+            acciones = [
+                {
+                    "user_id": member.id, "guild_id": ctx.guild.id, "tipo": "mute",
+                    "razon": reason, "moderator_id": ctx.author.id, "duracion": tiempo,
+                    "efectos": [efecto_dm(member, "mute", reason, tiempo, ctx.author)]
+                }
+                for member in aplicados
+            ]
+            acciones[0]["efectos"].append(efecto_log(
+                "Silencio Masivo", None, ctx.author, reason, discord.Color.dark_gray(), tiempo,
+                extra_fields={"👥 Usuarios": ", ".join(member.mention for member in aplicados)}
+            ))
+            await registrar_acciones(acciones)
+    
+    await ctx.send(embed=create_embed(
+        f"🔇 Silencio Masivo ({len(aplicados)}/{len(aplicados) + len(rechazados)})",
+        f"**Duración:** {tiempo}\n**Razón:** {reason}\n\n" + resumen_objetivos(aplicados, rechazados),
+        discord.Color.dark_gray()
+    ))
 
 @bot.command(name="checkwarns")
 async def checkwarns_command(ctx, member: discord.Member = None):
@@ -885,7 +4119,7 @@ async def checkwarns_command(ctx, member: discord.Member = None):
         return
     
     target = member or ctx.author
-    warns = contar_warns(target.id, ctx.guild.id)
+    warns = await contar_warns(target.id, ctx.guild.id)
     
     # Determinar color según número de warns
     if warns >= 3:
@@ -909,7 +4143,8 @@ async def checkwarns_command(ctx, member: discord.Member = None):
     
     if warns > 0:
         # Obtener últimos warns
-        warns_acciones = obtener_acciones_por_tipo(target.id, ctx.guild.id, "warn")
+        perfil = await obtener_perfil(target.id, ctx.guild.id, ultimos_warns=3)
+        warns_acciones = perfil["ultimos_warns"]
         
         if warns_acciones:
             ultimos_text = ""
@@ -935,7 +4170,116 @@ async def checkwarns_command(ctx, member: discord.Member = None):
     
     embed.set_footer(text=f"Solicitado por {ctx.author}", icon_url=ctx.author.display_avatar.url)
     
-    await ctx.send(embed=embed)
+    await ctx.send(embed=marcar_obsoleto(embed))
+
+@bot.command(name="exportar")
+async def exportar_command(ctx, objetivo: typing.Union[discord.Member, str] = None,
+                           desde: str = None, hasta: str = None, formato: str = "csv"):
+    """Exporta el historial de un usuario o de todo el servidor a un fichero"""
+    # Verificar permisos
+    if not tiene_permisos_moderacion(ctx.author):
+        await ctx.send(embed=create_embed(
+            "❌ Permisos Insuficientes",
+            "Necesitas permisos de moderación para usar este comando.",
+            discord.Color.red()
+        ))
+        return
+    
+    uso = f"Uso: `{ctx.prefix}exportar @usuario|servidor [desde AAAA-MM-DD] [hasta AAAA-MM-DD] [csv|jsonl]`"
+    if isinstance(objetivo, discord.Member):
+        user_id, nombre = objetivo.id, objetivo.name
+    elif objetivo and objetivo.lower() in ("servidor", "guild"):
+        user_id, nombre = None, ctx.guild.name
+    else:
+        await ctx.send(embed=create_embed("❌ Objetivo requerido", uso, discord.Color.red()))
+        return
+    
+    try:
+        fecha_desde = datetime.strptime(desde, "%Y-%m-%d") if desde else None
+        # `hasta` incluye el día indicado
+        fecha_hasta = datetime.strptime(hasta, "%Y-%m-%d") + timedelta(days=1) if hasta else None
+    except ValueError:
+        await ctx.send(embed=create_embed("❌ Fecha inválida", uso, discord.Color.red()))
+        return
+    
+    formato = formato.lower()
+    if formato not in ("csv", "jsonl"):
+        await ctx.send(embed=create_embed("❌ Formato inválido", uso, discord.Color.red()))
+        return
+    
+    async with ctx.typing():
+        ruta, filas = await exportar_acciones(ctx.guild.id, user_id, fecha_desde, fecha_hasta, formato)
+        try:
+            if filas == 0:
+                await ctx.send(embed=create_embed(
+                    "📄 Sin resultados",
+                    "No hay acciones registradas para ese objetivo y rango de fechas.",
+                    discord.Color.blue()
+                ))
+                return
+            
+            tamano = os.path.getsize(ruta)
+            if tamano > ctx.guild.filesize_limit:
+                await ctx.send(embed=create_embed(
+                    "❌ Exportación demasiado grande",
+                    f"El fichero ocupa {tamano / 1024 / 1024:.1f} MB y el límite del servidor es "
+                    f"{ctx.guild.filesize_limit / 1024 / 1024:.0f} MB.\n"
+                    "Acota el rango de fechas e inténtalo de nuevo.",
+                    discord.Color.red()
+                ))
+                return
+            
+            rango = f"{desde or 'inicio'} → {hasta or 'hoy'}"
+            nombre_fichero = f"acciones_{re.sub(r'[^A-Za-z0-9_-]', '_', nombre)}_{datetime.utcnow():%Y%m%d}.{formato}.gz"
+            await ctx.send(
+                embed=create_embed(
+                    "📦 Exportación lista",
+                    f"**Objetivo:** {nombre}\n**Rango:** {rango}\n**Acciones:** {filas}",
+                    discord.Color.green()
+                ),
+                file=discord.File(ruta, filename=nombre_fichero)
+            )
+        finally:
+            os.remove(ruta)
+
+@bot.command(name="auditoria")
+async def auditoria_command(ctx, dias: int = 45):
+    """Importa al historial las sanciones hechas fuera del bot (registro de auditoría)"""
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send(embed=create_embed(
+            "❌ Permisos Insuficientes",
+            "Necesitas el permiso **Administrador** para usar este comando.",
+            discord.Color.red()
+        ))
+        return
+    
+    if not ctx.guild.me.guild_permissions.view_audit_log:
+        await ctx.send(embed=create_embed(
+            "❌ Permisos del bot",
+            "El bot necesita el permiso **Ver registro de auditoría**.",
+            discord.Color.red()
+        ))
+        return
+    
+    if dias < 1:
+        await ctx.send(embed=create_embed(
+            "❌ Días inválidos",
+            f"Uso: `{ctx.prefix}auditoria [días]` (por defecto 45)",
+            discord.Color.red()
+        ))
+        return
+    
+    inicio = time.perf_counter()
+    async with ctx.typing():
+        revisadas, importadas = await importar_auditoria(ctx.guild, discord.utils.utcnow() - timedelta(days=dias))
+    
+    await ctx.send(embed=create_embed(
+        "✅ Registro de auditoría importado",
+        f"**Entradas revisadas:** {revisadas}\n"
+        f"**Acciones nuevas en el historial:** {importadas}\n"
+        f"**Tiempo:** {time.perf_counter() - inicio:.1f}s",
+        discord.Color.green()
+    ))
 
 # =========================================================
 # COMANDOS DE GESTIÓN DE ROLES (PROMOTE/DEMOTE)
@@ -1022,22 +4366,25 @@ async def promote_command(ctx, member: discord.Member = None, old_role: discord.
         await member.remove_roles(old_role)
         await member.add_roles(new_role)
         
-        # Registrar en base de datos
+        # Registrar en base de datos (log y DM se entregan vía outbox)
         razon_completa = f"{reason} (De {old_role.name} a {new_role.name})"
-        registrar_accion(
+        await registrar_accion(
             member.id, ctx.guild.id, "promote",
-            razon_completa, ctx.author.id
-        )
-        
-        # Enviar log detallado
-        await send_log_detailed(
-            "Promoción de Usuario",
-            member, ctx.author, razon_completa,
-            discord.Color.gold(),
-            extra_fields={
-                "Rango Anterior": old_role.name,
-                "Nuevo Rango": new_role.name
-            }
+            razon_completa, ctx.author.id,
+            efectos=[
+                efecto_log(
+                    "Promoción de Usuario",
+                    member, ctx.author, razon_completa,
+                    discord.Color.gold(),
+                    extra_fields={
+                        "Rango Anterior": old_role.name,
+                        "Nuevo Rango": new_role.name
+                    }
+                ),
+                efecto_dm(member, "promote",
+                          f"Has sido promovido de {old_role.name} a {new_role.name}\nRazón: {reason}",
+                          moderator=ctx.author)
+            ]
         )
         
         # Enviar al canal específico si está configurado
@@ -1059,11 +4406,6 @@ async def promote_command(ctx, member: discord.Member = None, old_role: discord.
                 
                 await channel.send(embed=promo_embed)
         
-        # Notificar al usuario por DM
-        await notify_user_dm(member, "promote", 
-                           f"Has sido promovido de {old_role.name} a {new_role.name}\nRazón: {reason}", 
-                           moderator=ctx.author)
-        
         # Confirmación en el canal
         await ctx.send(embed=create_embed(
             "✅ Promoción Exitosa",
@@ -1169,22 +4511,25 @@ async def demote_command(ctx, member: discord.Member = None, old_role: discord.R
         await member.remove_roles(old_role)
         await member.add_roles(new_role)
         
-        # Registrar en base de datos
+        # Registrar en base de datos (log y DM se entregan vía outbox)
         razon_completa = f"{reason} (De {old_role.name} a {new_role.name})"
-        registrar_accion(
+        await registrar_accion(
             member.id, ctx.guild.id, "demote",
-            razon_completa, ctx.author.id
-        )
-        
-        # Enviar log detallado
-        await send_log_detailed(
-            "Degradación de Usuario",
-            member, ctx.author, razon_completa,
-            discord.Color.dark_gray(),
-            extra_fields={
-                "Rango Anterior": old_role.name,
-                "Nuevo Rango": new_role.name
-            }
+            razon_completa, ctx.author.id,
+            efectos=[
+                efecto_log(
+                    "Degradación de Usuario",
+                    member, ctx.author, razon_completa,
+                    discord.Color.dark_gray(),
+                    extra_fields={
+                        "Rango Anterior": old_role.name,
+                        "Nuevo Rango": new_role.name
+                    }
+                ),
+                efecto_dm(member, "demote",
+                          f"Has sido degradado de {old_role.name} a {new_role.name}\nRazón: {reason}",
+                          moderator=ctx.author)
+            ]
         )
         
         # Enviar al canal específico si está configurado
@@ -1206,11 +4551,6 @@ async def demote_command(ctx, member: discord.Member = None, old_role: discord.R
                 
                 await channel.send(embed=demo_embed)
         
-        # Notificar al usuario por DM
-        await notify_user_dm(member, "demote", 
-                           f"Has sido degradado de {old_role.name} a {new_role.name}\nRazón: {reason}", 
-                           moderator=ctx.author)
-        
         # Confirmación en el canal
         await ctx.send(embed=create_embed(
             "✅ Degradación Exitosa",
@@ -1245,22 +4585,7 @@ async def información_command(ctx):
     guild = ctx.guild
     
     # Estadísticas de moderación
-    total_warns = 0
-    total_acciones = 0
-    with engine.begin() as conn:
-        # Contar warns totales
-        result = conn.execute(
-            text("SELECT SUM(total_warns) FROM user_warns WHERE guild_id = :guild_id"),
-            {"guild_id": guild.id}
-        ).fetchone()
-        total_warns = result[0] or 0
-        
-        # Contar acciones totales
-        result = conn.execute(
-            text("SELECT COUNT(*) FROM acciones WHERE guild_id = :guild_id"),
-            {"guild_id": guild.id}
-        ).fetchone()
-        total_acciones = result[0] or 0
+    total_warns, total_acciones = await obtener_estadisticas_guild(guild.id)
     
     embed = discord.Embed(
         title=f"🌍 {guild.name}",
@@ -1289,7 +4614,8 @@ async def información_command(ctx):
     # Estadísticas del bot
     embed.add_field(name="🤖 Estadísticas del Bot", 
                    value=f"**Comandos:** {len(bot.commands)}\n"
-                         f"**Latencia:** {round(bot.latency * 1000)}ms", 
+                         f"**Latencia:** {round(bot.latency * 1000)}ms\n"
+                         f"**Caché de warns:** {cache_warns.tasa_aciertos:.0%} aciertos", 
                    inline=True)
     
     # Estadísticas de moderación
@@ -1322,7 +4648,36 @@ async def información_command(ctx):
     embed.set_footer(text=f"Solicitado por {ctx.author.display_name}", 
                     icon_url=ctx.author.display_avatar.url)
     
-    await ctx.send(embed=embed)
+    await ctx.send(embed=marcar_obsoleto(embed))
+
+@bot.command(name="recalcular")
+async def recalcular_command(ctx):
+    """Recalcula las estadísticas de moderación desde la base de datos"""
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send(embed=create_embed(
+            "❌ Permisos Insuficientes",
+            "Necesitas el permiso **Administrador** para usar este comando.",
+            discord.Color.red()
+        ))
+        return
+    
+    try:
+        await reconstruir_estadisticas()
+    except Exception as e:
+        await ctx.send(embed=create_embed(
+            "❌ Error",
+            f"No se pudieron recalcular las estadísticas: {str(e)}",
+            discord.Color.red()
+        ))
+        return
+    
+    total_warns, total_acciones = await obtener_estadisticas_guild(ctx.guild.id)
+    await ctx.send(embed=create_embed(
+        "✅ Estadísticas Recalculadas",
+        f"**Warns totales:** {total_warns}\n"
+        f"**Acciones registradas:** {total_acciones}",
+        discord.Color.green()
+    ))
 
 @bot.command(name="ping")
 async def ping_command(ctx):
@@ -1394,7 +4749,15 @@ async def help_command(ctx, command_name: str = None):
             "mute": f"`{ctx.prefix}mute @usuario 1h Spam en chat`",
             "promote": f"`{ctx.prefix}promote @usuario @Novato @Experto Buen desempeño`",
             "historial": f"`{ctx.prefix}historial @usuario`",
-            "checkwarns": f"`{ctx.prefix}checkwarns @usuario`"
+            "checkwarns": f"`{ctx.prefix}checkwarns @usuario`",
+            "exportar": f"`{ctx.prefix}exportar @usuario 2025-01-01 2025-06-30`",
+            "auditoria": f"`{ctx.prefix}auditoria 30`",
+            "ban": f"`{ctx.prefix}ban @usuario Raid`",
+            "kick": f"`{ctx.prefix}kick @usuario Spam`",
+            "unban": f"`{ctx.prefix}unban 123456789012345678 Apelación aceptada`",
+            "massban": f"`{ctx.prefix}massban 123456789012345678 234567890123456789 Raid`",
+            "masswarn": f"`{ctx.prefix}masswarn @usuario1 @usuario2 Spam coordinado`",
+            "massmute": f"`{ctx.prefix}massmute @usuario1 @usuario2 1h Spam coordinado`"
         }
         
         if cmd.name in examples:
@@ -1408,10 +4771,16 @@ async def help_command(ctx, command_name: str = None):
         
         # Permisos requeridos
         permisos_text = "Cualquier miembro"
-        if cmd.name in ["warn", "unwarn", "mute", "unmute", "checkwarns", "historial"]:
+        if cmd.name in ["warn", "unwarn", "mute", "unmute", "checkwarns", "historial", "exportar", "masswarn", "massmute"]:
             permisos_text = "Moderación (Kick/Ban/Manage Messages)"
+        elif cmd.name in ["ban", "unban", "massban"]:
+            permisos_text = "Banear miembros"
+        elif cmd.name in ["kick"]:
+            permisos_text = "Expulsar miembros"
         elif cmd.name in ["promote", "demote"]:
             permisos_text = "Gestionar Roles"
+        elif cmd.name in ["recalcular", "auditoria"]:
+            permisos_text = "Administrador"
         
         embed.add_field(name="🛡️ Permisos requeridos", value=permisos_text, inline=True)
         
@@ -1420,7 +4789,13 @@ async def help_command(ctx, command_name: str = None):
             "mute": "• Formatos de tiempo: `s` (segundos), `m` (minutos), `h` (horas), `d` (días)\n• Máximo: 28 días",
             "warn": "• Sistema de 3 warns: Notificación automática a moderadores\n• Los warns se almacenan en base de datos",
             "promote": "• Requiere mencionar ambos roles\n• Verifica jerarquía de roles automáticamente",
-            "historial": "• Muestra las últimas 10 acciones\n• Incluye todas las sanciones y cambios de rol"
+            "historial": "• Historial completo paginado con botones (5 acciones por página)\n• Incluye todas las sanciones y cambios de rol",
+            "exportar": "• `servidor` exporta todas las acciones del servidor\n• Fechas en formato `AAAA-MM-DD` (ambas incluidas)\n• Formatos: `csv` (por defecto) o `jsonl`, comprimidos con gzip",
+            "auditoria": "• Importa bans, kicks, timeouts y cambios de rol hechos desde Discord\n• Las nuevas se registran solas; repetir la importación no duplica nada\n• Discord conserva el registro de auditoría 45 días",
+            "ban": "• Acepta una mención o una ID (también de usuarios que ya no están)\n• El usuario recibe un DM antes del ban",
+            "massban": f"• IDs separadas por espacios o en un `.txt` adjunto (una por línea)\n• Máximo {MASSBAN_MAX} IDs; se banean en lotes de {MASSBAN_LOTE}\n• Se omiten las IDs con rol igual o superior al tuyo o al del bot",
+            "masswarn": "• Menciona a todos los usuarios antes de la razón\n• Un solo log y un solo resumen para todo el grupo",
+            "massmute": "• Menciona a todos los usuarios antes del tiempo\n• Máximo: 28 días\n• Un solo log y un solo resumen para todo el grupo"
         }
         
         if cmd.name in notas:
@@ -1451,8 +4826,15 @@ async def help_command(ctx, command_name: str = None):
             ("unwarn", "Remueve warns de un usuario"),
             ("mute", "Silencia a un usuario temporalmente"),
             ("unmute", "Remueve el silencio de un usuario"),
+            ("kick", "Expulsa a un usuario del servidor"),
+            ("ban", "Banea a un usuario del servidor"),
+            ("unban", "Levanta el ban de un usuario"),
+            ("massban", "Banea una lista de IDs de una vez"),
+            ("masswarn", "Da un warn a varios usuarios a la vez"),
+            ("massmute", "Silencia a varios usuarios a la vez"),
             ("checkwarns", "Revisa los warns de un usuario"),
-            ("historial", "Muestra historial completo de un usuario")
+            ("historial", "Muestra historial completo de un usuario"),
+            ("exportar", "Exporta el historial de un usuario o del servidor a un fichero")
         ],
         "🎭 **Gestión de Roles**": [
             ("promote", "Promueve a un usuario a un rango superior"),
@@ -1460,7 +4842,9 @@ async def help_command(ctx, command_name: str = None):
         ],
         "📊 **Información**": [
             ("información", "Muestra información del servidor"),
-            ("ping", "Muestra la latencia del bot")
+            ("ping", "Muestra la latencia del bot"),
+            ("recalcular", "Recalcula las estadísticas de moderación (admin)"),
+            ("auditoria", "Importa sanciones del registro de auditoría (admin)")
         ],
         "❓ **Ayuda**": [
             ("help", "Muestra este mensaje de ayuda")
@@ -1563,7 +4947,14 @@ async def on_command_error(ctx, error):
         await ctx.send(embed=embed)
     elif isinstance(error, commands.CommandInvokeError):
         original = getattr(error, 'original', error)
-        if isinstance(original, discord.Forbidden):
+        if isinstance(original, BaseDatosNoDisponible):
+            await ctx.send(embed=create_embed(
+                "⚠️ Base de datos no disponible",
+                "La base de datos no responde en este momento y no hay datos en caché para esta consulta.\n"
+                "Las acciones nuevas se siguen registrando y se guardarán cuando vuelva.",
+                discord.Color.orange()
+            ))
+        elif isinstance(original, discord.Forbidden):
             await ctx.send(embed=create_embed(
                 "❌ Error de Permisos del Bot",
                 "No tengo los permisos necesarios para ejecutar esta acción.\n"
@@ -1597,6 +4988,15 @@ if __name__ == "__main__":
     print(f"   • Canal de logs: {LOG_CHANNEL_ID}")
     print(f"   • Canal de promociones: {PROMOTE_CHANNEL if PROMOTE_CHANNEL else 'No configurado'}")
     print(f"   • Canal de degradaciones: {DEMOTE_CHANNEL if DEMOTE_CHANNEL else 'No configurado'}")
+    if engine.dialect.name == "mysql":
+        print(f"   • Pool de BD: {DB_POOL_SIZE} (+{DB_MAX_OVERFLOW}), timeout {DB_POOL_TIMEOUT}s, reciclado {DB_POOL_RECYCLE}s")
+    
+    # El esquema se migra una sola vez, antes de conectar al gateway
+    try:
+        aplicar_migraciones()
+    except Exception as e:
+        print(f"❌ Error al migrar la base de datos: {e}")
+        raise SystemExit(1)
     
     try:
         bot.run(TOKEN)
@@ -1604,3 +5004,9 @@ if __name__ == "__main__":
         print("❌ Error: Token inválido. Verifica tu token de Discord.")
     except Exception as e:
         print(f"❌ Error al iniciar el bot: {e}")
+    finally:
+        # Volcado síncrono de las acciones que quedaron en la cola
+        pendientes = len(buffer_acciones)
+        if pendientes:
+            print(f"💾 Guardando {pendientes} acciones pendientes...")
+            buffer_acciones.vaciar_sync()
@@ -0,0 +1,51 @@
+"""Entorno de las pruebas: importa main.py contra un SQLite temporal.
+
+Las variables se fijan antes de importar main (que las lee al cargarse) y
+pisan las del entorno o del .env, para no tocar nunca una base de datos real.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPORAL = tempfile.mkdtemp(prefix="pruebas_")
+
+os.environ.update({
+    "TOKEN": "pruebas",
+    "GUILD_ID": "1",
+    "LOG_CHANNEL_ID": "2",
+    "DB_BACKEND": "sqlite",
+    "SQLITE_PATH": os.path.join(TEMPORAL, "pruebas.db"),
+    "DB_JOURNAL_PATH": os.path.join(TEMPORAL, "acciones_pendientes.jsonl"),
+})
+sys.path.insert(0, RAIZ)
+
+import main  # noqa: E402
+
+main.aplicar_migraciones()
+
+@pytest.fixture
+def db():
+    """Base de datos vacía y estado en memoria (cola, cachés, circuito) reiniciado"""
+    with main.engine.begin() as conn:
+        for tabla in reversed(main.metadata.sorted_tables):
+            conn.execute(main.delete(tabla))
+    
+    buffer = main.buffer_acciones
+    buffer.filas, buffer.warns, buffer.efectos, buffer.warns_en_vuelo = [], {}, [], {}
+    buffer.vaciado_programado = False
+    buffer.ultimo_volcado_ok = True
+    if os.path.exists(main.diario_local.ruta):
+        main.diario_local.limpiar()
+    
+    main.cache_warns.datos.clear()
+    main.cache_warns.guilds_completos.clear()
+    main.cache_warns.cargado = False
+    main.estadisticas_guilds.datos.clear()
+    main.lecturas_cache.datos.clear()
+    main.circuito_db.estado = "cerrado"
+    main.circuito_db.fallos = 0
+    main.escrituras_recientes.clear()
+    return main
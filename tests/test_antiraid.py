@@ -0,0 +1,103 @@
+"""Reproducción de grabaciones de entradas contra DetectorRaids.
+
+Una grabación es una lista de entradas (instante, guild_id, user_id, edad de
+la cuenta en segundos) como las que llegan a on_member_join; el detector no
+lee el reloj, así que se reproducen tal cual y en milisegundos.
+"""
+import random
+
+import main
+
+HORA, DIA = 3600, 86400
+
+def detector():
+    return main.DetectorRaids(umbral=10, ventana=60, edad_maxima=7 * DIA, bloqueo=600)
+
+def reproducir(detector, grabacion):
+    """Devuelve las decisiones del detector como [(instante, decisión)]"""
+    decisiones = []
+    for instante, guild_id, user_id, edad in grabacion:
+        decision = detector.registrar(guild_id, user_id, edad, instante)
+        if decision is not None:
+            decisiones.append((instante, decision))
+    return decisiones
+
+def trafico_normal(desde, hasta, guild_id=1, cada=20, semilla=1):
+    """Entradas legítimas espaciadas, con cuentas de edades variadas"""
+    azar = random.Random(semilla)
+    return [
+        (t, guild_id, 10_000 + i, azar.choice((2 * HORA, 3 * DIA, 400 * DIA)))
+        for i, t in enumerate(range(desde, hasta, cada))
+    ]
+
+def oleada(inicio, cuantas, guild_id=1, cada=0.5, primer_id=90_000, edad=600):
+    """Ráfaga de cuentas recién creadas"""
+    return [(inicio + i * cada, guild_id, primer_id + i, edad) for i in range(cuantas)]
+
+def test_trafico_normal_no_dispara():
+    assert reproducir(detector(), trafico_normal(0, 12 * HORA)) == []
+
+def test_oleada_detecta_y_bloquea():
+    raids = detector()
+    grabacion = trafico_normal(0, 2000) + oleada(2000, 30)
+    # Dos cuentas veteranas entran en plena oleada
+    grabacion += [(2001.2, 1, 5, 900 * DIA), (2008.1, 1, 6, 900 * DIA)]
+    grabacion.sort()
+    decisiones = reproducir(raids, grabacion)
+    
+    (instante, deteccion), *bloqueo = decisiones
+    assert deteccion["nuevo"]
+    assert deteccion["entradas"] == 10
+    # Las entradas previas de la ventana también son candidatas si son cuentas jóvenes
+    sancionables = [
+        user_id for t, _, user_id, edad in grabacion if instante - 60 < t <= instante and edad < 7 * DIA
+    ]
+    assert deteccion["objetivos"] == sancionables
+    assert 5 not in deteccion["objetivos"]
+    assert sum(deteccion["histograma"].values()) == 10
+    
+    # Durante el bloqueo cada cuenta joven se sanciona al entrar y las veteranas no
+    assert all(not decision["nuevo"] for _, decision in bloqueo)
+    objetivos_bloqueo = [decision["objetivos"][0] for _, decision in bloqueo]
+    assert 6 not in objetivos_bloqueo
+    # Entre la detección y el bloqueo se sanciona toda la oleada, y solo cuentas jóvenes
+    sancionados = deteccion["objetivos"] + objetivos_bloqueo
+    assert set(range(90_000, 90_030)) <= set(sancionados)
+    assert len(sancionados) == len(set(sancionados))
+    edades = {user_id: edad for _, _, user_id, edad in grabacion}
+    assert all(edades[user_id] < 7 * DIA for user_id in sancionados)
+    assert raids.finalizar_bloqueo(1) == len(objetivos_bloqueo)
+
+def test_ventana_caduca():
+    # Nueve entradas, un hueco mayor que la ventana y otras nueve: sin oleada
+    grabacion = oleada(0, 9, cada=1) + oleada(100, 9, cada=1, primer_id=95_000)
+    assert reproducir(detector(), grabacion) == []
+    # Las mismas 18 seguidas sí la forman
+    assert len(reproducir(detector(), oleada(0, 18, cada=1))) == 9
+
+def test_fin_del_bloqueo():
+    raids = detector()
+    primera = reproducir(raids, oleada(0, 10))
+    assert [decision["nuevo"] for _, decision in primera] == [True]
+    
+    # Pasado el bloqueo, una oleada nueva vuelve a detectarse como nueva
+    segunda = reproducir(raids, oleada(700, 10, primer_id=95_000))
+    assert [decision["nuevo"] for _, decision in segunda] == [True]
+    assert segunda[0][1]["objetivos"] == list(range(95_000, 95_010))
+    
+    # finalizar_bloqueo lo levanta antes de tiempo: sin él, esta entrada
+    # (aún dentro de los 600s) se sancionaría por llegar durante el bloqueo
+    assert raids.finalizar_bloqueo(1) == 0
+    assert reproducir(raids, oleada(800, 1, primer_id=99_000)) == []
+    assert raids.finalizar_bloqueo(2) == 0
+
+def test_servidores_independientes():
+    grabacion = sorted(oleada(0, 6, guild_id=1) + oleada(0.1, 6, guild_id=2, primer_id=95_000))
+    assert reproducir(detector(), grabacion) == []
+
+def test_histograma_por_edad():
+    edades = [60, 2 * HORA, 2 * DIA, 10 * DIA, 400 * DIA] * 2
+    grabacion = [(i, 1, 1000 + i, edad) for i, edad in enumerate(edades)]
+    (_, deteccion), = reproducir(detector(), grabacion)
+    assert deteccion["histograma"] == {"<1h": 2, "<1d": 2, "<7d": 2, "<30d": 2, "≥30d": 2}
+    assert deteccion["objetivos"] == [1000, 1001, 1002, 1005, 1006, 1007]
@@ -0,0 +1,70 @@
+"""DetectorSpam: inundaciones, menciones, mensajes repetidos y descarte de inactivos"""
+import main
+
+def detector():
+    return main.DetectorSpam(
+        mensajes=8, segundos=5, menciones=10, menciones_segundos=30,
+        repetidos=4, historial=8, inactividad=300
+    )
+
+def enviar(spam, mensajes, guild_id=1, user_id=100):
+    """Pasa (instante, menciones, huella) por el detector; devuelve los motivos"""
+    return [spam.registrar(guild_id, user_id, menciones, huella, instante) for instante, menciones, huella in mensajes]
+
+def test_ritmo_normal_no_es_spam():
+    spam = detector()
+    # Un mensaje por segundo durante diez minutos, con alguna mención
+    motivos = enviar(spam, [(t, t % 7 == 0, t % 50 + 1) for t in range(600)])
+    assert motivos == [None] * 600
+
+def test_inundacion():
+    spam = detector()
+    motivos = enviar(spam, [(0.01 * i, 0, i + 1) for i in range(9)])
+    assert motivos == [None] * 8 + ["Inundación de mensajes"]
+    # El estado se olvida tras la sanción
+    assert len(spam) == 0
+    assert enviar(spam, [(1.0, 0, 99)]) == [None]
+
+def test_los_cubos_se_rellenan():
+    spam = detector()
+    assert enviar(spam, [(0, 0, i + 1) for i in range(8)]) == [None] * 8
+    # 5 segundos después el cubo de mensajes vuelve a estar lleno
+    assert enviar(spam, [(5, 0, i + 10) for i in range(8)]) == [None] * 8
+
+def test_spam_de_menciones():
+    spam = detector()
+    assert enviar(spam, [(0, 6, 1), (1, 6, 2)]) == [None, "Spam de menciones"]
+    # A ritmo lento las menciones se recuperan
+    spam = detector()
+    assert enviar(spam, [(0, 6, 1), (20, 6, 2), (40, 6, 3)]) == [None] * 3
+
+def test_mensajes_repetidos():
+    spam = detector()
+    assert enviar(spam, [(2 * i, 0, 42) for i in range(4)]) == [None] * 3 + ["Mensajes repetidos"]
+    
+    # Una repetición que ya salió del anillo de 8 huellas no cuenta
+    spam = detector()
+    mensajes = [(2 * i, 0, 42) for i in range(3)] + [(6 + 2 * i, 0, i + 1) for i in range(8)] + [(30, 0, 42)]
+    assert enviar(spam, mensajes) == [None] * 12
+    
+    # Los mensajes sin texto (huella 0) no se comparan
+    spam = detector()
+    assert enviar(spam, [(2 * i, 0, 0) for i in range(6)]) == [None] * 6
+
+def test_usuarios_y_servidores_independientes():
+    spam = detector()
+    for user_id in range(20):
+        assert enviar(spam, [(0, 0, 7)] * 3, user_id=user_id) == [None] * 3
+    assert enviar(spam, [(0, 0, 7)] * 3, guild_id=2) == [None] * 3
+    assert len(spam) == 21
+
+def test_inactivos_se_descartan():
+    spam = detector()
+    for user_id in range(1000):
+        spam.registrar(1, user_id, 0, 1, user_id * 0.5)
+    # Solo quedan los que escribieron en los últimos 300 segundos
+    assert len(spam) == 601
+    assert (1, 0) not in spam.estados and (1, 999) in spam.estados
+    
+    spam.registrar(1, 5000, 0, 1, 10_000)
+    assert list(spam.estados) == [(1, 5000)]
@@ -0,0 +1,110 @@
+"""Importación del registro de auditoría (accion_desde_auditoria / importar_auditoria)"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import discord
+import pytest
+from sqlalchemy import select
+
+import main
+
+BOT, MODERADOR = 999, 7
+INICIO = datetime(2024, 3, 1, tzinfo=timezone.utc)
+GUILD = SimpleNamespace(id=1)
+ACCIONES = discord.AuditLogAction
+
+def entrada(entrada_id, action, user_id=MODERADOR, reason="motivo", before=None, after=None, target=100):
+    return SimpleNamespace(
+        id=entrada_id, action=action, user_id=user_id, reason=reason,
+        target=SimpleNamespace(id=target), guild=GUILD,
+        before=before or SimpleNamespace(), after=after or SimpleNamespace(),
+        created_at=INICIO + timedelta(minutes=entrada_id)
+    )
+
+class ServidorConAuditoria:
+    id = 1
+
+    def __init__(self, entradas):
+        self.entradas = entradas
+
+    async def audit_logs(self, limit=None, after=None, oldest_first=True):
+        for registro in self.entradas:
+            yield registro
+
+@pytest.fixture
+def bot_conectado(db, monkeypatch):
+    monkeypatch.setattr(type(main.bot), "user", property(lambda self: SimpleNamespace(id=BOT)))
+    return db
+
+def filas_acciones():
+    with main.engine.connect() as conn:
+        return conn.execute(
+            select(
+                main.tabla_acciones.c.idempotency_key, main.tabla_acciones.c.tipo,
+                main.tabla_acciones.c.user_id, main.tabla_acciones.c.moderator_id,
+                main.tabla_acciones.c.duracion, main.tabla_acciones.c.razon,
+                main.tabla_acciones.c.created_at
+            ).order_by(main.tabla_acciones.c.created_at)
+        ).fetchall()
+
+def test_traduce_cada_tipo_de_entrada(bot_conectado):
+    hasta = INICIO + timedelta(minutes=5, hours=2)
+    rol = SimpleNamespace(id=5, name="VIP")
+    casos = [
+        (entrada(1, ACCIONES.ban), "ban", None),
+        (entrada(2, ACCIONES.unban), "unban", None),
+        (entrada(3, ACCIONES.kick, reason=None), "kick", None),
+        (entrada(5, ACCIONES.member_update, after=SimpleNamespace(timed_out_until=hasta)), "mute", "2h"),
+        (entrada(6, ACCIONES.member_update, before=SimpleNamespace(timed_out_until=hasta)), "unmute", None),
+        (entrada(7, ACCIONES.member_role_update, after=SimpleNamespace(roles=[rol])), "rol", None),
+    ]
+    for registro, tipo, duracion in casos:
+        accion = main.accion_desde_auditoria(registro)
+        assert (accion["tipo"], accion["duracion"]) == (tipo, duracion)
+        assert accion["user_id"] == 100 and accion["guild_id"] == 1
+        assert accion["moderator_id"] == MODERADOR
+        assert accion["idempotency_key"] == f"{main.PREFIJO_AUDITORIA}{registro.id}"
+        assert accion["created_at"] == registro.created_at.replace(tzinfo=None)
+
+    assert main.accion_desde_auditoria(casos[2][0])["razon"] == "Sin razón especificada (acción fuera del bot)"
+    assert main.accion_desde_auditoria(casos[5][0])["razon"] == "+VIP · motivo"
+
+def test_ignora_lo_que_no_es_una_sancion(bot_conectado):
+    assert main.accion_desde_auditoria(entrada(1, ACCIONES.channel_create)) is None
+    # Un member_update sin cambios de timeout (p. ej. apodo) no es una sanción
+    assert main.accion_desde_auditoria(entrada(2, ACCIONES.member_update)) is None
+    assert main.accion_desde_auditoria(entrada(3, ACCIONES.member_role_update)) is None
+    # Las del propio bot ya se registraron al ejecutar el comando
+    assert main.accion_desde_auditoria(entrada(4, ACCIONES.ban, user_id=BOT)) is None
+
+def test_importar_dos_veces_no_duplica(bot_conectado, monkeypatch):
+    monkeypatch.setattr(main, "AUDITORIA_LOTE", 2)
+    entradas = [
+        entrada(1, ACCIONES.ban), entrada(2, ACCIONES.kick, target=101),
+        entrada(3, ACCIONES.ban, user_id=BOT, target=102), entrada(4, ACCIONES.channel_create),
+        entrada(5, ACCIONES.unban),
+    ]
+    guild = ServidorConAuditoria(entradas)
+
+    assert asyncio.run(main.importar_auditoria(guild, INICIO)) == (5, 3)
+    filas = filas_acciones()
+    assert [(clave, tipo, user_id) for clave, tipo, user_id, *_ in filas] == [
+        ("audit:1", "ban", 100), ("audit:2", "kick", 101), ("audit:5", "unban", 100)
+    ]
+    assert all(moderador == MODERADOR for *_, moderador, _, _, _ in filas)
+
+    assert asyncio.run(main.importar_auditoria(guild, INICIO)) == (5, 0)
+    assert filas_acciones() == filas
+
+def test_evento_y_backfill_de_la_misma_entrada(bot_conectado):
+    registro = entrada(1, ACCIONES.kick)
+    # Llega primero por el evento en vivo...
+    bot_conectado.buffer_acciones.agregar(**main.accion_desde_auditoria(registro))
+    bot_conectado.buffer_acciones.vaciar_sync()
+    # ...y luego por el backfill (y otra vez por el evento, ya escrita)
+    assert asyncio.run(main.importar_auditoria(ServidorConAuditoria([registro]), INICIO)) == (1, 0)
+    bot_conectado.buffer_acciones.agregar(**main.accion_desde_auditoria(registro))
+    bot_conectado.buffer_acciones.vaciar_sync()
+
+    assert len(filas_acciones()) == 1
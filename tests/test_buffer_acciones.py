@@ -0,0 +1,89 @@
+"""Cola write-behind de acciones (BufferAcciones)"""
+import os
+
+from sqlalchemy import exc, func, select
+
+import main
+
+def contar(tabla):
+    with main.engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(tabla)).scalar()
+
+def test_volcado_agrupa_filas_y_warns(db):
+    for i in range(10):
+        db.buffer_acciones.agregar(100 + i % 2, 1, "warn", f"razón {i}", 7)
+    db.buffer_acciones.agregar(100, 1, "kick", "razón", 7)
+    
+    assert len(db.buffer_acciones) == 11
+    assert db.buffer_acciones.warns == {(100, 1): 5, (101, 1): 5}
+    assert contar(db.tabla_acciones) == 0
+    
+    assert db.buffer_acciones.vaciar_sync() == 11
+    assert len(db.buffer_acciones) == 0
+    assert contar(db.tabla_acciones) == 11
+    assert contar(db.tabla_user_warns) == 2
+    assert db.contar_warns_sync(100, 1) == 5
+
+def test_contar_warns_incluye_la_cola(db):
+    db.buffer_acciones.agregar(100, 1, "warn", "razón", 7)
+    db.buffer_acciones.vaciar_sync()
+    db.buffer_acciones.agregar(100, 1, "warn", "razón", 7)
+    
+    assert db.contar_warns_sync(100, 1) == 2
+    assert db.buffer_acciones.warns_pendientes(100, 1) == 1
+
+def test_fallo_de_la_base_de_datos_pasa_al_diario(db, monkeypatch):
+    db.buffer_acciones.agregar(100, 1, "warn", "razón", 7)
+    
+    def escribir_lote(conn, filas, warns):
+        raise exc.OperationalError("INSERT", {}, Exception("sin conexión"))
+    
+    monkeypatch.setattr(db.buffer_acciones, "_escribir_lote", escribir_lote)
+    assert db.buffer_acciones.vaciar_sync() == 0
+    assert db.diario_local.warns == {(100, 1): 1}
+    assert db.contar_warns_sync(100, 1) == 1
+    
+    monkeypatch.undo()
+    db.buffer_acciones.vaciar_sync()
+    assert not db.diario_local
+    assert contar(db.tabla_acciones) == 1
+    assert db.contar_warns_sync(100, 1) == 1
+
+def test_reenvio_a_medias_no_cuenta_dos_veces(db, monkeypatch):
+    def sin_conexion(conn, filas, warns):
+        raise exc.OperationalError("INSERT", {}, Exception("sin conexión"))
+    
+    # Dos lotes en el diario: dos warns y luego uno
+    monkeypatch.setattr(db.buffer_acciones, "_escribir_lote", sin_conexion)
+    for warns in (2, 1):
+        for _ in range(warns):
+            db.buffer_acciones.agregar(100, 1, "warn", "razón", 7)
+        db.buffer_acciones.vaciar_sync()
+    assert db.diario_local.lotes == 2
+    monkeypatch.undo()
+    
+    # Vuelve la base de datos, pero el segundo lote falla al reenviarse
+    escribir_lote = db.buffer_acciones._escribir_lote
+    llamadas = []
+    
+    def falla_el_segundo(conn, filas, warns):
+        llamadas.append(len(filas))
+        if len(llamadas) == 2:
+            sin_conexion(conn, filas, warns)
+        escribir_lote(conn, filas, warns)
+    
+    monkeypatch.setattr(db.buffer_acciones, "_escribir_lote", falla_el_segundo)
+    db.buffer_acciones.vaciar_sync()
+    assert llamadas == [2, 1]
+    assert contar(db.tabla_acciones) == 2
+    assert db.diario_local.lotes == 1
+    assert db.diario_local.warns == {(100, 1): 1}
+    assert [len(lote["filas"]) for lote in db.diario_local.leer()] == [1]
+    assert db.contar_warns_sync(100, 1) == 3
+    assert db.estadisticas_guilds.cargar_guild_sync(1) == (3, 3)
+    
+    monkeypatch.undo()
+    db.buffer_acciones.vaciar_sync()
+    assert not db.diario_local
+    assert not os.path.exists(db.diario_local.ruta)
+    assert db.contar_warns_sync(100, 1) == 3
@@ -0,0 +1,111 @@
+"""Circuit breaker de la capa de datos (CircuitoDB y ejecutar_lectura)"""
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+
+import main
+
+def engine_caido():
+    """Engine cuya conexión falla, como un servidor que no responde"""
+    def conectar():
+        raise sqlite3.OperationalError("servidor caído")
+    return create_engine("sqlite://", creator=conectar)
+
+def historial(user_id=100):
+    return asyncio.run(main.obtener_pagina_historial(user_id, 1, 10))
+
+def historial_obsoleto(user_id=100):
+    async def leer():
+        resultado = await main.obtener_pagina_historial(user_id, 1, 10)
+        return resultado, main.lectura_obsoleta.get()
+    return asyncio.run(leer())
+
+@pytest.fixture
+def accion(db):
+    db.buffer_acciones.agregar(100, 1, "warn", "razón", 7)
+    db.buffer_acciones.vaciar_sync()
+
+def test_se_abre_tras_umbral_fallos_y_sirve_la_ultima_copia(accion, monkeypatch):
+    assert [fila["razon"] for fila in historial()] == ["razón"]
+    monkeypatch.setattr(main, "engine_lectura", engine_caido())
+    
+    for _ in range(main.circuito_db.umbral):
+        assert main.circuito_db.estado == "cerrado"
+        resultado, obsoleto = historial_obsoleto()
+        assert [fila["razon"] for fila in resultado] == ["razón"] and obsoleto
+    assert main.circuito_db.estado == "abierto"
+    
+    # Abierto: ni siquiera se intenta la consulta
+    def obtener_pagina_historial_sync(*args):
+        raise AssertionError("con el circuito abierto no se consulta")
+    
+    monkeypatch.setattr(main, "obtener_pagina_historial_sync", obtener_pagina_historial_sync)
+    assert historial_obsoleto()[1]
+    with pytest.raises(main.BaseDatosNoDisponible):
+        historial(user_id=200)
+
+def test_un_fallo_no_se_guarda_como_ultima_copia(accion, monkeypatch):
+    monkeypatch.setattr(main, "engine_lectura", engine_caido())
+    with pytest.raises(main.BaseDatosNoDisponible):
+        historial(user_id=200)
+    assert main.lecturas_cache.datos == {}
+    assert main.circuito_db.fallos == 1
+
+def test_pool_agotado_cuenta_como_fallo(accion, monkeypatch):
+    # Un pool sin conexiones libres lanza TimeoutError antes de la consulta
+    pequeno = create_engine(
+        main.engine_lectura.url, connect_args={"check_same_thread": False},
+        pool_size=1, max_overflow=0, pool_timeout=0.05
+    )
+    monkeypatch.setattr(main, "engine_lectura", pequeno)
+    assert historial()
+    with pequeno.connect():
+        for _ in range(main.circuito_db.umbral):
+            assert historial_obsoleto()[1]
+    assert main.circuito_db.estado == "abierto"
+
+def test_semiabierto_y_cierre(db, monkeypatch):
+    monkeypatch.setattr(main.circuito_db, "espera", 0)
+    sondeo_ok = threading.Event()
+    sondeos = []
+    
+    def sondear_sync():
+        sondeos.append(main.circuito_db.estado)
+        if not sondeo_ok.is_set():
+            raise OSError("sigue caída")
+    
+    monkeypatch.setattr(main.circuito_db, "sondear_sync", sondear_sync)
+    for _ in range(main.circuito_db.umbral):
+        main.circuito_db.registrar(False, 0.0)
+    assert main.circuito_db.estado == "abierto"
+    
+    async def escenario():
+        tarea = asyncio.create_task(main.circuito_db.ejecutar())
+        try:
+            # Primer sondeo: falla y vuelve a abrirse
+            while not sondeos:
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(0.05)
+            assert main.circuito_db.estado == "abierto"
+            sondeo_ok.set()
+            while main.circuito_db.estado != "cerrado":
+                await asyncio.sleep(0.05)
+        finally:
+            tarea.cancel()
+    
+    asyncio.run(asyncio.wait_for(escenario(), timeout=10))
+    assert sondeos[:2] == ["semiabierto", "semiabierto"]
+    assert main.circuito_db.fallos == 0
+    assert main.circuito_db.permite()
+
+def test_lentitud_por_encima_del_slo_cuenta_como_fallo(db):
+    for _ in range(main.circuito_db.umbral - 1):
+        main.circuito_db.registrar(True, main.circuito_db.slo * 2)
+    main.circuito_db.registrar(True, 0.0)
+    assert main.circuito_db.fallos == 0
+    for _ in range(main.circuito_db.umbral):
+        main.circuito_db.registrar(True, main.circuito_db.slo * 2)
+    assert main.circuito_db.estado == "abierto"
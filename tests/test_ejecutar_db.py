@@ -0,0 +1,38 @@
+"""Las consultas lentas no bloquean el event loop (ver ejecutar_db)"""
+import asyncio
+import time
+
+import main
+
+def consulta_lenta_sync(segundos):
+    # Simula un round-trip lento a MySQL: el hilo queda bloqueado
+    with main.engine_lectura.connect():
+        time.sleep(segundos)
+    return segundos
+
+def test_consulta_lenta_no_retrasa_el_event_loop(db):
+    async def escenario():
+        retrasos = []
+        
+        async def latido():
+            # Igual que el heartbeat del gateway: debe despertar a tiempo
+            for _ in range(20):
+                inicio = time.perf_counter()
+                await asyncio.sleep(0.02)
+                retrasos.append(time.perf_counter() - inicio - 0.02)
+        
+        async def comando_rapido():
+            await asyncio.sleep(0.05)
+            inicio = time.perf_counter()
+            await db.ejecutar_db(db.contar_warns_sync, 10, 1)
+            return time.perf_counter() - inicio
+        
+        lenta = asyncio.create_task(db.ejecutar_db(consulta_lenta_sync, 0.5))
+        _, rapido = await asyncio.gather(latido(), comando_rapido())
+        assert not lenta.done()
+        assert await lenta == 0.5
+        return max(retrasos), rapido
+    
+    retraso, rapido = asyncio.run(escenario())
+    assert retraso < 0.1
+    assert rapido < 0.2
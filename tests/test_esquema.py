@@ -0,0 +1,24 @@
+"""Tablas Core: el mismo esquema genera el DDL de MySQL y SQLite, y las sentencias se compilan una vez"""
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+def test_ddl_de_ambos_dialectos(db):
+    for tabla in db.metadata.sorted_tables:
+        for dialecto in (mysql.dialect(), sqlite.dialect()):
+            ddl = str(CreateTable(tabla).compile(dialect=dialecto))
+            assert tabla.name in ddl
+            for indice in tabla.indexes:
+                assert indice.name in str(CreateIndex(indice).compile(dialect=dialecto))
+    
+    ddl_mysql = str(CreateTable(db.tabla_acciones).compile(dialect=mysql.dialect()))
+    assert "AUTO_INCREMENT" in ddl_mysql
+
+def test_sentencias_compiladas_una_vez(db):
+    db.buffer_acciones.agregar(100, 1, "warn", "razón", 7)
+    db.buffer_acciones.vaciar_sync()
+    with db.engine_lectura.connect() as conn:
+        resultados = [
+            conn.execute(db.SQL_CONTAR_WARNS, {"user_id": user_id, "guild_id": 1}) for user_id in (100, 101)
+        ]
+        assert resultados[0].scalar() == 1 and resultados[1].scalar() is None
+    assert resultados[0].context.compiled is resultados[1].context.compiled
@@ -0,0 +1,24 @@
+"""Estadísticas incrementales de servidor (guild_stats y su espejo en memoria)"""
+import asyncio
+
+def test_incrementales_coinciden_con_el_recuento(db):
+    for i in range(12):
+        db.buffer_acciones.agregar(100 + i % 3, 1 + i % 2, "warn" if i % 4 else "mute", "razón", 7)
+    db.buffer_acciones.vaciar_sync()
+    assert db.quitar_warns_sync(101, 2, 2, 7, "unwarn")
+    
+    # Primera lectura desde la tabla; las siguientes desde el espejo
+    incrementales = {guild: db.estadisticas_guilds.cargar_guild_sync(guild) for guild in (1, 2)}
+    assert incrementales == {1: (3, 6), 2: (4, 7)}
+    db.buffer_acciones.agregar(100, 1, "warn", "razón", 7)
+    assert db.estadisticas_guilds.obtener(1) == (4, 7)
+    
+    db.buffer_acciones.vaciar_sync()
+    db.estadisticas_guilds.reconstruir_sync()
+    assert db.estadisticas_guilds.obtener(1) is None
+    assert db.estadisticas_guilds.cargar_guild_sync(1) == (4, 7)
+    assert db.estadisticas_guilds.cargar_guild_sync(2) == (4, 7)
+
+def test_obtener_estadisticas_incluye_la_cola(db):
+    db.buffer_acciones.agregar(100, 1, "warn", "razón", 7)
+    assert asyncio.run(db.obtener_estadisticas_guild(1)) == (1, 1)
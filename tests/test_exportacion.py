@@ -0,0 +1,73 @@
+"""Exportación por keyset (exportar_acciones_sync)"""
+import csv
+import gzip
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+
+INICIO = datetime(2024, 3, 1)
+
+@pytest.fixture
+def acciones(db, monkeypatch):
+    # Bloques de 3 filas y varias acciones por segundo: los empates de
+    # created_at caen a ambos lados de los cortes entre bloques
+    monkeypatch.setattr(main, "EXPORTACION_LOTE", 3)
+    filas = [
+        {
+            "user_id": 100 + i % 2, "guild_id": 1 if i < 20 else 2, "tipo": "warn", "razon": f"razón, {i}",
+            "moderator_id": 7, "duracion": None, "created_at": INICIO + timedelta(seconds=i // 4),
+            "idempotency_key": uuid.uuid4().hex
+        }
+        for i in range(24)
+    ]
+    with main.engine.begin() as conn:
+        conn.execute(main.SQL_INSERTAR_ACCION, filas)
+    return filas
+
+def exportar(*args, **kwargs):
+    ruta, filas = main.exportar_acciones_sync(*args, **kwargs)
+    try:
+        with gzip.open(ruta, "rt", encoding="utf-8", newline="") as fichero:
+            if kwargs.get("formato") == "jsonl":
+                contenido = [json.loads(linea) for linea in fichero]
+            else:
+                contenido = list(csv.DictReader(fichero))
+    finally:
+        os.remove(ruta)
+    assert filas == len(contenido)
+    return contenido
+
+def test_exporta_todo_sin_repetir_ni_saltar(acciones):
+    contenido = exportar(1)
+    assert [fila["razon"] for fila in contenido] == [f"razón, {i}" for i in range(20)]
+    assert len({fila["id"] for fila in contenido}) == 20
+    assert list(contenido[0]) == main.COLUMNAS_EXPORTACION
+
+def test_filtros(acciones):
+    assert [fila["razon"] for fila in exportar(1, user_id=101)] == [f"razón, {i}" for i in range(1, 20, 2)]
+    
+    desde, hasta = INICIO + timedelta(seconds=1), INICIO + timedelta(seconds=3)
+    contenido = exportar(1, desde=desde, hasta=hasta)
+    assert [fila["razon"] for fila in contenido] == [f"razón, {i}" for i in range(4, 12)]
+    
+    assert exportar(3) == []
+
+def test_jsonl(acciones):
+    contenido = exportar(2, formato="jsonl")
+    assert [fila["razon"] for fila in contenido] == [f"razón, {i}" for i in range(20, 24)]
+    assert contenido[0]["servidor"] == 2
+    assert contenido[0]["fecha"] == (INICIO + timedelta(seconds=5)).isoformat()
+
+def test_incluye_la_cola(acciones):
+    main.buffer_acciones.agregar(100, 2, "kick", "en la cola", 7)
+    assert exportar(2)[-1]["razon"] == "en la cola"
+
+def test_no_vacia_la_cola_de_otros_servidores(acciones):
+    main.buffer_acciones.agregar(100, 3, "kick", "otro servidor", 7)
+    assert len(exportar(2)) == 4
+    assert len(main.buffer_acciones.filas) == 1
@@ -0,0 +1,110 @@
+"""Envío agrupado de logs al canal (SumideroLogs)"""
+import asyncio
+
+import discord
+import pytest
+
+import main
+
+class CanalFalso:
+    """Canal que anota cada mensaje como la lista de títulos de sus embeds"""
+
+    def __init__(self, falla=lambda embeds: False):
+        self.mensajes = []
+        self.falla = falla
+        self.abierto = asyncio.Event()
+        self.abierto.set()
+
+    async def send(self, embed=None, embeds=None):
+        embeds = embeds or [embed]
+        await self.abierto.wait()
+        if self.falla(embeds):
+            raise RuntimeError("mensaje rechazado")
+        self.mensajes.append([embed.title for embed in embeds])
+
+def log(titulo, caracteres=0):
+    return discord.Embed(title=titulo, description="x" * caracteres), f"línea {titulo}"
+
+async def con_sumidero(canal, escenario, umbral=100):
+    sumidero = main.SumideroLogs(2, umbral)
+    original = main.bot.get_channel
+    main.bot.get_channel = lambda channel_id: canal
+    tarea = asyncio.create_task(sumidero.ejecutar())
+    try:
+        return await escenario(sumidero)
+    finally:
+        tarea.cancel()
+        main.bot.get_channel = original
+
+def test_sin_trafico_cada_log_sale_al_llegar():
+    canal = CanalFalso()
+    
+    async def escenario(sumidero):
+        for i in range(3):
+            await sumidero.enviar(*log(str(i)))
+    
+    asyncio.run(con_sumidero(canal, escenario))
+    assert canal.mensajes == [["0"], ["1"], ["2"]]
+
+def test_rafaga_se_agrupa_mientras_hay_un_envio_en_curso():
+    canal = CanalFalso()
+    
+    async def escenario(sumidero):
+        canal.abierto.clear()
+        primero = asyncio.create_task(sumidero.enviar(*log("0")))
+        await asyncio.sleep(0)
+        resto = [asyncio.create_task(sumidero.enviar(*log(str(i)))) for i in range(1, 13)]
+        await asyncio.sleep(0)
+        canal.abierto.set()
+        await asyncio.gather(primero, *resto)
+    
+    asyncio.run(con_sumidero(canal, escenario))
+    assert canal.mensajes == [["0"], [str(i) for i in range(1, 11)], ["11", "12"]]
+
+def test_limite_de_6000_caracteres_por_mensaje():
+    canal = CanalFalso()
+    
+    async def escenario(sumidero):
+        await asyncio.gather(*(sumidero.enviar(*log(str(i), 2500)) for i in range(5)))
+    
+    asyncio.run(con_sumidero(canal, escenario))
+    assert canal.mensajes == [["0", "1"], ["2", "3"], ["4"]]
+    assert sum(len(mensaje) for mensaje in canal.mensajes) == 5
+
+def test_modo_resumen():
+    canal = CanalFalso()
+    
+    async def escenario(sumidero):
+        canal.abierto.clear()
+        tareas = [asyncio.create_task(sumidero.enviar(*log(str(i)))) for i in range(8)]
+        await asyncio.sleep(0)
+        canal.abierto.set()
+        await asyncio.gather(*tareas)
+    
+    asyncio.run(con_sumidero(canal, escenario, umbral=3))
+    (resumen,), = canal.mensajes
+    assert resumen.startswith("📋 Resumen de moderación (8 acciones")
+
+def test_un_embed_rechazado_no_arrastra_al_resto():
+    canal = CanalFalso(falla=lambda embeds: any(embed.title == "malo" for embed in embeds))
+    
+    async def escenario(sumidero):
+        canal.abierto.clear()
+        tareas = [asyncio.create_task(sumidero.enviar(*log(titulo))) for titulo in ("a", "malo", "b")]
+        await asyncio.sleep(0)
+        canal.abierto.set()
+        return await asyncio.gather(*tareas, return_exceptions=True)
+    
+    resultados = asyncio.run(con_sumidero(canal, escenario))
+    assert resultados[0] is None and resultados[2] is None
+    assert isinstance(resultados[1], RuntimeError)
+    assert canal.mensajes == [["a"], ["b"]]
+
+def test_el_error_llega_a_quien_espera():
+    canal = CanalFalso(falla=lambda embeds: True)
+    
+    async def escenario(sumidero):
+        await sumidero.enviar(*log("0"))
+    
+    with pytest.raises(RuntimeError):
+        asyncio.run(con_sumidero(canal, escenario))
@@ -0,0 +1,300 @@
+"""Comandos de sanción: ban/kick con su DM, unban, massban (bulk_ban por lotes) y masswarn/massmute"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import discord
+import pytest
+from sqlalchemy import event, select
+
+import main
+
+class MiembroFalso(discord.Member):
+    """Member mínimo: guarda los DMs recibidos y puede fallar al enviarlos"""
+
+    def __init__(self, user_id, guild, dm_abiertos=True, bot=False, top_role=1, fallos=()):
+        self._id = user_id
+        self._guild = guild
+        self._bot = bot
+        self._top_role = top_role
+        self.dm_abiertos = dm_abiertos
+        self.dms = []
+        self.fallos = list(fallos)  # errores que lanzarán las próximas llamadas a timeout
+        self.silenciado = None
+
+    id = property(lambda self: self._id)
+    guild = property(lambda self: self._guild)
+    mention = property(lambda self: f"<@{self._id}>")
+    bot = property(lambda self: self._bot)
+    top_role = property(lambda self: self._top_role)
+
+    async def send(self, embed=None):
+        if not self.dm_abiertos:
+            raise discord.HTTPException(SimpleNamespace(status=400, reason="Bad Request"), "DM cerrados")
+        self.dms.append(embed.description)
+
+    async def kick(self, reason=None):
+        await self._guild.kick(self, reason=reason)
+
+    async def timeout(self, duracion, reason=None):
+        if self.fallos:
+            raise self.fallos.pop(0)
+        self.silenciado = duracion
+
+class UsuarioFalso(discord.User):
+    """User mínimo: alguien que no está en el servidor (ban/unban por ID)"""
+
+    def __init__(self, user_id):
+        self._id = user_id
+
+    id = property(lambda self: self._id)
+    mention = property(lambda self: f"<@{self._id}>")
+    bot = False
+
+class ServidorFalso:
+    def __init__(self, falla=lambda ids: None):
+        self.id = 1
+        self.owner_id = 1
+        self.me = SimpleNamespace(top_role=10)
+        self.falla = falla
+        self.lotes = []
+        self.baneados = []
+
+    def get_member(self, user_id):
+        return None
+
+    async def ban(self, user, reason=None):
+        self.falla([user.id])
+        self.baneados.append(user.id)
+
+    async def kick(self, user, reason=None):
+        self.falla([user.id])
+
+    async def unban(self, user, reason=None):
+        self.falla([user.id])
+
+    async def bulk_ban(self, usuarios, reason=None):
+        self.lotes.append(len(usuarios))
+        ids = [usuario.id for usuario in usuarios]
+        rechazados = set(self.falla(ids) or ())
+        return SimpleNamespace(
+            banned=[usuario for usuario in usuarios if usuario.id not in rechazados],
+            failed=[usuario for usuario in usuarios if usuario.id in rechazados]
+        )
+
+class Escribiendo:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+def contexto(guild):
+    enviados = []
+
+    async def send(embed=None):
+        enviados.append(embed)
+
+    ctx = SimpleNamespace(
+        guild=guild, prefix="!", send=send, typing=Escribiendo,
+        message=SimpleNamespace(attachments=[]),
+        author=SimpleNamespace(
+            id=7, top_role=10,
+            guild_permissions=SimpleNamespace(
+                administrator=False, moderate_members=True, ban_members=True, kick_members=True
+            )
+        )
+    )
+    return ctx, enviados
+
+@pytest.fixture
+def bot_conectado(db, monkeypatch):
+    monkeypatch.setattr(type(main.bot), "user", property(lambda self: SimpleNamespace(id=999)))
+    return db
+
+def outbox():
+    main.buffer_acciones.vaciar_sync()
+    with main.engine.begin() as conn:
+        filas = conn.execute(select(main.tabla_outbox.c.tipo, main.tabla_outbox.c.payload)).fetchall()
+    return [(tipo, json.loads(payload)) for tipo, payload in filas]
+
+def acciones(tipo):
+    main.buffer_acciones.vaciar_sync()
+    with main.engine.begin() as conn:
+        return conn.execute(
+            select(main.tabla_acciones.c.user_id).where(main.tabla_acciones.c.tipo == tipo)
+        ).scalars().all()
+
+def test_ban_avisa_antes_y_solo_registra_el_log(bot_conectado):
+    guild = ServidorFalso()
+    member = MiembroFalso(100, guild)
+    ctx, _ = contexto(guild)
+
+    asyncio.run(main.ban_command.callback(ctx, member, reason="spam"))
+
+    assert guild.baneados == [100]
+    assert member.dms and "baneado" in member.dms[0]
+    assert [tipo for tipo, _ in outbox()] == ["log"]
+    assert acciones("ban") == [100]
+
+def test_ban_fallido_encola_la_rectificacion(bot_conectado):
+    def falla(ids):
+        raise RuntimeError("sin permisos")
+    guild = ServidorFalso(falla)
+    member = MiembroFalso(100, guild)
+    ctx, enviados = contexto(guild)
+
+    asyncio.run(main.ban_command.callback(ctx, member, reason="spam"))
+
+    assert len(member.dms) == 1
+    assert [(tipo, payload["action_type"]) for tipo, payload in outbox()] == [("dm", "ban_anulado")]
+    assert acciones("ban") == []
+    assert enviados[-1].title == "❌ Error"
+
+def test_kick_con_dm_cerrados_lo_deja_en_el_outbox(bot_conectado):
+    guild = ServidorFalso()
+    member = MiembroFalso(100, guild, dm_abiertos=False)
+    ctx, _ = contexto(guild)
+
+    asyncio.run(main.kick_command.callback(ctx, member, reason="flood"))
+
+    efectos = outbox()
+    assert sorted(tipo for tipo, _ in efectos) == ["dm", "log"]
+    assert [payload["action_type"] for tipo, payload in efectos if tipo == "dm"] == ["kick"]
+    assert acciones("kick") == [100]
+
+def test_ban_por_id_envia_el_dm_por_el_outbox(bot_conectado):
+    guild = ServidorFalso()
+    ctx, enviados = contexto(guild)
+
+    asyncio.run(main.ban_command.callback(ctx, UsuarioFalso(100), reason="spam"))
+
+    assert guild.baneados == [100]
+    assert sorted(tipo for tipo, _ in outbox()) == ["dm", "log"]
+    assert enviados[-1].title == "🚫 Ban Aplicado"
+
+def test_unban_registra_la_accion_y_el_log(bot_conectado):
+    guild = ServidorFalso()
+    ctx, enviados = contexto(guild)
+
+    asyncio.run(main.unban_command.callback(ctx, UsuarioFalso(100), reason="apelación"))
+
+    assert acciones("unban") == [100]
+    [(tipo, payload)] = outbox()
+    assert (tipo, payload["action"], payload["user_id"]) == ("log", "Usuario Desbaneado", 100)
+    assert enviados[-1].title == "♻️ Unban Aplicado"
+
+IDS = [10 ** 17 + i for i in range(450)]
+
+def massban(guild, ids=IDS, razon="raid"):
+    ctx, enviados = contexto(guild)
+    contenido = " ".join(str(user_id) for user_id in ids) + f" {razon}"
+    asyncio.run(main.massban_command.callback(ctx, contenido=contenido))
+    return enviados[-1]
+
+def test_massban_trocea_en_lotes_de_200(bot_conectado):
+    guild = ServidorFalso()
+    resumen = massban(guild)
+
+    assert guild.lotes == [200, 200, 50]
+    assert sorted(acciones("ban")) == IDS
+    assert "**Baneados:** 450" in resumen.description
+    assert "**Razón:** raid" in resumen.description
+
+def test_massban_con_fallos_parciales(bot_conectado):
+    rechazado_por_discord = IDS[3]
+
+    def falla(ids):
+        if IDS[200] in ids:
+            # El segundo lote lo rechaza la API entero
+            raise discord.HTTPException(SimpleNamespace(status=500, reason="Error"), "caído")
+        return [rechazado_por_discord]
+    guild = ServidorFalso(falla)
+    guild.owner_id = IDS[-1]  # el dueño se omite sin llegar a la API
+    resumen = massban(guild)
+
+    assert guild.lotes == [200, 200, 49]
+    baneados = sorted(acciones("ban"))
+    assert baneados == [user_id for user_id in IDS[:200] + IDS[400:-1] if user_id != rechazado_por_discord]
+    assert "**Baneados:** 248" in resumen.description
+    assert "**Fallidos:** 201" in resumen.description
+    assert "**Omitidos (jerarquía/propios):** 1" in resumen.description
+
+def test_massban_registra_un_unico_log(bot_conectado):
+    guild = ServidorFalso(lambda ids: ids[:1])
+    massban(guild, IDS[:3])
+
+    [(tipo, payload)] = outbox()
+    assert (tipo, payload["action"]) == ("log", "Baneo Masivo")
+    assert payload["extra_fields"]["🚫 Baneados"] == 2
+    assert payload["extra_fields"]["❌ Fallidos"] == 1
+    assert payload["extra_fields"]["🆔 IDs"] == f"{IDS[1]}, {IDS[2]}"
+
+def error_http(status, **cabeceras):
+    return discord.HTTPException(SimpleNamespace(status=status, reason="", headers=cabeceras), "error")
+
+def test_separar_objetivos_tras_greedy(bot_conectado):
+    guild = ServidorFalso()
+    ctx, _ = contexto(guild)
+    normal = MiembroFalso(100, guild)
+    # Lo que entrega Greedy[discord.Member]: con repetidos, bots, el autor y rangos altos
+    members = [
+        normal, MiembroFalso(100, guild), MiembroFalso(101, guild, bot=True),
+        MiembroFalso(7, guild), MiembroFalso(102, guild, top_role=10), MiembroFalso(103, guild)
+    ]
+
+    validos, rechazados = main.separar_objetivos(ctx, members, "silenciar")
+
+    assert [member.id for member in validos] == [100, 103]
+    assert [(member.id, motivo) for member, motivo in rechazados] == [
+        (101, "No se puede silenciar a un bot."),
+        (7, "No puedes silenciarte a ti mismo."),
+        (102, "No puedes silenciar a <@102> porque tiene un rol igual o superior al tuyo.")
+    ]
+
+def test_massmute_informa_de_cada_fallo(bot_conectado, monkeypatch):
+    esperas = []
+
+    async def dormir(segundos):
+        esperas.append(segundos)
+    monkeypatch.setattr(main.asyncio, "sleep", dormir)
+    guild = ServidorFalso()
+    ctx, enviados = contexto(guild)
+    members = [
+        MiembroFalso(100, guild),
+        MiembroFalso(101, guild, fallos=[error_http(429, **{"Retry-After": "1.5"})]),
+        MiembroFalso(102, guild, fallos=[error_http(500)]),
+        MiembroFalso(103, guild, fallos=[error_http(429)] * (main.MASIVO_REINTENTOS + 1)),
+        MiembroFalso(104, guild, bot=True)
+    ]
+
+    asyncio.run(main.massmute_command.callback(ctx, members, "10m", reason="flood"))
+
+    assert [member.id for member in members if member.silenciado] == [100, 101]
+    assert 1.5 in esperas
+    assert len(esperas) == 1 + main.MASIVO_REINTENTOS
+    resumen = enviados[-1]
+    assert resumen.title == "🔇 Silencio Masivo (2/5)"
+    assert "❌ <@102> · Error de Discord: 500" in resumen.description
+    assert "❌ <@103> · Error de Discord: 429" in resumen.description
+    assert "❌ <@104> · No se puede silenciar a un bot." in resumen.description
+    assert sorted(acciones("mute")) == [100, 101]
+
+def test_masswarn_inserta_en_un_solo_lote(bot_conectado):
+    guild = ServidorFalso()
+    ctx, enviados = contexto(guild)
+    members = [MiembroFalso(100 + i, guild) for i in range(20)]
+    inserciones = []
+
+    def contar(conn, cursor, sentencia, parametros, contexto_sql, executemany):
+        if sentencia.lstrip().upper().startswith("INSERT INTO ACCIONES "):
+            inserciones.append(len(parametros) if executemany else 1)
+    event.listen(main.engine, "before_cursor_execute", contar)
+    try:
+        asyncio.run(main.masswarn_command.callback(ctx, members, reason="spam"))
+    finally:
+        event.remove(main.engine, "before_cursor_execute", contar)
+
+    assert inserciones == [20]
+    assert sorted(acciones("warn")) == [member.id for member in members]
+    assert enviados[-1].title == "⚠️ Warn Masivo (20/20)"
@@ -0,0 +1,97 @@
+"""Entrega de efectos desde la tabla outbox (DespachadorOutbox)"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import discord
+from sqlalchemy import select, update
+
+import main
+
+def filas_outbox():
+    with main.engine.connect() as conn:
+        return conn.execute(
+            select(main.tabla_outbox.c.id, main.tabla_outbox.c.intentos, main.tabla_outbox.c.proximo_intento)
+        ).fetchall()
+
+def encolar(*razones):
+    for razon in razones:
+        main.buffer_acciones.agregar(
+            100, 1, "warn", razon, 7,
+            efectos=[{"tipo": "dm", "payload": {"reason": razon}}]
+        )
+    main.buffer_acciones.vaciar_sync()
+
+def vencer_todo():
+    with main.engine.begin() as conn:
+        conn.execute(update(main.tabla_outbox).values(proximo_intento=datetime.utcnow() - timedelta(seconds=1)))
+
+def despachar(errores=None, max_intentos=3, segundos=0.3):
+    """Arranca un despachador nuevo (como tras un reinicio) durante unos instantes.
+
+    `errores` asocia razones con la excepción que lanzará su entrega.
+    Devuelve las razones entregadas o intentadas, en orden.
+    """
+    intentos = []
+
+    async def entregar(tipo, payload):
+        razon = json.loads(payload)["reason"]
+        intentos.append(razon)
+        if errores and razon in errores:
+            raise errores[razon]
+
+    async def escenario():
+        despachador = main.DespachadorOutbox(2, max_intentos, 0.05)
+        despachador.entregar = entregar
+        tarea = asyncio.create_task(despachador.ejecutar())
+        await asyncio.sleep(segundos)
+        tarea.cancel()
+
+    asyncio.run(escenario())
+    return intentos
+
+def test_las_filas_sobreviven_a_un_reinicio(db):
+    encolar("a", "b")
+    # Nadie las entregó antes del "reinicio": siguen en la tabla
+    assert len(filas_outbox()) == 2
+
+    assert sorted(despachar()) == ["a", "b"]
+    assert filas_outbox() == []
+
+def test_reintenta_con_backoff(db):
+    encolar("ok", "falla")
+    antes = datetime.utcnow()
+
+    assert sorted(despachar({"falla": RuntimeError("caído")})) == ["falla", "ok"]
+    [(_, intentos, proximo)] = filas_outbox()
+    assert intentos == 1
+    # Primer reintento a los 5 s: durante la prueba no se vuelve a intentar
+    assert antes + timedelta(seconds=4) < proximo < datetime.utcnow() + timedelta(seconds=6)
+
+    vencer_todo()
+    assert despachar({"falla": RuntimeError("caído")}) == ["falla"]
+    [(_, intentos, proximo)] = filas_outbox()
+    assert intentos == 2
+    assert proximo > datetime.utcnow() + timedelta(seconds=8)
+
+    vencer_todo()
+    assert despachar() == ["falla"]
+    assert filas_outbox() == []
+
+def test_descarta_tras_max_intentos(db):
+    encolar("falla")
+    for _ in range(2):
+        despachar({"falla": RuntimeError("caído")})
+        vencer_todo()
+    assert [intentos for _, intentos, _ in filas_outbox()] == [2]
+
+    assert despachar({"falla": RuntimeError("caído")}) == ["falla"]
+    assert filas_outbox() == []
+
+def test_not_found_no_se_reintenta(db):
+    encolar("borrado")
+    no_existe = discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown User")
+
+    assert despachar({"borrado": no_existe}) == ["borrado"]
+    assert filas_outbox() == []
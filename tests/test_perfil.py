@@ -0,0 +1,39 @@
+"""Perfil de moderación en una sola consulta (obtener_perfil_sync)"""
+from datetime import datetime, timedelta
+
+def test_perfil_completo(db):
+    inicio = datetime.utcnow() - timedelta(days=1)
+    for i, tipo in enumerate(["warn", "mute", "warn", "kick", "warn", "warn", "unmute"]):
+        db.buffer_acciones.agregar(100, 1, tipo, f"razón {i}", 7, created_at=inicio + timedelta(minutes=i))
+    db.buffer_acciones.agregar(101, 1, "warn", "otro usuario", 7)
+    
+    perfil = db.obtener_perfil_sync(100, 1)
+    assert perfil["warns"] == 4
+    assert perfil["total_acciones"] == 7
+    assert perfil["por_tipo"] == {"warn": 4, "mute": 1, "kick": 1, "unmute": 1}
+    assert [accion["razon"] for accion in perfil["ultimos_warns"]] == ["razón 5", "razón 4", "razón 2"]
+
+def test_perfil_sin_acciones(db):
+    perfil = db.obtener_perfil_sync(100, 1)
+    assert perfil == {"warns": 0, "total_acciones": 0, "resumidas": 0, "por_tipo": {}, "ultimos_warns": []}
+
+def test_perfil_no_vacia_la_cola_de_otros_usuarios(db):
+    db.buffer_acciones.agregar(101, 1, "warn", "otro usuario", 7)
+    db.buffer_acciones.agregar(100, 2, "warn", "otro servidor", 7)
+    
+    assert db.obtener_perfil_sync(100, 1)["warns"] == 0
+    assert len(db.buffer_acciones.filas) == 2
+    
+    db.buffer_acciones.agregar(100, 1, "warn", "pendiente", 7)
+    perfil = db.obtener_perfil_sync(100, 1)
+    assert perfil["warns"] == 1
+    assert [accion["razon"] for accion in perfil["ultimos_warns"]] == ["pendiente"]
+    assert db.buffer_acciones.filas == []
+
+def test_ultimos_warns_con_la_misma_fecha_desempata_por_id(db):
+    fecha = datetime.utcnow().replace(microsecond=0)
+    for i in range(5):
+        db.buffer_acciones.agregar(100, 1, "warn", f"razón {i}", 7, created_at=fecha)
+    
+    perfil = db.obtener_perfil_sync(100, 1)
+    assert [accion["razon"] for accion in perfil["ultimos_warns"]] == ["razón 4", "razón 3", "razón 2"]
@@ -0,0 +1,44 @@
+"""Revisión en segundo plano del pool de conexiones (GestorPool)"""
+from sqlalchemy import create_engine, event, text
+
+def test_revisar_descarta_conexiones_caidas(db):
+    with db.engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        crudo = conn.connection.dbapi_connection
+    # La conexión libre del pool muere (p. ej. wait_timeout de MySQL)
+    crudo.close()
+    invalidadas = db.gestor_pool.invalidadas
+    
+    assert db.gestor_pool.revisar_sync() == 1
+    assert db.gestor_pool.invalidadas == invalidadas + 1
+    assert db.gestor_pool.estadisticas()["invalidadas"] == invalidadas + 1
+    
+    # El siguiente checkout abre una conexión nueva sin hacer ping
+    db.buffer_acciones.agregar(100, 1, "warn", "razón", 7)
+    assert db.buffer_acciones.vaciar_sync() == 1
+
+def test_estadisticas_del_pool(db):
+    with db.engine.connect():
+        estadisticas = db.gestor_pool.estadisticas()
+    assert estadisticas["tamano"] == 1
+    assert estadisticas["en_uso"] == 1
+    assert estadisticas["libres"] == 0
+    assert db.gestor_pool.estadisticas()["en_uso"] == 0
+
+def test_revisar_toma_las_conexiones_de_una_en_una(db):
+    motor = create_engine(f"sqlite:///{db.SQLITE_PATH}", pool_size=3, max_overflow=0)
+    conexiones = [motor.connect() for _ in range(3)]
+    for conexion in conexiones:
+        conexion.close()
+    en_uso, vistas = [], set()
+    
+    @event.listens_for(motor.pool, "checkout")
+    def al_tomar(dbapi_connection, registro, proxy):
+        en_uso.append(motor.pool.checkedout())
+        vistas.add(id(dbapi_connection))
+    
+    assert db.gestor_pool._revisar_pool(motor.pool) == 3
+    # Nunca más de una fuera del pool y cada conexión libre revisada una vez
+    assert en_uso == [1, 1, 1]
+    assert len(vistas) == 3
+    motor.dispose()
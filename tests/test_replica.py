@@ -0,0 +1,93 @@
+"""Enrutado a la réplica de lectura, con dos ficheros SQLite como primario y réplica.
+
+La réplica no recibe replicación: su contenido propio hace visible de qué
+base de datos sale cada lectura.
+"""
+import asyncio
+import contextvars
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+import main
+
+@pytest.fixture
+def replica(db, monkeypatch, tmp_path):
+    _, motor = main.crear_engines_sqlite(tmp_path / "replica.db")
+    main.metadata.create_all(motor)
+    with motor.begin() as conn:
+        conn.execute(main.SQL_INSERTAR_ACCION, {
+            "user_id": 100, "guild_id": 1, "tipo": "warn", "razon": "en la réplica", "moderator_id": 9,
+            "duracion": None, "created_at": datetime(2024, 1, 1), "idempotency_key": "replica"
+        })
+    monkeypatch.setattr(main, "engine_replica", motor)
+    yield motor
+    motor.dispose()
+
+def razones(historial):
+    return [accion["razon"] for accion in historial]
+
+def en_contexto_nuevo(funcion, *args):
+    # Cada comando o interacción tiene su propio contexto (ver antes_de_comando)
+    return contextvars.Context().run(funcion, *args)
+
+def leer_como(actor_id):
+    main.fijar_lecturas(actor_id)
+    return razones(main.obtener_pagina_historial_sync(100, 1, 10))
+
+def test_escrituras_van_al_primario(replica):
+    main.buffer_acciones.agregar(100, 1, "warn", "en el primario", 7)
+    main.buffer_acciones.vaciar_sync()
+    assert main.quitar_warns_sync(100, 1, 1, 7, "unwarn")
+    
+    with replica.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(main.tabla_acciones)).scalar() == 1
+    with main.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(main.tabla_acciones)).scalar() == 2
+
+def test_lecturas_van_a_la_replica(replica):
+    main.buffer_acciones.agregar(100, 1, "warn", "en el primario", 7)
+    main.buffer_acciones.vaciar_sync()
+    
+    assert en_contexto_nuevo(leer_como, 8) == ["en la réplica"]
+    assert en_contexto_nuevo(main.obtener_perfil_sync, 100, 1)["ultimos_warns"][0]["razon"] == "en la réplica"
+    # El contador de warns y la deduplicación siempre leen del primario
+    assert main.contar_warns_sync(100, 1) == 1
+    assert main.claves_existentes_sync(["replica"]) == set()
+
+def test_quien_escribe_lee_del_primario(replica):
+    def moderar():
+        main.anotar_escritura(7)
+        main.buffer_acciones.agregar(100, 1, "warn", "en el primario", 7)
+        return razones(main.obtener_pagina_historial_sync(100, 1, 10))
+    
+    assert en_contexto_nuevo(moderar) == ["en el primario"]
+    # Sus siguientes comandos siguen en el primario durante la ventana...
+    assert en_contexto_nuevo(leer_como, 7) == ["en el primario"]
+    # ...los de otros moderadores no
+    assert en_contexto_nuevo(leer_como, 8) == ["en la réplica"]
+    
+    main.escrituras_recientes[7] = time.monotonic() - 1
+    assert en_contexto_nuevo(leer_como, 7) == ["en la réplica"]
+
+def test_enrutado_a_traves_de_ejecutar_db(replica):
+    # El contexto del comando llega al hilo de la base de datos
+    async def comando(moderador, escribe):
+        main.fijar_lecturas(moderador)
+        if escribe:
+            await main.registrar_accion(100, 1, "warn", "en el primario", moderador)
+        return razones(await main.obtener_pagina_historial(100, 1, 10))
+    
+    async def escenario():
+        escritor = await comando(7, True)
+        return escritor, await asyncio.create_task(comando(8, False))
+    
+    assert asyncio.run(escenario()) == (["en el primario"], ["en la réplica"])
+
+def test_sin_replica_todo_va_al_primario(db):
+    assert main.engine_replica is None
+    main.anotar_escritura(7)
+    assert main.escrituras_recientes == {}
+    assert main.motor_lectura() is main.engine_lectura
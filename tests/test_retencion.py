@@ -0,0 +1,63 @@
+"""Retención: resumen mensual de acciones antiguas y borrado (resumir_acciones_sync)"""
+import uuid
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+import main
+
+ENERO, FEBRERO, MARZO = datetime(2024, 1, 10), datetime(2024, 2, 10), datetime(2024, 3, 1)
+
+def insertar(tipo, fecha, user_id=100, guild_id=1):
+    with main.engine.begin() as conn:
+        conn.execute(main.SQL_INSERTAR_ACCION, {
+            "user_id": user_id, "guild_id": guild_id, "tipo": tipo, "razon": "razón", "moderator_id": 7,
+            "duracion": None, "created_at": fecha, "idempotency_key": uuid.uuid4().hex
+        })
+
+def resumen():
+    tabla = main.tabla_acciones_resumen
+    with main.engine.connect() as conn:
+        return {
+            (fila.mes, fila.tipo): fila.total
+            for fila in conn.execute(select(tabla.c.mes, tabla.c.tipo, tabla.c.total).where(tabla.c.user_id == 100))
+        }
+
+def acciones_vivas():
+    with main.engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(main.tabla_acciones)).scalar()
+
+def totales():
+    perfil = main.obtener_perfil_sync(100, 1)
+    main.estadisticas_guilds.reconstruir_sync()
+    return perfil["total_acciones"], perfil["por_tipo"], main.estadisticas_guilds.cargar_guild_sync(1)[1]
+
+def test_resume_y_borra_los_meses_anteriores_al_corte(db):
+    for fecha in (ENERO, ENERO, FEBRERO):
+        insertar("warn", fecha)
+    insertar("kick", ENERO)
+    insertar("warn", MARZO)
+    antes = totales()
+    
+    assert main.resumir_acciones_sync(MARZO) == 2
+    assert resumen() == {("2024-01", "warn"): 2, ("2024-01", "kick"): 1, ("2024-02", "warn"): 1}
+    assert acciones_vivas() == 1
+    assert totales() == antes == (5, {"warn": 4, "kick": 1}, 5)
+    assert main.obtener_perfil_sync(100, 1)["resumidas"] == 4
+    
+    # Repetirlo no cambia nada
+    assert main.resumir_acciones_sync(MARZO) == 0
+    assert totales() == antes
+
+def test_fila_tardia_en_un_mes_ya_resumido(db):
+    insertar("warn", ENERO)
+    insertar("warn", ENERO)
+    main.resumir_acciones_sync(MARZO)
+    
+    # Llega tarde (backfill de auditoría o diario local) a un mes ya cerrado
+    insertar("warn", ENERO)
+    insertar("mute", ENERO)
+    main.resumir_acciones_sync(MARZO)
+    assert resumen() == {("2024-01", "warn"): 3, ("2024-01", "mute"): 1}
+    assert acciones_vivas() == 0
+    assert totales() == (4, {"warn": 3, "mute": 1}, 4)
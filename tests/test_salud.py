@@ -0,0 +1,82 @@
+"""Servidor de salud en el event loop del bot (keep_alive y estado_salud)"""
+import asyncio
+import time
+
+import aiohttp
+
+from keep_alive import keep_alive
+
+async def con_servidor(estado, peticiones):
+    """Arranca el servidor en un puerto libre y hace las peticiones (ruta -> (status, cuerpo))"""
+    runner = await keep_alive(estado, host="127.0.0.1", port=0)
+    try:
+        _, puerto = runner.addresses[0]
+        respuestas = {}
+        async with aiohttp.ClientSession() as sesion:
+            for ruta in peticiones:
+                async with sesion.get(f"http://127.0.0.1:{puerto}{ruta}") as respuesta:
+                    respuestas[ruta] = (respuesta.status, await respuesta.text())
+        return respuestas
+    finally:
+        await runner.cleanup()
+
+def test_healthz_sin_gateway_responde_503(db):
+    respuestas = asyncio.run(con_servidor(db.estado_salud, ["/healthz", "/readyz"]))
+    assert respuestas["/healthz"][0] == 503
+    assert respuestas["/readyz"][0] == 503
+    
+    estado = db.estado_salud()
+    assert estado["gateway"] == {"conectado": False, "latencia_ms": None}
+    assert estado["db"]["ok"] and estado["db"]["circuito"] == "cerrado"
+    assert estado["colas"]["acciones"] == 0
+
+def test_healthz_sano_y_metricas(db):
+    def estado():
+        return {"ok": True, "listo": True}
+    
+    respuestas = asyncio.run(con_servidor(estado, ["/healthz", "/readyz", "/metrics"]))
+    assert respuestas["/healthz"][0] == 200
+    assert respuestas["/readyz"] == (200, '{"listo": true}')
+    assert respuestas["/metrics"][0] == 200
+    assert "bot_event_loop_lag_segundos" in respuestas["/metrics"][1]
+
+def test_estado_refleja_colas_y_base_de_datos(db):
+    db.buffer_acciones.agregar(100, 1, "warn", "razón", 7)
+    db.circuito_db.estado = "abierto"
+    
+    async def escenario():
+        tarea = asyncio.create_task(db.ejecutar_db(time.sleep, 0.1))
+        await asyncio.sleep(0.02)
+        estado = db.estado_salud()
+        await tarea
+        return estado
+    
+    estado = asyncio.run(escenario())
+    assert not estado["ok"]
+    assert estado["db"]["circuito"] == "abierto"
+    assert estado["db"]["tareas_en_curso"] == 1
+    assert estado["colas"]["acciones"] == 1
+    assert db.tareas_db == 0
+
+def test_cerrar_el_bot_libera_el_puerto(db, monkeypatch):
+    cerrados = []
+    
+    async def cerrar_cliente(bot):
+        cerrados.append(bot)
+    monkeypatch.setattr(db.commands.Bot, "close", cerrar_cliente)
+    
+    async def escenario():
+        db.servidor_salud = await keep_alive(db.estado_salud, host="127.0.0.1", port=0)
+        _, puerto = db.servidor_salud.addresses[0]
+        await db.bot.close()
+        # Con el runner limpio el puerto queda libre para el siguiente arranque
+        async with aiohttp.ClientSession() as sesion:
+            try:
+                async with sesion.get(f"http://127.0.0.1:{puerto}/healthz"):
+                    return False
+            except aiohttp.ClientConnectionError:
+                return True
+    
+    assert asyncio.run(escenario())
+    assert db.servidor_salud is None
+    assert cerrados == [db.bot]
@@ -0,0 +1,27 @@
+"""Backend SQLite: DDL y upserts del dialecto, WAL y un único escritor"""
+from sqlalchemy import text
+
+import main
+
+def test_pragmas_de_las_conexiones(db):
+    for motor in (db.engine, db.engine_lectura):
+        with motor.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA mmap_size")).scalar() == main.SQLITE_MMAP_SIZE
+            assert conn.execute(text("PRAGMA cache_size")).scalar() == -main.SQLITE_CACHE_KB
+
+def test_un_solo_escritor(db):
+    assert db.engine.pool.size() == 1
+    assert db.engine_lectura.pool.size() == main.DB_WORKERS
+
+def test_esquema_y_upserts(db):
+    with db.engine.connect() as conn:
+        version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    assert version == len(db.MIGRACIONES)
+    
+    for _ in range(3):
+        db.buffer_acciones.agregar(100, 1, "warn", "razón", 7)
+        db.buffer_acciones.vaciar_sync()
+    assert db.contar_warns_sync(100, 1) == 3
+    assert db.estadisticas_guilds.cargar_guild_sync(1) == (3, 3)
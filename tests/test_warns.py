@@ -0,0 +1,171 @@
+"""Warns y unwarns (concurrentes o no) y la caché de contadores: el total debe ser exacto"""
+import asyncio
+import random
+
+from sqlalchemy import func, select
+
+import main
+
+USUARIO, GUILD = 500, 1
+
+def warns_en_tabla():
+    with main.engine.connect() as conn:
+        return conn.execute(main.SQL_CONTAR_WARNS, {"user_id": USUARIO, "guild_id": GUILD}).scalar() or 0
+
+def acciones_de_tipo(tipo):
+    with main.engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(main.tabla_acciones).where(main.tabla_acciones.c.tipo == tipo)
+        ).scalar()
+
+async def warn(moderador):
+    # Mismo recorrido que warn_command
+    async with main.lock_warns(USUARIO, GUILD):
+        await main.registrar_accion(USUARIO, GUILD, "warn", "spam", moderador)
+        await main.contar_warns(USUARIO, GUILD)
+
+async def unwarn(moderador):
+    # Mismo recorrido que unwarn_command con cantidad 1
+    async with main.lock_warns(USUARIO, GUILD):
+        if await main.contar_warns(USUARIO, GUILD) == 0:
+            return False
+        return await main.quitar_warns(USUARIO, GUILD, 1, moderador, "unwarn")
+
+def test_warns_y_unwarns_en_paralelo(db):
+    async def escenario():
+        for _ in range(100):
+            await warn(1)
+        await db.buffer_acciones.vaciar()
+        
+        # 300 comandos mezclados; con 100 warns de partida ningún unwarn
+        # encuentra el contador a cero, así que todos deben aplicarse
+        llamadas = [warn(moderador) for moderador in range(200)]
+        llamadas += [unwarn(moderador) for moderador in range(100)]
+        random.Random(4).shuffle(llamadas)
+        resultados = await asyncio.gather(*llamadas)
+        await db.buffer_acciones.vaciar()
+        return resultados
+    
+    resultados = asyncio.run(escenario())
+    assert resultados.count(True) == 100
+    assert warns_en_tabla() == 200
+    assert db.cache_warns.obtener(USUARIO, GUILD) == 200
+    assert acciones_de_tipo("warn") == 300
+    assert acciones_de_tipo("unwarn") == 100
+    assert db.estadisticas_guilds.cargar_guild_sync(GUILD) == (200, 400)
+
+def test_descuentos_concurrentes_nunca_dejan_negativo(db):
+    # Sin lock_warns: el UPDATE condicional es quien impide pasar de cero
+    async def escenario():
+        for _ in range(5):
+            db.buffer_acciones.agregar(USUARIO, GUILD, "warn", "spam", 1)
+        return await asyncio.gather(*(
+            db.quitar_warns(USUARIO, GUILD, 1, moderador, "unwarn") for moderador in range(20)
+        ))
+    
+    resultados = asyncio.run(escenario())
+    assert resultados.count(True) == 5
+    assert warns_en_tabla() == 0
+    assert acciones_de_tipo("unwarn") == 5
+
+def test_unwarn_rechazado_no_descarta_la_cola(db):
+    for _ in range(3):
+        db.buffer_acciones.agregar(USUARIO, GUILD, "warn", "spam", 1)
+    db.buffer_acciones.agregar(USUARIO + 1, GUILD, "kick", "raid", 1)
+    
+    assert db.quitar_warns_sync(USUARIO, GUILD, 5, 1, "unwarn") is False
+    assert len(db.buffer_acciones) == 0
+    assert not db.diario_local
+    assert warns_en_tabla() == 3
+    assert acciones_de_tipo("kick") == 1
+    assert acciones_de_tipo("unwarn") == 0
+
+def test_unwarn_con_cache_desfasada_la_recarga(db):
+    db.buffer_acciones.agregar(USUARIO, GUILD, "warn", "spam", 1)
+    db.buffer_acciones.agregar(USUARIO, GUILD, "warn", "spam", 1)
+    db.buffer_acciones.vaciar_sync()
+    db.cache_warns.guardar(USUARIO, GUILD, 5)
+    
+    async def unwarn_de(cantidad):
+        # Como unwarn_command: la cantidad se ajusta al total que se lee
+        async with main.lock_warns(USUARIO, GUILD):
+            actuales = await main.contar_warns(USUARIO, GUILD)
+            return actuales, await main.quitar_warns(USUARIO, GUILD, min(cantidad, actuales), 1, "unwarn")
+    
+    assert asyncio.run(unwarn_de(3)) == (5, False)
+    assert db.cache_warns.obtener(USUARIO, GUILD) == 2
+    assert asyncio.run(unwarn_de(3)) == (2, True)
+    assert warns_en_tabla() == 0
+    assert db.cache_warns.obtener(USUARIO, GUILD) == 0
+
+def warns_de(user_id, guild_id=GUILD):
+    with main.engine.connect() as conn:
+        return conn.execute(main.SQL_CONTAR_WARNS, {"user_id": user_id, "guild_id": guild_id}).scalar() or 0
+
+def dar_warns(user_id, cantidad, guild_id=GUILD):
+    for _ in range(cantidad):
+        main.buffer_acciones.agregar(user_id, guild_id, "warn", "spam", 1)
+    main.buffer_acciones.vaciar_sync()
+
+def test_cache_expulsa_al_menos_usado(db, monkeypatch):
+    monkeypatch.setattr(db.cache_warns, "capacidad", 3)
+    for user_id in (1, 2, 3):
+        dar_warns(user_id, user_id)
+        db.contar_warns_sync(user_id, GUILD)
+    
+    assert db.cache_warns.obtener(1, GUILD) == 1  # el 1 pasa a ser el más reciente
+    dar_warns(4, 4)
+    db.contar_warns_sync(4, GUILD)
+    
+    assert len(db.cache_warns) == 3
+    assert db.cache_warns.obtener(2, GUILD) is None
+    for user_id in (1, 3, 4):
+        assert db.cache_warns.obtener(user_id, GUILD) == warns_de(user_id)
+    # El expulsado se relee de la tabla con su valor correcto
+    assert asyncio.run(main.contar_warns(2, GUILD)) == warns_de(2) == 2
+
+def test_cache_guild_completo_responde_cero_sin_consultar(db, monkeypatch):
+    dar_warns(1, 2)
+    dar_warns(1, 1, guild_id=2)
+    db.cache_warns.cargar_sync()
+    
+    assert db.cache_warns.guilds_completos == {GUILD, 2}
+    assert db.cache_warns.obtener(99, GUILD) == 0 == warns_de(99)
+    assert db.cache_warns.obtener(1, 2) == 1 == warns_de(1, 2)
+    
+    # Si la carga llena la capacidad no se sabe qué falta: ningún servidor es completo
+    monkeypatch.setattr(db.cache_warns, "capacidad", 1)
+    db.cache_warns.cargar_sync()
+    assert db.cache_warns.guilds_completos == set()
+    assert len(db.cache_warns) == 1
+
+def test_cache_al_dia_tras_warn_y_unwarn(db):
+    async def escenario():
+        await warn(1)
+        await warn(1)
+        assert await unwarn(1)
+    asyncio.run(escenario())
+    
+    assert db.cache_warns.obtener(USUARIO, GUILD) == 1
+    db.buffer_acciones.vaciar_sync()
+    assert warns_en_tabla() == 1
+    
+    db.cache_warns.invalidar(USUARIO, GUILD)
+    assert db.cache_warns.obtener(USUARIO, GUILD) is None
+    assert GUILD not in db.cache_warns.guilds_completos
+    assert asyncio.run(main.contar_warns(USUARIO, GUILD)) == 1
+    
+    db.cache_warns.invalidar_guild(GUILD)
+    assert len(db.cache_warns) == 0
+
+def test_cache_cuenta_aciertos_y_fallos(db):
+    dar_warns(USUARIO, 1)
+    db.cache_warns.aciertos = db.cache_warns.fallos = 0
+    
+    async def leer():
+        return await main.contar_warns(USUARIO, GUILD)
+    for _ in range(4):
+        assert asyncio.run(leer()) == warns_en_tabla() == 1
+    
+    assert (db.cache_warns.aciertos, db.cache_warns.fallos) == (3, 1)
+    assert db.cache_warns.tasa_aciertos == 0.75